@@ -6,10 +6,21 @@ import os
 import hashlib
 import json
 import datetime
-from functools import lru_cache
+import re
 import plotly.express as px
 import plotly.graph_objects as go
 import time  # Para trabajar con timestamps
+import sqlite3
+import threading
+import ctypes
+import ctypes.util
+import select
+import struct
+import sys
+import tempfile
+import shutil
+from collections import deque
+from contextlib import closing
 
 # Importar pytz para manejar la zona horaria de Ciudad de México
 try:
@@ -19,6 +30,36 @@ try:
 except ImportError:
     HAS_PYTZ = False
 
+# pyarrow (opcional) para reconstruir las columnas de texto de la caché del catálogo sin copiar
+try:
+    import pyarrow as pa
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# orjson (opcional) para serializar el snapshot y el log del inventario más rápido que json
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# scipy (opcional) para el plan semanal óptimo con el solver MILP HiGHS
+try:
+    from scipy.optimize import milp, LinearConstraint, Bounds
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+    HAS_SCIPY = True
+except ImportError:
+    HAS_SCIPY = False
+
+# fcntl (sólo Unix) para bloquear el log de eventos durante la escritura
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
 try:
     # Configuración de la página
     st.set_page_config(
@@ -39,6 +80,18 @@ if 'is_admin' not in st.session_state:
 if 'forzar_sincronizacion' not in st.session_state:
     st.session_state.forzar_sincronizacion = False
 
+# Partes por página en la actualización de inventario (sólo se crean widgets para la página visible)
+PARTES_POR_PAGINA = 40
+
+# Modo kiosko para las pantallas de cada línea: ?kiosko=1&maquina=Transfer 7&intervalo=15
+KIOSKO_INTERVALO_PREDETERMINADO = 15  # Segundos entre actualizaciones de cada máquina
+modo_kiosko = st.query_params.get("kiosko", "").lower() in ("1", "true", "si", "sí")
+maquina_kiosko = st.query_params.get("maquina")
+try:
+    intervalo_kiosko = max(1, int(st.query_params.get("intervalo", KIOSKO_INTERVALO_PREDETERMINADO)))
+except ValueError:
+    intervalo_kiosko = KIOSKO_INTERVALO_PREDETERMINADO
+
 # Función para cambiar de página
 def change_page(page):
     st.session_state.page = page
@@ -73,119 +126,1168 @@ if hasattr(st, 'cache_data'):
 else:
     cache_decorator = st.cache
 
-# Función para calcular hash de un archivo
-@lru_cache(maxsize=8)
-def calcular_hash_archivo(ruta_archivo):
+# Catálogo: columnas esperadas y caché columnar (.npz) indexada por el hash del archivo
+ARCHIVO_CATALOGO = "catalogo.csv"
+COLUMNAS_CATALOGO = ["Parte", "StdPack", "Objetivo", "Maquina", "Rate"]
+DIRECTORIO_CACHE_CATALOGO = ".cache_catalogo"
+FILAS_POR_BLOQUE_CATALOGO = 50000
+MAX_ERRORES_CATALOGO = 100  # Filas inválidas a detallar; el resto sólo se cuenta
+
+# Función para calcular hash de un archivo (leyendo por bloques para no cargarlo completo)
+def calcular_hash_archivo(ruta_archivo, tam_bloque=1 << 20):
     if not os.path.exists(ruta_archivo):
         return None
     
     try:
+        md5 = hashlib.md5()
         with open(ruta_archivo, "rb") as f:
-            contenido = f.read()
-            return hashlib.md5(contenido).hexdigest()
+            for bloque in iter(lambda: f.read(tam_bloque), b""):
+                md5.update(bloque)
+        return md5.hexdigest()
+    except Exception:
+        return None
+
+def validar_bloque_catalogo(bloque, primera_linea):
+    """Valida un bloque del CSV leído como texto.
+    
+    Devuelve las filas válidas ya convertidas y la lista de (línea, motivo) de las
+    inválidas. Las líneas completamente vacías se ignoran sin reportarse."""
+    texto = bloque.fillna("").apply(lambda columna: columna.str.strip())
+    numeros = {columna: pd.to_numeric(texto[columna], errors="coerce") for columna in ("StdPack", "Objetivo", "Rate")}
+    es_entero = {columna: (valores % 1 == 0) for columna, valores in numeros.items()}
+    
+    reglas = [
+        ("Parte", texto["Parte"] == "", "Parte vacía"),
+        ("StdPack", ~((numeros["StdPack"] > 0) & es_entero["StdPack"]), "StdPack debe ser un entero positivo"),
+        ("Objetivo", ~((numeros["Objetivo"] >= 0) & es_entero["Objetivo"]), "Objetivo debe ser un entero no negativo"),
+        ("Maquina", texto["Maquina"] == "", "Maquina vacía"),
+        ("Rate", ~((numeros["Rate"] > 0) & es_entero["Rate"]), "Rate debe ser un entero positivo"),
+    ]
+    vacias = (texto == "").all(axis=1).to_numpy()
+    invalidas = np.zeros(len(texto), dtype=bool)
+    for _, mascara, _ in reglas:
+        invalidas |= mascara.to_numpy()
+    invalidas &= ~vacias
+    
+    # Sólo se construyen mensajes para las filas inválidas
+    errores = []
+    for i in np.flatnonzero(invalidas):
+        motivos = [
+            f"{mensaje} ({texto[columna].iat[i]!r})" if texto[columna].iat[i] else mensaje
+            for columna, mascara, mensaje in reglas if mascara.iat[i]
+        ]
+        errores.append((primera_linea + int(i), "; ".join(motivos)))
+    
+    validas = ~(invalidas | vacias)
+    filas = pd.DataFrame({
+        "Parte": texto["Parte"][validas],
+        "StdPack": numeros["StdPack"][validas].astype("int64"),
+        "Objetivo": numeros["Objetivo"][validas].astype("int64"),
+        "Maquina": texto["Maquina"][validas],
+        "Rate": numeros["Rate"][validas].astype("int64"),
+    })
+    return filas, errores
+
+def leer_catalogo_csv(ruta):
+    """Lee el catálogo por bloques validando cada fila.
+    
+    Devuelve (df, errores, total_errores), donde errores tiene como máximo
+    MAX_ERRORES_CATALOGO mensajes "Línea N: motivo" con la numeración del archivo. Una
+    parte repetida en la misma máquina se omite (se conserva la primera) y se reporta."""
+    bloques, errores, total_errores = [], [], 0
+    # Todo como texto y sin omitir líneas vacías para que la numeración coincida con el archivo
+    lector = pd.read_csv(ruta, dtype=str, keep_default_na=False, skip_blank_lines=False,
+                         chunksize=FILAS_POR_BLOQUE_CATALOGO)
+    primera_linea = 2  # La línea 1 es el encabezado
+    for bloque in lector:
+        faltantes = [columna for columna in COLUMNAS_CATALOGO if columna not in bloque.columns]
+        if faltantes:
+            if len(bloque.columns) == 1 and ";" in str(bloque.columns[0]):
+                raise ValueError("el catálogo usa ';' como separador; se espera ','")
+            raise ValueError(f"faltan columnas en el catálogo: {', '.join(faltantes)}")
+        filas, errores_bloque = validar_bloque_catalogo(bloque[COLUMNAS_CATALOGO], primera_linea)
+        bloques.append(filas)
+        total_errores += len(errores_bloque)
+        errores.extend(f"Línea {linea}: {motivo}" for linea, motivo in errores_bloque[:MAX_ERRORES_CATALOGO - len(errores)])
+        primera_linea += len(bloque)
+    
+    df = pd.concat(bloques) if bloques else pd.DataFrame(columns=COLUMNAS_CATALOGO)
+    # Partes repetidas en la misma máquina: el índice del lector es la fila de datos (línea - 2)
+    duplicadas = df.duplicated(subset=['Parte', 'Maquina'], keep='first').to_numpy()
+    total_errores += int(duplicadas.sum())
+    errores.extend(f"Línea {linea + 2}: parte repetida en la misma máquina ({parte!r})"
+                   for linea, parte in zip(df.index[duplicadas][:MAX_ERRORES_CATALOGO - len(errores)],
+                                           df['Parte'].to_numpy()[duplicadas]))
+    df = df[~duplicadas].reset_index(drop=True)
+    return df, errores, total_errores
+
+def codificar_textos(valores):
+    # Columna de texto como un buffer UTF-8 más offsets (el mismo formato de Arrow)
+    codificados = [texto.encode("utf-8") for texto in valores]
+    offsets = np.zeros(len(codificados) + 1, dtype=np.int32)
+    np.cumsum([len(texto) for texto in codificados], out=offsets[1:])
+    return np.frombuffer(b"".join(codificados), dtype=np.uint8), offsets
+
+def decodificar_textos(datos, offsets):
+    if HAS_PYARROW:
+        arreglo = pa.StringArray.from_buffers(len(offsets) - 1, pa.py_buffer(offsets), pa.py_buffer(datos))
+        return arreglo.to_pandas()
+    contenido = datos.tobytes()
+    return pd.Series([contenido[i:j].decode("utf-8") for i, j in zip(offsets[:-1].tolist(), offsets[1:].tolist())])
+
+def leer_conteo_csv(archivo, partes_validas):
+    """Lee un conteo (Parte, Cantidad) exportado por los escáneres, por bloques.
+    
+    Devuelve (cantidades, errores, total_errores, duplicadas): cantidades es una Serie
+    indexada por Parte (si una parte se repite gana la última lectura) y errores tiene como
+    máximo MAX_ERRORES_CATALOGO mensajes "Línea N: motivo"."""
+    bloques, errores, total_errores = [], [], 0
+    lector = pd.read_csv(archivo, dtype=str, keep_default_na=False, skip_blank_lines=False,
+                         chunksize=FILAS_POR_BLOQUE_CATALOGO)
+    primera_linea = 2  # La línea 1 es el encabezado
+    for bloque in lector:
+        # Aceptar encabezados con otra capitalización o espacios
+        bloque.columns = [str(columna).strip().capitalize() for columna in bloque.columns]
+        faltantes = [columna for columna in ("Parte", "Cantidad") if columna not in bloque.columns]
+        if faltantes:
+            if len(bloque.columns) == 1 and ";" in bloque.columns[0]:
+                raise ValueError("el archivo usa ';' como separador; se espera ','")
+            raise ValueError(f"faltan columnas en el archivo: {', '.join(faltantes)}")
+        parte = bloque["Parte"].fillna("").str.strip()
+        texto_cantidad = bloque["Cantidad"].fillna("").str.strip()
+        cantidad = pd.to_numeric(texto_cantidad, errors="coerce")
+        
+        vacias = ((parte == "") & (texto_cantidad == "")).to_numpy()
+        parte_invalida = ~parte.isin(partes_validas).to_numpy()
+        cantidad_invalida = ~((cantidad >= 0) & (cantidad % 1 == 0)).to_numpy()
+        invalidas = (parte_invalida | cantidad_invalida) & ~vacias
+        
+        # Sólo se construyen mensajes para las filas inválidas
+        for i in np.flatnonzero(invalidas):
+            total_errores += 1
+            if len(errores) < MAX_ERRORES_CATALOGO:
+                motivos = []
+                if parte_invalida[i]:
+                    motivos.append(f"parte no está en el catálogo ({parte.iat[i]!r})")
+                if cantidad_invalida[i]:
+                    motivos.append(f"Cantidad debe ser un entero no negativo ({texto_cantidad.iat[i]!r})")
+                errores.append(f"Línea {primera_linea + int(i)}: {'; '.join(motivos)}")
+        
+        validas = ~(invalidas | vacias)
+        bloques.append(pd.Series(cantidad[validas].astype("int64").to_numpy(), index=parte[validas].to_numpy()))
+        primera_linea += len(bloque)
+    
+    cantidades = pd.concat(bloques) if bloques else pd.Series(dtype="int64")
+    duplicadas = int(cantidades.index.duplicated().sum())
+    cantidades = cantidades[~cantidades.index.duplicated(keep="last")]
+    return cantidades, errores, total_errores, duplicadas
+
+def ruta_cache_catalogo(hash_catalogo):
+    return os.path.join(DIRECTORIO_CACHE_CATALOGO, f"catalogo_{hash_catalogo}.npz")
+
+def leer_cache_catalogo(hash_catalogo):
+    ruta = ruta_cache_catalogo(hash_catalogo)
+    if not os.path.exists(ruta):
+        return None
+    try:
+        with np.load(ruta, allow_pickle=False) as datos:
+            df = pd.DataFrame({
+                columna: decodificar_textos(datos[f"{columna}_datos"], datos[f"{columna}_offsets"])
+                if columna in ("Parte", "Maquina") else datos[columna]
+                for columna in COLUMNAS_CATALOGO
+            })
+            return df, list(datos["errores"]), int(datos["total_errores"])
     except Exception:
+        # Caché dañada o de otro formato: se vuelve a leer el CSV
         return None
 
-@cache_decorator(ttl=300)  # Caché de 5 minutos para reducir lecturas frecuentes
-def cargar_catalogo():
+def guardar_cache_catalogo(hash_catalogo, df, errores, total_errores):
     try:
-        # Intentar cargar desde la ruta relativa
-        df = pd.read_csv("catalogo.csv", dtype={
-            'Parte': str,
-            'StdPack': int,
-            'Objetivo': int,
-            'Maquina': str,
-            'Rate': int
-        })
-        
-        # Eliminar duplicados si los hay (más óptimo)
-        df = df.drop_duplicates(subset=['Parte', 'Maquina'], keep='first')
-        
-        # Calcular hash del catálogo para detectar cambios
-        hash_actual = calcular_hash_archivo("catalogo.csv")
-        
-        # Verificar si el hash ha cambiado
-        if 'ultimo_hash_catalogo' in st.session_state and st.session_state.ultimo_hash_catalogo != hash_actual:
-            # Si hay cambio en el catálogo, forzar sincronización de inventario
-            st.session_state.forzar_sincronizacion = True
-        
-        # Actualizar hash en session_state
-        st.session_state.ultimo_hash_catalogo = hash_actual
-        
-        return df
+        os.makedirs(DIRECTORIO_CACHE_CATALOGO, exist_ok=True)
+        ruta = ruta_cache_catalogo(hash_catalogo)
+        temporal = ruta + ".tmp"
+        columnas = {}
+        for columna in COLUMNAS_CATALOGO:
+            if columna in ("Parte", "Maquina"):
+                columnas[f"{columna}_datos"], columnas[f"{columna}_offsets"] = codificar_textos(df[columna].tolist())
+            else:
+                columnas[columna] = df[columna].to_numpy(dtype=np.int64)
+        with open(temporal, "wb") as f:
+            np.savez(f, errores=np.array(errores, dtype=str), total_errores=np.int64(total_errores), **columnas)
+        os.replace(temporal, ruta)
+        # Conservar sólo la caché de la versión actual del catálogo
+        for nombre in os.listdir(DIRECTORIO_CACHE_CATALOGO):
+            if nombre.startswith("catalogo_") and os.path.join(DIRECTORIO_CACHE_CATALOGO, nombre) != ruta:
+                os.remove(os.path.join(DIRECTORIO_CACHE_CATALOGO, nombre))
+    except OSError:
+        # La caché es opcional: sin permisos de escritura se sigue leyendo el CSV
+        pass
+
+class DetectorCambiosArchivo:
+    """Detecta cambios en un archivo con os.stat (mtime_ns, tamaño, inodo) y sólo
+    recalcula el hash del contenido cuando esa firma cambia.
+    
+    Un mismo detector lo comparten todas las sesiones, de modo que en cada rerun el
+    costo es una llamada a stat; guardar el archivo sin cambiar su contenido actualiza
+    la firma pero conserva el hash."""
+    
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._firma = None
+        self._hash = None
+    
+    def firma(self):
+        try:
+            info = os.stat(self.ruta)
+        except OSError:
+            return None
+        return info.st_mtime_ns, info.st_size, info.st_ino
+    
+    def hash(self):
+        firma = self.firma()
+        with self._lock:
+            if firma == self._firma:
+                return self._hash
+        hash_actual = calcular_hash_archivo(self.ruta) if firma is not None else None
+        # Si el archivo cambió mientras se leía, la próxima llamada lo vuelve a calcular
+        if self.firma() == firma:
+            with self._lock:
+                self._firma, self._hash = firma, hash_actual
+        return hash_actual
+
+@st.cache_resource
+def obtener_detector_catalogo():
+    return DetectorCambiosArchivo(ARCHIVO_CATALOGO)
+
+@cache_decorator(max_entries=4)  # Indexado por el hash: un catálogo nuevo es una entrada nueva
+def cargar_catalogo(hash_actual):
+    """Devuelve (catalogo, errores, total_errores) de las filas inválidas omitidas."""
+    try:
+        if hash_actual is None:
+            raise FileNotFoundError(f"no existe {ARCHIVO_CATALOGO}")
+        
+        # Arranque en caliente: columnas ya validadas desde la caché .npz
+        resultado = leer_cache_catalogo(hash_actual)
+        if resultado is None:
+            resultado = leer_catalogo_csv(ARCHIVO_CATALOGO)
+            guardar_cache_catalogo(hash_actual, *resultado)
+        if resultado[0].empty:
+            raise ValueError("el catálogo no tiene filas válidas")
+        return resultado
     except Exception as e:
         st.warning(f"No se pudo cargar el archivo catalogo.csv: {e}")
         st.info("Usando datos de ejemplo predeterminados")
         # Usar datos de ejemplo
-        return pd.DataFrame(
-            DATOS_EJEMPLO,
-            columns=["Parte", "StdPack", "Objetivo", "Maquina", "Rate"]
-        )
+        return pd.DataFrame(DATOS_EJEMPLO, columns=COLUMNAS_CATALOGO), [], 0
+
+# Cargar catálogo (en cada rerun sólo se hace stat del archivo)
+hash_catalogo = obtener_detector_catalogo().hash()
+catalogo, errores_catalogo, total_errores_catalogo = cargar_catalogo(hash_catalogo)
+
+# Si el contenido del catálogo cambió desde el último rerun, forzar sincronización de inventario
+if st.session_state.get('ultimo_hash_catalogo') not in (None, hash_catalogo):
+    st.session_state.forzar_sincronizacion = True
+st.session_state.ultimo_hash_catalogo = hash_catalogo
+
+# Informar las filas del catálogo que se omitieron por no cumplir el esquema
+if total_errores_catalogo:
+    st.warning(f"⚠️ Se omitieron {total_errores_catalogo} filas inválidas de {ARCHIVO_CATALOGO}")
+    with st.expander("Ver filas inválidas del catálogo"):
+        st.text("\n".join(errores_catalogo))
+        if total_errores_catalogo > len(errores_catalogo):
+            st.caption(f"... y {total_errores_catalogo - len(errores_catalogo)} más")
 
-# Cargar catálogo
-catalogo = cargar_catalogo()
+# Índice de atributos por parte (los de su primera fila en el catálogo), construido una sola vez
+# por versión del catálogo y compartido por todas las sesiones; evita filtrar el catálogo por parte
+@st.cache_resource(max_entries=4)
+def obtener_atributos_partes(hash_catalogo, _catalogo):
+    primeras = _catalogo.drop_duplicates(subset='Parte', keep='first')
+    columnas = ['StdPack', 'Objetivo', 'Maquina', 'Rate']
+    return {
+        parte: dict(zip(columnas, valores))
+        for parte, *valores in zip(*(primeras[columna].tolist() for columna in ['Parte'] + columnas))
+    }
 
-# Variables para control de cambios en el catálogo
-if 'ultimo_hash_catalogo' not in st.session_state:
-    st.session_state.ultimo_hash_catalogo = None
+@st.cache_resource(max_entries=4)
+def obtener_partes_por_maquina(hash_catalogo, _catalogo):
+    # Partes de cada máquina en orden alfabético (una parte flexible aparece en varias)
+    return {maquina: sorted(partes.unique()) for maquina, partes in _catalogo.groupby('Maquina')['Parte']}
+
+# Marcas de lado de las parejas como "izquierdo/derecho" separadas por comas. La marca debe ir
+# como palabra aparte, separada por espacio, guion o guion bajo ("Header Front LH", "Header-IZQ")
+PAREJAS_LADOS_PREDETERMINADAS = "LH/RH,IZQ/DER"
+
+def leer_reglas_parejas(texto):
+    """Convierte "LH/RH,IZQ/DER" en [("LH", "RH"), ("IZQ", "DER")].
+    
+    Lanza ValueError con la regla inválida: sin "/" o con más de uno, una marca vacía o con
+    espacios, guiones o guiones bajos (no se reconocería como palabra aparte), o una marca
+    que aparece como izquierda y como derecha."""
+    reglas, lados = [], {}
+    for regla in texto.split(","):
+        marcas = [marca.strip() for marca in regla.split("/")]
+        if len(marcas) != 2:
+            raise ValueError(f"la regla {regla.strip()!r} debe tener la forma izquierdo/derecho")
+        for marca, lado in zip(marcas, ("izquierda", "derecha")):
+            if not marca or re.search(r"[\s_\-]", marca):
+                raise ValueError(f"la regla {regla.strip()!r} tiene una marca vacía o con espacios, guiones o guiones bajos")
+            if lados.setdefault(marca, lado) != lado:
+                raise ValueError(f"la marca {marca!r} aparece como izquierda y como derecha")
+        reglas.append(tuple(marcas))
+    return reglas
+
+try:
+    REGLAS_PAREJAS = leer_reglas_parejas(os.environ.get("PAREJAS_LADOS", PAREJAS_LADOS_PREDETERMINADAS))
+except ValueError as e:
+    # Con reglas mal escritas los sets se agruparían mal en toda la aplicación
+    st.error(f"PAREJAS_LADOS inválida: {e}. Ejemplo: PAREJAS_LADOS=\"{PAREJAS_LADOS_PREDETERMINADAS}\"")
+    st.stop()
+LADO_IZQUIERDO, LADO_DERECHO, SIN_LADO = 0, 1, 2
+
+class MotorParejas:
+    """Reconoce el lado y el nombre base de cada parte con una sola expresión regular
+    compilada a partir de las reglas de nombres. Las partes con el mismo nombre base
+    forman un grupo (set LH/RH); una parte sin marca de lado es su propio grupo."""
+    
+    def __init__(self, reglas=REGLAS_PAREJAS):
+        self.lado_de_marca = {}
+        for izquierda, derecha in reglas:
+            self.lado_de_marca.setdefault(izquierda, LADO_IZQUIERDO)
+            self.lado_de_marca.setdefault(derecha, LADO_DERECHO)
+        # Marcas más largas primero para que una marca no se reconozca como prefijo de otra
+        marcas = "|".join(re.escape(marca) for marca in sorted(self.lado_de_marca, key=len, reverse=True))
+        self.patron = re.compile(rf"[\s_\-]({marcas})(?=$|[\s_\-])") if marcas else None
+    
+    def analizar(self, partes):
+        """DataFrame indexado por Parte con GrupoParte (nombre sin la marca de lado),
+        Lado (LADO_IZQUIERDO, LADO_DERECHO o SIN_LADO) y MarcaLado."""
+        partes = pd.unique(pd.Series(partes).to_numpy(dtype=object))
+        coincidencias = [self.patron.search(parte) if self.patron else None for parte in partes]
+        marcas = [m.group(1) if m else None for m in coincidencias]
+        return pd.DataFrame({
+            # Se quita sólo la marca (con su separador), no el resto del nombre
+            'GrupoParte': [parte[:m.start()] + parte[m.end():] if m else parte for parte, m in zip(partes, coincidencias)],
+            'Lado': np.array([self.lado_de_marca.get(marca, SIN_LADO) for marca in marcas], dtype=np.int8),
+            'MarcaLado': marcas,
+        }, index=pd.Index(partes, name='Parte'))
+
+@st.cache_resource(max_entries=4)
+def obtener_parejas(hash_catalogo, _catalogo):
+    # Grupo y lado de cada parte, una sola vez por versión del catálogo para todas las páginas
+    return MotorParejas().analizar(_catalogo['Parte'])
+
+atributos_partes = obtener_atributos_partes(hash_catalogo, catalogo)
+partes_por_maquina = obtener_partes_por_maquina(hash_catalogo, catalogo)
+parejas_partes = obtener_parejas(hash_catalogo, catalogo)
 
 # Obtener lista de máquinas únicas
 maquinas = sorted(catalogo['Maquina'].unique())
 
+# Archivos de persistencia del inventario: snapshot compactado + log de eventos (JSON Lines)
+ARCHIVO_INVENTARIO = "inventario.json"
+ARCHIVO_EVENTOS = "inventario_eventos.jsonl"
+EVENTOS_POR_SNAPSHOT = 200  # Compactar el snapshot cuando se acumulen estos eventos sin aplicar
+FORMATO_SNAPSHOT = 2  # Línea de encabezado con metadatos + línea con el inventario en JSON compacto
+HISTORIAL_POR_PARTE = 1000  # Eventos por parte que conserva el índice del historial en memoria
+
+def serializar_json(datos):
+    """JSON compacto (sin indentación) en bytes UTF-8; usa orjson si está instalado."""
+    if HAS_ORJSON:
+        return orjson.dumps(datos)
+    return json.dumps(datos, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def deserializar_json(datos):
+    if HAS_ORJSON:
+        return orjson.loads(datos)
+    return json.loads(datos)
+
+# Backend de almacenamiento del inventario: "archivo" (JSON) o "sqlite"
+INVENTARIO_BACKEND = os.environ.get("INVENTARIO_BACKEND", "archivo").lower()
+ARCHIVO_SQLITE = os.environ.get("INVENTARIO_DB", "inventario.db")
+
+# Obtener fecha actual en formato CDMX
+def obtener_timestamp():
+    now = datetime.datetime.now()
+    if HAS_PYTZ:
+        # Convertir a hora de Ciudad de México
+        now_cdmx = now.astimezone(CDMX_TZ) if now.tzinfo else pytz.utc.localize(now).astimezone(CDMX_TZ)
+        return now_cdmx.strftime("%Y-%m-%d %H:%M:%S")
+    # Si no está disponible pytz, usar hora del sistema
+    return now.strftime("%Y-%m-%d %H:%M:%S")
+
+class InventarioDañado(Exception):
+    """Ninguna copia del snapshot del inventario pasó la verificación."""
+
+class ConflictoInventario(Exception):
+    """Otra sesión modificó alguna de las partes desde que se leyó el inventario."""
+    
+    def __init__(self, partes):
+        super().__init__(f"Partes modificadas por otro usuario: {', '.join(partes)}")
+        self.partes = partes
+
+class AlmacenInventarioArchivo:
+    """Inventario en archivos: snapshot compactado (inventario.json) más un log de eventos
+    JSON Lines con sólo las partes modificadas en cada guardado.
+    
+    La versión del inventario es el tamaño en bytes del log: una sesión que leyó la versión
+    v entra en conflicto si algún evento posterior a v modificó las mismas partes."""
+    
+    # El almacén vive en st.cache_resource entre reruns: exponer la clase de excepción con la
+    # que fue creado, ya que cada rerun del script define una clase ConflictoInventario nueva
+    Conflicto = ConflictoInventario
+    
+    def __init__(self, ruta_snapshot=ARCHIVO_INVENTARIO, ruta_eventos=ARCHIVO_EVENTOS):
+        self.ruta_snapshot = ruta_snapshot
+        self.ruta_eventos = ruta_eventos
+        # Eventos en el log después del último snapshot, según lo visto por este proceso
+        self.eventos_sin_compactar = 0
+        self._lock_compactacion = threading.Lock()
+        # Índice del historial por parte y offset del log hasta donde está construido
+        self._historial = {}
+        self._offset_historial = 0
+        self._lock_historial = threading.Lock()
+    
+    @staticmethod
+    def _leer_archivo_snapshot(ruta, solo_encabezado=False):
+        """Lee un snapshot y devuelve sus datos, o None si no pasa la verificación.
+        
+        El encabezado (primera línea) trae fecha, usuario, offset del log y el checksum
+        del inventario, así que con solo_encabezado no se lee ni se parsea el inventario."""
+        with open(ruta, "rb") as f:
+            primera_linea = f.readline()
+            try:
+                encabezado = deserializar_json(primera_linea)
+            except ValueError:
+                encabezado = None
+            if isinstance(encabezado, dict) and "formato" in encabezado:
+                if solo_encabezado:
+                    return encabezado
+                contenido = f.read()
+                if hashlib.sha256(contenido).hexdigest() != encabezado.get("checksum"):
+                    return None
+                return dict(encabezado, inventario=deserializar_json(contenido))
+            # Formato anterior: un solo objeto JSON indentado
+            datos = json.loads(primera_linea + f.read())
+        if not isinstance(datos, dict) or "inventario" not in datos:
+            return None
+        checksum = datos.pop("checksum", None)
+        if checksum is not None:
+            contenido = json.dumps(datos, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            if hashlib.sha256(contenido).hexdigest() != checksum:
+                return None
+        return datos
+    
+    def _leer_snapshot(self, solo_encabezado=False):
+        return self._leer_snapshot_verificado(solo_encabezado)[0]
+    
+    def _leer_snapshot_verificado(self, solo_encabezado=False):
+        # Snapshot actual y, si está dañado, la copia anterior (.bak); devuelve (datos, ruta leída)
+        rutas = [ruta for ruta in (self.ruta_snapshot, self.ruta_snapshot + ".bak") if os.path.exists(ruta)]
+        if not rutas:
+            return None, None
+        for ruta in rutas:
+            try:
+                datos = self._leer_archivo_snapshot(ruta, solo_encabezado)
+            except (OSError, ValueError):
+                continue
+            if datos is not None:
+                return datos, ruta
+        raise InventarioDañado(f"snapshot dañado ({', '.join(rutas)})")
+    
+    def _escribir_snapshot(self, datos, respaldar=True):
+        """Escribe el snapshot en un archivo temporal, lo sincroniza a disco y lo renombra
+        sobre el anterior, que se conserva como respaldo (.bak) si era válido. Un lector
+        nunca ve un archivo a medio escribir."""
+        directorio = os.path.dirname(os.path.abspath(self.ruta_snapshot))
+        contenido = serializar_json(datos["inventario"])
+        encabezado = {clave: valor for clave, valor in datos.items() if clave != "inventario"}
+        encabezado.update(formato=FORMATO_SNAPSHOT, partes=len(datos["inventario"]),
+                          checksum=hashlib.sha256(contenido).hexdigest())
+        descriptor, temporal = tempfile.mkstemp(dir=directorio, prefix=".inventario_", suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as f:
+                f.write(serializar_json(encabezado) + b"\n")
+                f.write(contenido)
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.exists(self.ruta_snapshot):
+                # mkstemp crea el archivo con permisos 0600: conservar los del snapshot
+                shutil.copymode(self.ruta_snapshot, temporal)
+            if respaldar and os.path.exists(self.ruta_snapshot):
+                # Enlace duro al snapshot vigente: el respaldo no cuesta una copia
+                respaldo = self.ruta_snapshot + ".bak"
+                if os.path.exists(respaldo):
+                    os.remove(respaldo)
+                try:
+                    os.link(self.ruta_snapshot, respaldo)
+                except OSError:
+                    shutil.copyfile(self.ruta_snapshot, respaldo)
+            os.replace(temporal, self.ruta_snapshot)
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+        # Persistir también la entrada del directorio tras el rename
+        if hasattr(os, "O_DIRECTORY"):
+            descriptor_dir = os.open(directorio, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(descriptor_dir)
+            finally:
+                os.close(descriptor_dir)
+    
+    def rutas(self):
+        # Archivos que cambian cuando otro proceso guarda
+        return [self.ruta_snapshot, self.ruta_eventos]
+    
+    def version(self):
+        return os.path.getsize(self.ruta_eventos) if os.path.exists(self.ruta_eventos) else 0
+    
+    def cargar(self):
+        # Último snapshot compactado más los eventos registrados después de él
+        datos, ruta_leida = self._leer_snapshot_verificado()
+        datos = datos or {}
+        inventario = datos.get("inventario", {})
+        ultima_act = datos.get("ultima_actualizacion", "Nuevo" if not datos else "Desconocida")
+        offset = datos.get("eventos_offset", 0)
+        
+        eventos_aplicados = 0
+        ultimo_evento = None
+        for intento in range(2):
+            for evento, offset in self.eventos(offset, incluir_invalidos=True):
+                if evento is None:
+                    continue
+                for parte in evento.get("eliminadas", []):
+                    inventario.pop(parte, None)
+                inventario.update(evento.get("inventario", {}))
+                ultimo_evento = evento
+                eventos_aplicados += 1
+            # La versión es el tamaño del log: si queda una línea incompleta al final, la
+            # versión cargada nunca coincidiría y se recargaría en cada rerun. Se descarta
+            # con el bloqueo tomado (ninguna escritura en curso) y se leen los eventos
+            # agregados mientras tanto
+            if intento or self.version() == offset:
+                break
+            self._descartar_linea_incompleta()
+        
+        if ultimo_evento is not None:
+            ultima_act = ultimo_evento.get("ts", ultima_act)
+        
+        # Compactar: reescribir el snapshot cuando el log pendiente crece demasiado
+        self.eventos_sin_compactar = eventos_aplicados
+        if eventos_aplicados >= EVENTOS_POR_SNAPSHOT:
+            # Si se recuperó desde el respaldo, el snapshot dañado no debe reemplazarlo
+            self._escribir_snapshot(self._datos_snapshot(inventario, ultima_act, ultimo_evento, offset),
+                                    respaldar=ruta_leida != self.ruta_snapshot + ".bak")
+            self.eventos_sin_compactar = 0
+        
+        # Versión hasta el último evento completo aplicado
+        return inventario, ultima_act, offset
+    
+    @staticmethod
+    def _datos_snapshot(inventario, ultima_act, ultimo_evento, offset):
+        datos = {
+            "inventario": inventario,
+            "ultima_actualizacion": ultima_act,
+            "usuario": ultimo_evento.get("usuario", "Sistema"),
+            "eventos_offset": offset
+        }
+        if ultimo_evento.get("origen"):
+            datos["origen"] = ultimo_evento["origen"]
+        return datos
+    
+    def compactar(self, inventario, evento, version):
+        """Reescribe el snapshot desde el guardado cuando se acumulan EVENTOS_POR_SNAPSHOT
+        eventos, con el inventario ya aplicado en memoria (el de la versión version, que
+        termina con evento). Un proceso que sólo guarda nunca vuelve a llamar a cargar,
+        así que sin esto el log crecería sin compactarse."""
+        if self.eventos_sin_compactar < EVENTOS_POR_SNAPSHOT:
+            return False
+        # Sólo un hilo compacta a la vez; los demás siguen sin esperar
+        if not self._lock_compactacion.acquire(blocking=False):
+            return False
+        try:
+            try:
+                _, ruta_leida = self._leer_snapshot_verificado()
+            except InventarioDañado:
+                ruta_leida = None
+            # Un snapshot dañado o recuperado desde el respaldo no debe reemplazar al .bak
+            self._escribir_snapshot(self._datos_snapshot(inventario, evento["ts"], evento, version),
+                                    respaldar=ruta_leida == self.ruta_snapshot)
+            self.eventos_sin_compactar = 0
+            return True
+        finally:
+            self._lock_compactacion.release()
+    
+    def guardar(self, evento, version_base=None):
+        linea = serializar_json(evento) + b"\n"
+        with open(self.ruta_eventos, "ab") as f:
+            # Bloqueo exclusivo para que la verificación de conflictos y el append sean atómicos
+            if HAS_FCNTL:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                # Versión previa a este evento, tomada ya con el bloqueo, sin la línea
+                # incompleta que pudo dejar una escritura interrumpida para que el nuevo
+                # evento no quede pegado a ella
+                version_anterior = self._truncar_linea_incompleta(f)
+                if version_base is not None and evento["inventario"]:
+                    conflictos = set()
+                    for previo, _ in self.eventos(version_base):
+                        conflictos.update(evento["inventario"].keys() & previo.get("inventario", {}).keys())
+                    if conflictos:
+                        raise self.Conflicto(sorted(conflictos))
+                # Una sola escritura en modo append por evento, sincronizada a disco antes de confirmar
+                f.write(linea)
+                f.flush()
+                os.fsync(f.fileno())
+                self.eventos_sin_compactar += 1
+                return version_anterior, f.tell()
+            finally:
+                if HAS_FCNTL:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+    
+    def _truncar_linea_incompleta(self, f):
+        # Con el bloqueo tomado: recortar el log hasta el último salto de línea y devolver su tamaño
+        f.seek(0, os.SEEK_END)
+        tamaño = f.tell()
+        fin_valido = self._fin_ultima_linea(tamaño)
+        if fin_valido != tamaño:
+            f.truncate(fin_valido)
+        return fin_valido
+    
+    def _descartar_linea_incompleta(self):
+        if not os.path.exists(self.ruta_eventos):
+            return
+        with open(self.ruta_eventos, "ab") as f:
+            if HAS_FCNTL:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                self._truncar_linea_incompleta(f)
+            finally:
+                if HAS_FCNTL:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+    
+    def _fin_ultima_linea(self, tamaño, bloque=65536):
+        # Offset justo después del último salto de línea del log (0 si no hay ninguno)
+        with open(self.ruta_eventos, "rb") as f:
+            posicion = tamaño
+            while posicion > 0:
+                leer = min(bloque, posicion)
+                f.seek(posicion - leer)
+                datos = f.read(leer)
+                salto = datos.rfind(b"\n")
+                if salto >= 0:
+                    return posicion - leer + salto + 1
+                posicion -= leer
+        return 0
+    
+    def eventos(self, desde=0, incluir_invalidos=False):
+        # Recorrer el log desde un offset en bytes, devolviendo (evento, offset_siguiente);
+        # con incluir_invalidos las líneas completas que no son JSON válido dan (None, offset)
+        if not os.path.exists(self.ruta_eventos):
+            return
+        with open(self.ruta_eventos, "rb") as f:
+            f.seek(desde)
+            offset = desde
+            while True:
+                linea = f.readline()
+                if not linea:
+                    break
+                offset += len(linea)
+                if not linea.endswith(b"\n"):
+                    break  # Línea incompleta (escritura en curso o interrumpida)
+                try:
+                    evento = deserializar_json(linea)
+                except ValueError:
+                    if incluir_invalidos:
+                        yield None, offset
+                    continue
+                yield evento, offset
+    
+    def eventos_recientes(self, limite=50, bloque=65536):
+        """Devuelve los últimos eventos del log (más reciente primero) leyendo el archivo
+        desde el final, sin cargar todo el historial en memoria."""
+        if not os.path.exists(self.ruta_eventos):
+            return []
+        eventos = []
+        with open(self.ruta_eventos, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            posicion = f.tell()
+            resto = b""
+            while posicion > 0 and len(eventos) < limite:
+                leer = min(bloque, posicion)
+                posicion -= leer
+                f.seek(posicion)
+                lineas = (f.read(leer) + resto).split(b"\n")
+                # La primera línea puede estar incompleta: se completa en el siguiente bloque
+                resto = lineas.pop(0) if posicion > 0 else b""
+                for linea in reversed(lineas):
+                    if linea.strip() and len(eventos) < limite:
+                        try:
+                            eventos.append(deserializar_json(linea))
+                        except ValueError:
+                            continue
+        return eventos
+    
+    def historial_parte(self, parte, limite=50):
+        """Últimos eventos de una parte (más reciente primero) desde un índice en memoria
+        que se amplía sólo con los eventos agregados al log desde la consulta anterior."""
+        with self._lock_historial:
+            if self.version() < self._offset_historial:
+                # El log se reemplazó: reconstruir el índice desde el inicio
+                self._historial, self._offset_historial = {}, 0
+            for evento, offset in self.eventos(self._offset_historial):
+                ts, usuario = evento.get("ts"), evento.get("usuario")
+                for parte_evento, cantidad in evento.get("inventario", {}).items():
+                    registros = self._historial.get(parte_evento)
+                    if registros is None:
+                        registros = self._historial[parte_evento] = deque(maxlen=HISTORIAL_POR_PARTE)
+                    registros.append((ts, usuario, cantidad))
+                self._offset_historial = offset
+            registros = list(self._historial.get(parte, ()))
+        return [{"ts": ts, "usuario": usuario, "cantidad": cantidad}
+                for ts, usuario, cantidad in reversed(registros[-limite:])]
+    
+    def ultima_actualizacion(self):
+        eventos = self.eventos_recientes(1)
+        if eventos:
+            return {"ts": eventos[0].get("ts"), "usuario": eventos[0].get("usuario", "Sistema"),
+                    "origen": eventos[0].get("origen"), "cambios": eventos[0].get("cambios", [])}
+        # Sin eventos en el log: basta el encabezado del snapshot
+        datos = self._leer_snapshot(solo_encabezado=True)
+        if datos:
+            return {"ts": datos.get("ultima_actualizacion"), "usuario": datos.get("usuario", "Sistema"),
+                    "origen": datos.get("origen"), "cambios": datos.get("cambios", [])}
+        return None
+
+class AlmacenInventarioSQLite:
+    """Inventario en SQLite (modo WAL): una fila por parte con upserts y un historial de
+    eventos indexado por parte. La versión es el id del último evento; cada parte guarda
+    la versión en que se modificó por última vez para detectar conflictos entre sesiones."""
+    
+    Conflicto = ConflictoInventario
+    
+    def __init__(self, ruta=ARCHIVO_SQLITE):
+        self.ruta = ruta
+        self._local = threading.local()
+        # Las sesiones de un mismo proceso se serializan aquí en lugar de esperar el busy_timeout de SQLite
+        self._lock_escritura = threading.Lock()
+        with closing(sqlite3.connect(self.ruta)) as conexion:
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.executescript("""
+                CREATE TABLE IF NOT EXISTS inventario (
+                    parte TEXT PRIMARY KEY,
+                    cantidad INTEGER NOT NULL,
+                    version INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS eventos (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ts TEXT NOT NULL,
+                    usuario TEXT,
+                    origen TEXT,
+                    cambios TEXT,
+                    eliminadas TEXT
+                );
+                CREATE TABLE IF NOT EXISTS eventos_partes (
+                    evento_id INTEGER NOT NULL,
+                    parte TEXT NOT NULL,
+                    cantidad INTEGER NOT NULL,
+                    PRIMARY KEY (evento_id, parte)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_eventos_partes_parte ON eventos_partes (parte, evento_id);
+            """)
+            # Bases creadas antes de registrar el origen de cada evento
+            columnas = {fila[1] for fila in conexion.execute("PRAGMA table_info(eventos)")}
+            if "origen" not in columnas:
+                conexion.execute("ALTER TABLE eventos ADD COLUMN origen TEXT")
+        self._migrar_desde_archivo()
+    
+    def _conexion(self):
+        # Una conexión por hilo: las sesiones de Streamlit corren en hilos distintos
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+        return conexion
+    
+    def _migrar_desde_archivo(self):
+        # Importar una sola vez el inventario existente en archivos JSON
+        if self._conexion().execute("SELECT 1 FROM eventos LIMIT 1").fetchone():
+            return
+        almacen_archivo = AlmacenInventarioArchivo()
+        inventario, _, _ = almacen_archivo.cargar()
+        if inventario:
+            self.guardar({
+                "ts": obtener_timestamp(),
+                "usuario": "Sistema (Migración)",
+                "inventario": inventario,
+                "cambios": [f"Migración de {len(inventario)} partes desde {ARCHIVO_INVENTARIO}"]
+            })
+    
+    def rutas(self):
+        # En modo WAL las escrituras llegan primero al archivo -wal
+        return [self.ruta, self.ruta + "-wal"]
+    
+    def version(self):
+        return self._conexion().execute("SELECT COALESCE(MAX(id), 0) FROM eventos").fetchone()[0]
+    
+    def cargar(self):
+        conexion = self._conexion()
+        conexion.execute("BEGIN")
+        try:
+            inventario = dict(conexion.execute("SELECT parte, cantidad FROM inventario"))
+            ultimo = conexion.execute("SELECT id, ts FROM eventos ORDER BY id DESC LIMIT 1").fetchone()
+        finally:
+            conexion.execute("COMMIT")
+        if ultimo is None:
+            return inventario, "Nuevo", 0
+        return inventario, ultimo[1], ultimo[0]
+    
+    def guardar(self, evento, version_base=None):
+        delta = evento["inventario"]
+        conexion = self._conexion()
+        with self._lock_escritura:
+            # BEGIN IMMEDIATE toma el bloqueo de escritura antes de verificar conflictos
+            conexion.execute("BEGIN IMMEDIATE")
+            try:
+                version_anterior = conexion.execute("SELECT COALESCE(MAX(id), 0) FROM eventos").fetchone()[0]
+                if version_base is not None and delta:
+                    conflictos = [fila[0] for fila in conexion.execute(
+                        "SELECT parte FROM inventario WHERE version > ? AND parte IN (SELECT value FROM json_each(?))",
+                        (version_base, json.dumps(list(delta)))
+                    )]
+                    if conflictos:
+                        raise self.Conflicto(sorted(conflictos))
+                
+                version = conexion.execute(
+                    "INSERT INTO eventos (ts, usuario, origen, cambios, eliminadas) VALUES (?, ?, ?, ?, ?)",
+                    (evento["ts"], evento.get("usuario"), evento.get("origen"),
+                     json.dumps(evento.get("cambios", []), ensure_ascii=False),
+                     json.dumps(evento.get("eliminadas", []), ensure_ascii=False))
+                ).lastrowid
+                conexion.executemany(
+                    "INSERT INTO inventario (parte, cantidad, version) VALUES (?, ?, ?) "
+                    "ON CONFLICT(parte) DO UPDATE SET cantidad = excluded.cantidad, version = excluded.version",
+                    [(parte, cantidad, version) for parte, cantidad in delta.items()]
+                )
+                conexion.executemany(
+                    "INSERT INTO eventos_partes (evento_id, parte, cantidad) VALUES (?, ?, ?)",
+                    [(version, parte, cantidad) for parte, cantidad in delta.items()]
+                )
+                if evento.get("eliminadas"):
+                    conexion.execute(
+                        "DELETE FROM inventario WHERE parte IN (SELECT value FROM json_each(?))",
+                        (json.dumps(evento["eliminadas"]),)
+                    )
+                conexion.execute("COMMIT")
+            except BaseException:
+                conexion.execute("ROLLBACK")
+                raise
+        return version_anterior, version
+    
+    def compactar(self, inventario, evento, version):
+        # La tabla inventario ya es el estado actual: no hay snapshot que reescribir
+        return False
+    
+    def eventos_recientes(self, limite=50):
+        conexion = self._conexion()
+        filas = conexion.execute(
+            "SELECT id, ts, usuario, origen, cambios, eliminadas FROM eventos ORDER BY id DESC LIMIT ?", (limite,)
+        ).fetchall()
+        if not filas:
+            return []
+        partes = {}
+        for evento_id, parte, cantidad in conexion.execute(
+            "SELECT evento_id, parte, cantidad FROM eventos_partes WHERE evento_id BETWEEN ? AND ?",
+            (filas[-1][0], filas[0][0])
+        ):
+            partes.setdefault(evento_id, {})[parte] = cantidad
+        return [
+            {"ts": ts, "usuario": usuario, "origen": origen, "inventario": partes.get(evento_id, {}),
+             "cambios": json.loads(cambios or "[]"), "eliminadas": json.loads(eliminadas or "[]")}
+            for evento_id, ts, usuario, origen, cambios, eliminadas in filas
+        ]
+    
+    def historial_parte(self, parte, limite=50):
+        # Consulta indexada por (parte, evento_id)
+        filas = self._conexion().execute(
+            "SELECT e.ts, e.usuario, p.cantidad FROM eventos_partes p JOIN eventos e ON e.id = p.evento_id "
+            "WHERE p.parte = ? ORDER BY p.evento_id DESC LIMIT ?",
+            (parte, limite)
+        ).fetchall()
+        return [{"ts": ts, "usuario": usuario, "cantidad": cantidad} for ts, usuario, cantidad in filas]
+    
+    def ultima_actualizacion(self):
+        eventos = self.eventos_recientes(1)
+        if eventos:
+            return {"ts": eventos[0]["ts"], "usuario": eventos[0]["usuario"] or "Sistema",
+                    "origen": eventos[0]["origen"], "cambios": eventos[0]["cambios"]}
+        return None
+
+# Almacén compartido por todas las sesiones del proceso
+@st.cache_resource
+def obtener_almacen():
+    if INVENTARIO_BACKEND == "sqlite":
+        return AlmacenInventarioSQLite()
+    return AlmacenInventarioArchivo()
+
+class InventarioCompartido:
+    """Inventario en memoria compartido por todas las sesiones del proceso.
+    
+    El diccionario nunca se modifica en sitio: cada guardado crea uno nuevo y avanza la
+    versión, de modo que las sesiones guardan sólo una referencia y detectan cambios
+    comparando versiones. Si otro proceso escribe en el almacén se recarga completo.
+    También guarda los metadatos del último guardado (fecha, usuario, versión) que
+    muestra el encabezado del dashboard."""
+    
+    def __init__(self, almacen):
+        self.almacen = almacen
+        self._lock = threading.Lock()
+        self.inventario = None
+        self.ultima_actualizacion = None
+        self.version = None
+        self._metadatos = None
+    
+    def obtener(self):
+        # Verificación barata de la versión del almacén antes de recargar
+        version_almacen = self.almacen.version()
+        with self._lock:
+            if self.inventario is not None and self.version == version_almacen:
+                return self.inventario, self.ultima_actualizacion, self.version
+        
+        inventario, ultima_act, version = self.almacen.cargar()
+        with self._lock:
+            # Otro hilo pudo registrar un guardado más reciente mientras se cargaba
+            if self.inventario is None or version >= self.version:
+                self.inventario, self.ultima_actualizacion, self.version = inventario, ultima_act, version
+            return self.inventario, self.ultima_actualizacion, self.version
+    
+    def registrar(self, evento, version_anterior, version_nueva):
+        """Aplica en memoria un evento recién guardado en el almacén y devuelve el
+        inventario resultante, o None si hay que recargarlo del almacén."""
+        with self._lock:
+            if self.inventario is None or self.version != version_anterior:
+                # Hubo escrituras que no pasaron por aquí: recargar en la próxima lectura
+                self.inventario = None
+                return None
+            inventario = dict(self.inventario)
+            for parte in evento.get("eliminadas", []):
+                inventario.pop(parte, None)
+            inventario.update(evento["inventario"])
+            self.inventario, self.ultima_actualizacion, self.version = inventario, evento["ts"], version_nueva
+            self._metadatos = {"ts": evento["ts"], "usuario": evento.get("usuario") or "Sistema", "version": version_nueva}
+            return inventario
+    
+    def metadatos(self):
+        """Fecha, usuario y versión del último guardado. Se piden al almacén sólo cuando
+        cambia la versión; después de un guardado de este proceso ya están en memoria."""
+        _, ultima_act, version = self.obtener()
+        with self._lock:
+            if self._metadatos is not None and self._metadatos["version"] == version:
+                return self._metadatos
+        ultima = self.almacen.ultima_actualizacion() or {}
+        metadatos = {"ts": ultima.get("ts") or ultima_act, "usuario": ultima.get("usuario") or "Sistema", "version": version}
+        with self._lock:
+            if self.version == version:
+                self._metadatos = metadatos
+        return metadatos
+
+@st.cache_resource
+def obtener_inventario_compartido():
+    return InventarioCompartido(obtener_almacen())
+
+# Vigilancia de archivos: intervalo de sondeo sin inotify y de revisión en los dashboards abiertos
+INTERVALO_SONDEO_ARCHIVOS = 0.5
+INTERVALO_REVISION_CAMBIOS = 1
+
+class VigilanteArchivos:
+    """Hilo en segundo plano que vigila grupos de archivos (catálogo, almacén de inventario).
+    
+    En Linux usa inotify sobre los directorios, lo que también detecta reemplazos atómicos;
+    en otros sistemas, o si inotify no está disponible, compara os.stat cada
+    INTERVALO_SONDEO_ARCHIVOS segundos. Ante un cambio ejecuta la función de recarga del
+    grupo, de modo que las cachés ya están al día cuando las sesiones vuelven a ejecutarse,
+    y aumenta `generacion`, que los dashboards consultan para saber si deben actualizarse."""
+    
+    # Constantes de inotify (linux/inotify.h)
+    IN_MODIFY, IN_CLOSE_WRITE, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x2, 0x8, 0x80, 0x100, 0x200
+    
+    def __init__(self, grupos):
+        # grupos: {nombre: (rutas, funcion_recarga)}
+        self.grupos = {nombre: ([os.path.abspath(ruta) for ruta in rutas], recargar)
+                       for nombre, (rutas, recargar) in grupos.items()}
+        self.generacion = 0
+        self.modo = None
+        self._hilo = threading.Thread(target=self._ejecutar, name="vigilante-archivos", daemon=True)
+        self._hilo.start()
+    
+    def _notificar(self, nombres):
+        for nombre in nombres:
+            try:
+                self.grupos[nombre][1]()
+            except Exception:
+                # Una recarga fallida no debe detener la vigilancia; la sesión mostrará el error
+                pass
+        self.generacion += 1
+    
+    def _ejecutar(self):
+        if sys.platform.startswith("linux"):
+            try:
+                self._vigilar_inotify()
+                return
+            except OSError:
+                pass
+        self._vigilar_sondeo()
+    
+    def _vigilar_inotify(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        
+        # Vigilar directorios (no archivos) para seguir también archivos recreados o reemplazados
+        grupos_por_archivo = {}
+        for nombre, (rutas, _) in self.grupos.items():
+            for ruta in rutas:
+                grupos_por_archivo.setdefault(ruta, set()).add(nombre)
+        directorios = {}
+        mascara = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE | self.IN_DELETE
+        for directorio in {os.path.dirname(ruta) for ruta in grupos_por_archivo}:
+            wd = libc.inotify_add_watch(fd, directorio.encode(), mascara)
+            if wd < 0:
+                os.close(fd)
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch {directorio}")
+            directorios[wd] = directorio
+        self.modo = "inotify"
+        
+        while True:
+            select.select([fd], [], [])
+            # Agrupar ráfagas de eventos (p. ej. escritura + cierre) en una sola notificación
+            time.sleep(0.05)
+            cambiados = set()
+            while True:
+                try:
+                    datos = os.read(fd, 65536)
+                except BlockingIOError:
+                    break
+                desplazamiento = 0
+                while desplazamiento < len(datos):
+                    wd, _, _, longitud = struct.unpack_from("iIII", datos, desplazamiento)
+                    nombre = datos[desplazamiento + 16:desplazamiento + 16 + longitud].rstrip(b"\0").decode(errors="replace")
+                    desplazamiento += 16 + longitud
+                    ruta = os.path.join(directorios.get(wd, ""), nombre)
+                    cambiados.update(grupos_por_archivo.get(ruta, ()))
+            if cambiados:
+                self._notificar(cambiados)
+    
+    def _vigilar_sondeo(self):
+        self.modo = "sondeo"
+        
+        def firmas():
+            resultado = {}
+            for nombre, (rutas, _) in self.grupos.items():
+                firma = []
+                for ruta in rutas:
+                    try:
+                        info = os.stat(ruta)
+                        firma.append((info.st_mtime_ns, info.st_size, info.st_ino))
+                    except OSError:
+                        firma.append(None)
+                resultado[nombre] = firma
+            return resultado
+        
+        anteriores = firmas()
+        while True:
+            time.sleep(INTERVALO_SONDEO_ARCHIVOS)
+            actuales = firmas()
+            cambiados = {nombre for nombre in actuales if actuales[nombre] != anteriores[nombre]}
+            anteriores = actuales
+            if cambiados:
+                self._notificar(cambiados)
+
+@st.cache_resource
+def obtener_vigilante():
+    almacen = obtener_almacen()
+    return VigilanteArchivos({
+        "catalogo": ([ARCHIVO_CATALOGO], obtener_detector_catalogo().hash),
+        "inventario": (almacen.rutas(), obtener_inventario_compartido().obtener)
+    })
+
 # Funciones para guardar y cargar inventario de forma persistente
-def guardar_inventario(inventario, usuario="Sistema", cambios=None):
+def registros_cambios(delta, inventario_anterior, usuario, ts):
+    """Registros estructurados del cambio de cada parte del delta."""
+    return [
+        {"parte": parte, "antes": int(inventario_anterior.get(parte, 0)), "despues": int(cantidad),
+         "usuario": usuario, "ts": ts}
+        for parte, cantidad in delta.items()
+    ]
+
+def formatear_cambio(cambio):
+    """Texto de un cambio del registro; los eventos anteriores guardaban ya el texto."""
+    if isinstance(cambio, str):
+        return cambio
+    diferencia = cambio["despues"] - cambio["antes"]
+    signo = "+" if diferencia > 0 else ""
+    return f"Parte {cambio['parte']}: {cambio['antes']} → {cambio['despues']} ({signo}{diferencia})"
+
+def guardar_inventario(delta, usuario="Sistema", cambios=None, eliminadas=None, version_base=None,
+                       inventario_anterior=None, origen=None):
+    """Registra un cambio de inventario como un evento en el almacén.
+    
+    Sólo se escriben las partes modificadas (delta) y las eliminadas, por lo que el
+    costo es proporcional al cambio y no al tamaño del inventario. Si se indica
+    inventario_anterior, el registro de cambios se arma con un registro por parte
+    (parte, antes, después, usuario, ts) en lugar de líneas de texto. Si se indica
+    version_base y otra sesión modificó alguna de las mismas partes después de esa
+    versión, no se guarda nada y se informa el conflicto.
+    
+    Devuelve (timestamp, version) del evento guardado, o (None, None) si falló."""
+    almacen = obtener_almacen()
     try:
-        # Convertir el inventario a un formato serializable más eficientemente
-        inventario_serializable = {parte: int(cantidad) for parte, cantidad in inventario.items()}
-        
-        # Obtener fecha actual en formato CDMX
-        now = datetime.datetime.now()
-        if HAS_PYTZ:
-            # Convertir a hora de Ciudad de México
-            now_cdmx = now.astimezone(CDMX_TZ) if now.tzinfo else pytz.utc.localize(now).astimezone(CDMX_TZ)
-            timestamp_format = now_cdmx.strftime("%Y-%m-%d %H:%M:%S")
-        else:
-            # Si no está disponible pytz, usar hora del sistema
-            timestamp_format = now.strftime("%Y-%m-%d %H:%M:%S")
-        
-        # Añadir metadatos con fecha en formato consistente
-        datos = {
-            "inventario": inventario_serializable,
-            "ultima_actualizacion": timestamp_format,
-            "usuario": usuario
+        evento = {
+            "ts": obtener_timestamp(),
+            "usuario": usuario,
+            "inventario": {parte: int(cantidad) for parte, cantidad in delta.items()}
         }
-        
-        # Si hay registro de cambios, añadirlo
+        if eliminadas:
+            evento["eliminadas"] = sorted(eliminadas)
+        if origen:
+            evento["origen"] = origen
+        if inventario_anterior is not None:
+            cambios = registros_cambios(delta, inventario_anterior, usuario, evento["ts"])
         if cambios:
-            datos["cambios"] = cambios
+            evento["cambios"] = cambios
         
-        # Guardar en archivo JSON
-        with open("inventario.json", "w") as f:
-            json.dump(datos, f, indent=4)
-        
-        return True
+        version_anterior, version = almacen.guardar(evento, version_base=version_base)
+        # Publicar el cambio a las demás sesiones sin releer el almacén
+        inventario = obtener_inventario_compartido().registrar(evento, version_anterior, version)
+        if inventario is not None:
+            # El evento ya está guardado: una compactación fallida sólo se reintenta después
+            try:
+                almacen.compactar(inventario, evento, version)
+            except Exception as e:
+                st.warning(f"⚠️ No se pudo compactar el snapshot del inventario: {e}")
+        return evento["ts"], version
+    except almacen.Conflicto as e:
+        st.warning(f"⚠️ No se guardó: {e}. Revise los valores actualizados e intente de nuevo.")
+        return None, None
     except Exception as e:
         st.error(f"Error al guardar el inventario: {e}")
-        return False
+        return None, None
 
-@cache_decorator(ttl=600)  # Caché de 10 minutos para el inventario
 def cargar_inventario():
+    # El inventario compartido devuelve siempre el mismo diccionario hasta que cambie la versión.
+    # Un almacén vacío devuelve {} y la sincronización con el catálogo registra las partes en 0
     try:
-        # Verificar si el archivo existe
-        if os.path.exists("inventario.json"):
-            # Cargar desde archivo JSON
-            with open("inventario.json", "r") as f:
-                datos = json.load(f)
-            
-            # Verificar estructura
-            if "inventario" in datos:
-                return datos["inventario"], datos.get("ultima_actualizacion", "Desconocida")
+        return obtener_inventario_compartido().obtener()
     except Exception as e:
-        st.warning(f"Error al cargar el inventario desde archivo: {e}")
+        error = e
     
-    # Valores predeterminados si no se puede cargar - usar diccionario por comprensión más eficiente
-    partes_unicas = list(catalogo['Parte'].unique())
-    return dict.fromkeys(partes_unicas, 0), "Nuevo"
+    # Sin inventario confiable no se muestra nada: un inventario en 0 daría faltantes y
+    # una cola de producción falsos, y al sincronizar se guardaría sobre el real
+    st.error(f"Error al cargar el inventario: {error}. Restaure {ARCHIVO_INVENTARIO} o su respaldo .bak.")
+    st.stop()
 
 def sincronizar_inventario(inventario_actual):
     """Sincroniza el inventario con el catálogo actual, añadiendo nuevas partes 
@@ -240,9 +1342,39 @@ def sincronizar_inventario(inventario_actual):
     
     return inventario_sincronizado, True, log
 
+def refrescar_inventario_sesion(inventario, ultima_act, version):
+    """Apunta la sesión al inventario compartido más reciente.
+    
+    Las partes que cambiaron en otra sesión se actualizan también en el formulario, salvo
+    las que este usuario está editando. Si alguna de ellas cambió, se conserva la versión
+    base anterior para que el guardado detecte el conflicto."""
+    anterior = st.session_state.inventario
+    temp = st.session_state.get('temp_inventario')
+    cambiadas = {parte for parte in inventario.keys() | anterior.keys()
+                 if inventario.get(parte) != anterior.get(parte)}
+    pendientes = set()
+    if temp is not None:
+        # Un widget recién editado trae su valor en su clave antes de llegar a temp_inventario
+        pendientes = {
+            parte for parte in cambiadas
+            if st.session_state.get(f"inv_{parte}", temp.get(parte)) != anterior.get(parte)
+        }
+        for parte in cambiadas - pendientes:
+            if parte in inventario:
+                temp[parte] = inventario[parte]
+            else:
+                temp.pop(parte, None)
+            st.session_state.pop(f"inv_{parte}", None)
+    
+    st.session_state.inventario = inventario
+    st.session_state.ultima_actualizacion = ultima_act
+    st.session_state.version_vista = version
+    if not pendientes:
+        st.session_state.version_inventario = version
+
 # Inicializar o sincronizar el inventario
 if 'inventario' not in st.session_state or st.session_state.forzar_sincronizacion:
-    inventario_cargado, ultima_act = cargar_inventario()
+    inventario_cargado, ultima_act, version_cargada = cargar_inventario()
     
     # Sincronizar con el catálogo actual
     inventario_sincronizado, cambios, log_cambios = sincronizar_inventario(inventario_cargado)
@@ -253,29 +1385,18 @@ if 'inventario' not in st.session_state or st.session_state.forzar_sincronizacio
         if st.session_state.forzar_sincronizacion and not cambios:
             log_cambios = ["Se detectaron cambios en el catálogo, pero no fue necesario actualizar el inventario."]
         
-        # Añadir metadatos
-        # Obtener fecha actual en formato CDMX
-        now = datetime.datetime.now()
-        if HAS_PYTZ:
-            # Convertir a hora CDMX
-            now_cdmx = now.astimezone(CDMX_TZ) if now.tzinfo else pytz.utc.localize(now).astimezone(CDMX_TZ)
-            timestamp_format = now_cdmx.strftime("%Y-%m-%d %H:%M:%S")
-        else:
-            # Si no está disponible pytz, usar hora del sistema
-            timestamp_format = now.strftime("%Y-%m-%d %H:%M:%S")
-            
-        datos_guardado = {
-            "inventario": inventario_sincronizado,
-            "ultima_actualizacion": timestamp_format,
-            "usuario": "Sistema (Sincronización automática)",
-            "cambios": log_cambios
-        }
-        
-        # Guardar en archivo JSON
-        with open("inventario.json", "w") as f:
-            json.dump(datos_guardado, f, indent=4)
-        
-        ultima_act = datos_guardado["ultima_actualizacion"]
+        # Registrar sólo las partes añadidas (en 0) y las eliminadas
+        partes_nuevas = inventario_sincronizado.keys() - inventario_cargado.keys()
+        partes_eliminadas = inventario_cargado.keys() - inventario_sincronizado.keys()
+        ts_guardado, version_guardada = guardar_inventario(
+            {parte: 0 for parte in partes_nuevas},
+            usuario="Sistema (Sincronización automática)",
+            cambios=log_cambios,
+            eliminadas=partes_eliminadas
+        )
+        if ts_guardado:
+            # El inventario compartido ya incluye la sincronización recién guardada
+            inventario_sincronizado, ultima_act, version_cargada = cargar_inventario()
         
         # Si hubo cambios significativos, mostrar notificación
         if cambios:
@@ -283,14 +1404,43 @@ if 'inventario' not in st.session_state or st.session_state.forzar_sincronizacio
     
     st.session_state.inventario = inventario_sincronizado
     st.session_state.ultima_actualizacion = ultima_act
+    # Versión del almacén sobre la que se basan los cambios de esta sesión
+    st.session_state.version_inventario = version_cargada
+    st.session_state.version_vista = version_cargada
     
     # Restablecer el flag de sincronización forzada
     if st.session_state.forzar_sincronizacion:
         st.session_state.forzar_sincronizacion = False
 
+else:
+    # Recoger en cada rerun los cambios guardados por otras sesiones (sólo compara versiones)
+    inventario_actual, ultima_act, version_actual = cargar_inventario()
+    if st.session_state.get('version_vista') != version_actual:
+        refrescar_inventario_sesion(inventario_actual, ultima_act, version_actual)
+
 if 'temp_inventario' not in st.session_state:
     st.session_state.temp_inventario = st.session_state.inventario.copy()
 
+# st.fragment en versiones recientes de Streamlit, st.experimental_fragment en las anteriores
+fragmento = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None)
+
+def revisar_cambios_externos():
+    """Vuelve a ejecutar la página cuando el vigilante detecta un cambio que esta sesión
+    todavía no muestra (catálogo editado o inventario guardado desde otra sesión o proceso)."""
+    vigilante = obtener_vigilante()
+    if st.session_state.get('generacion_vista') == vigilante.generacion:
+        return
+    st.session_state.generacion_vista = vigilante.generacion
+    _, _, version_actual = cargar_inventario()
+    if (version_actual != st.session_state.get('version_vista')
+            or obtener_detector_catalogo().hash() != st.session_state.get('ultimo_hash_catalogo')):
+        st.rerun()
+
+# Revisión periódica (sólo compara un contador mientras no haya cambios); el modo kiosko
+# tiene su propia revisión que compara la versión de cada máquina mostrada
+if fragmento is not None and not modo_kiosko:
+    fragmento(run_every=INTERVALO_REVISION_CAMBIOS)(revisar_cambios_externos)()
+
 # Barra lateral con navegación
 st.sidebar.header("Navegación")
 
@@ -329,33 +1479,582 @@ with st.sidebar.expander("Acceso Administrador"):
             st.session_state.admin_user_input = ""
             st.session_state.admin_pwd_input = ""
 
-# Función para identificar parejas LH/RH (mejorada para considerar todos los grupos)
-@lru_cache(maxsize=32)
-def identificar_parejas(partes_tuple):
-    partes = list(partes_tuple)
-    parejas = {}
-    
-    # Para cada parte, extraer el nombre base (sin LH/RH)
-    for parte in partes:
-        # Verificar si es LH o RH
-        if " LH" in parte or " RH" in parte:
-            # Extraer el nombre base quitando solo la marca LH/RH, no toda la palabra
-            if " LH" in parte:
-                base_name = parte.replace(" LH", "")
-            else:
-                base_name = parte.replace(" RH", "")
-                
-            # Asignar al grupo correcto
-            if base_name not in parejas:
-                parejas[base_name] = []
-            parejas[base_name].append(parte)
+# Asignación de grupos flexibles: búsqueda exacta sólo si las combinaciones posibles son pocas
+LIMITE_COMBINACIONES_EXACTO = 5000
+
+def asignar_flexibles(grupos, maquinas, tiempos, carga_base):
+    """Elige la máquina de cada grupo flexible balanceando la carga de las máquinas.
+    
+    grupos, maquinas y tiempos describen las filas flexibles con faltante (códigos de
+    grupo y de máquina, en orden alfabético, y tiempo necesario); carga_base es la carga
+    de cada máquina con sus grupos no flexibles. El tiempo de un grupo en una máquina es
+    la suma de sus filas en ella.
+    
+    Los grupos con faltante en una sola de sus máquinas no tienen elección: se asignan a
+    ella y su tiempo se suma a la carga base. Para el resto, heurística LPT: los grupos
+    se toman de mayor a menor tiempo y cada uno va a la máquina candidata donde
+    terminaría antes, contando los grupos ya asignados (O(G log G) para ordenar más las
+    candidatas de cada grupo). Si el número de combinaciones no pasa de
+    LIMITE_COMBINACIONES_EXACTO se busca además la asignación exacta con menor carga
+    máxima (y menor suma de cuadrados en empate).
+    Devuelve la máquina asignada a cada fila."""
+    # Tiempo de cada par (grupo, máquina), ordenado por grupo y luego máquina
+    n_maquinas = len(carga_base)
+    claves, inverso = np.unique(grupos.astype(np.int64) * n_maquinas + maquinas, return_inverse=True)
+    pares = np.stack([claves // n_maquinas, claves % n_maquinas], axis=1)
+    tiempo_par = np.bincount(inverso, weights=tiempos, minlength=len(pares))
+    inicio = np.flatnonzero(np.r_[True, pares[1:, 0] != pares[:-1, 0]])
+    limites = np.r_[inicio, len(pares)]
+    codigos_grupo = pares[inicio, 0]
+    
+    # Grupos con una sola candidata: máquina fija y carga base
+    maquina_grupo = pares[inicio, 1].copy()
+    unica = np.diff(limites) == 1
+    carga_base = carga_base.astype(float) + np.bincount(
+        maquina_grupo[unica], weights=tiempo_par[inicio[unica]], minlength=n_maquinas)
+    
+    # LPT: mayor tiempo primero (empate por nombre del grupo); las candidatas de cada grupo
+    # son el rango [a, b) de pares
+    con_eleccion = np.flatnonzero(~unica)
+    tiempo_max = np.maximum.reduceat(tiempo_par, inicio)[con_eleccion]
+    orden = con_eleccion[np.lexsort((codigos_grupo[con_eleccion], -tiempo_max))]
+    rangos = list(zip(limites[orden].tolist(), limites[orden + 1].tolist()))
+    maquinas_par = pares[:, 1].tolist()
+    tiempos_par = tiempo_par.tolist()
+    
+    # Cada grupo va a la máquina donde terminaría antes (empate: la primera en orden alfabético)
+    carga = carga_base.tolist()
+    eleccion = []
+    for a, b in rangos:
+        mejor, termino = a, carga[maquinas_par[a]] + tiempos_par[a]
+        for par in range(a + 1, b):
+            termino_par = carga[maquinas_par[par]] + tiempos_par[par]
+            if termino_par < termino:
+                mejor, termino = par, termino_par
+        carga[maquinas_par[mejor]] = termino
+        eleccion.append(mejor)
+    
+    # Cada grupo con elección tiene al menos 2 candidatas: con el límite de combinaciones
+    # la búsqueda exacta no pasa de log2(LIMITE_COMBINACIONES_EXACTO) niveles
+    combinaciones = 1
+    for a, b in rangos:
+        combinaciones *= b - a
+        if combinaciones > LIMITE_COMBINACIONES_EXACTO:
+            break
+    else:
+        if rangos:
+            eleccion = _asignar_flexibles_exacto(rangos, maquinas_par, tiempos_par, carga_base.tolist(),
+                                                 eleccion, (max(carga), sum(c * c for c in carga)))
+    
+    maquina_grupo[orden] = pares[eleccion, 1]
+    return maquina_grupo[np.searchsorted(codigos_grupo, grupos)]
+
+def _asignar_flexibles_exacto(rangos, maquinas_par, tiempos_par, carga, mejor_eleccion, mejor_costo):
+    # Ramificación y poda sobre los grupos en orden LPT partiendo de la solución heurística;
+    # costo = (carga máxima, suma de cuadrados), ambos sólo pueden crecer al asignar más grupos.
+    # Recorrido en profundidad con una pila explícita (un nivel por grupo), sin recursión
+    n = len(rangos)
+    eleccion = [None] * n
+    anterior = [0.0] * n
+    costo = [None] * n
+    costo[0] = (max(carga), sum(c * c for c in carga))
+    siguiente = [a for a, _ in rangos]
+    i = 0
+    while i >= 0:
+        # Deshacer la candidata probada antes en este nivel
+        if eleccion[i] is not None:
+            carga[maquinas_par[eleccion[i]]] = anterior[i]
+            eleccion[i] = None
+        # Nivel agotado o que ya no puede mejorar: volver al anterior
+        if siguiente[i] == rangos[i][1] or costo[i] >= mejor_costo:
+            siguiente[i] = rangos[i][0]
+            i -= 1
+            continue
+        par = siguiente[i]
+        siguiente[i] += 1
+        m = maquinas_par[par]
+        anterior[i] = carga[m]
+        carga[m] = anterior[i] + tiempos_par[par]
+        eleccion[i] = par
+        maximo, cuadrados = costo[i]
+        nuevo = (max(maximo, carga[m]), cuadrados + carga[m] * carga[m] - anterior[i] * anterior[i])
+        if i + 1 < n:
+            costo[i + 1] = nuevo
+            i += 1
+        elif nuevo < mejor_costo:
+            mejor_eleccion, mejor_costo = list(eleccion), nuevo
+    return mejor_eleccion
+
+# Plan semanal: asignación de la producción contra la capacidad de cada máquina
+VENTANA_ASIGNACION = 256  # Grupos revisados por búsqueda al asignar contra la capacidad (se duplica)
+
+def asignar_por_capacidad(maquinas, faltantes, std_packs, rates, capacidad, clave_orden, tiempo_cambio):
+    """Calcula la cantidad a producir de cada grupo contra la capacidad de su máquina.
+    
+    maquinas son los códigos de máquina de cada grupo y capacidad las horas disponibles
+    por código. Dentro de cada máquina los grupos se atienden en orden ascendente de
+    clave_orden (los NaN al final) con las reglas del plan por filas: cada uno pide su
+    faltante redondeado hacia arriba a StdPack; si su producción (sin el cambio) no cabe
+    en el tiempo que queda, recibe lo que alcance redondeado hacia abajo a StdPack, y
+    ocupa cantidad / Rate más tiempo_cambio si produce algo. Un grupo que no recibe nada
+    no consume tiempo, así que los siguientes siguen usando lo que queda; una vez
+    alcanzada la capacidad los demás reciben 0.
+    
+    En cada máquina una suma acumulada del tiempo ocupado (en el mismo orden de sumas que
+    el recorrido por filas) resuelve el tramo de grupos que caben completos y searchsorted
+    da su corte. Después del corte sólo se itera sobre los grupos que consumen tiempo (un
+    tramo que cabe o un grupo recortado, cada uno con al menos tiempo_cambio): los que no
+    caben ni con una caja reciben 0 con una máscara. Las búsquedas usan ventanas que se
+    duplican, así que el trabajo es lineal en el número de grupos más una ventana por
+    iteración. Devuelve la cantidad por grupo en el orden de entrada."""
+    orden = np.lexsort((clave_orden, maquinas))
+    maquina = maquinas[orden]
+    std_pack = std_packs[orden]
+    rate = rates[orden]
+    
+    # Lo que pide cada grupo, su tiempo de producción y el tiempo que ocupa con el cambio
+    pedido = np.ceil(np.maximum(faltantes[orden], 0) / std_pack) * std_pack
+    produccion = pedido / rate
+    ocupado = produccion + np.where(pedido > 0, tiempo_cambio, 0.0)
+    
+    cantidad = np.zeros(len(orden))
+    limites = np.r_[np.flatnonzero(np.r_[True, maquina[1:] != maquina[:-1]]), len(maquina)]
+    for a, b in zip(limites[:-1].tolist(), limites[1:].tolist()):
+        if a == b:
+            continue
+        limite = capacidad[maquina[a]]
+        usado = 0.0
+        # Cada búsqueda revisa una ventana que crece al agotarse, no todo el resto de la máquina
+        ventana = VENTANA_ASIGNACION
+        while a < b and usado < limite:
+            # Siguiente grupo que consume tiempo con lo que queda; los anteriores no piden nada
+            # o no caben ni con una caja y se quedan en 0
+            c = min(a + ventana, b)
+            restante = limite - usado
+            recorte = np.floor(restante * rate[a:c] / std_pack[a:c]) * std_pack[a:c]
+            consume = (pedido[a:c] > 0) & ((usado + produccion[a:c] <= limite) | (recorte > 0))
+            if not consume.any():
+                a, ventana = c, 2 * ventana
+                continue
+            k = int(consume.argmax())
+            a += k
+            if usado + produccion[a] > limite:
+                # No cabe completo: lo que alcance en el tiempo restante
+                cantidad[a] = recorte[k]
+                usado += recorte[k] / rate[a] + tiempo_cambio
+                a += 1
+                continue
+            # Tramo de grupos que caben completos: tiempo usado antes de cada uno si todos los
+            # anteriores reciben lo pedido; desde antes >= limite ya no cabe ninguno
+            c = min(a + ventana, b)
+            antes = np.cumsum(np.r_[usado, ocupado[a:c]])
+            fin = int(np.searchsorted(antes[:-1], limite))
+            no_cabe = antes[:fin] + produccion[a:a + fin] > limite
+            k = int(no_cabe.argmax()) if no_cabe.any() else fin
+            cantidad[a:a + k] = pedido[a:a + k]
+            if k == c - a:
+                ventana *= 2
+            usado = antes[k]
+            a += k
+    
+    resultado = np.empty(len(orden), dtype=np.int64)
+    resultado[orden] = cantidad
+    return resultado
+
+# Plan semanal óptimo (MILP): límite de tiempo del solver y penalización por hora usada,
+# sólo para desempatar en favor de planes que no produzcan de más
+LIMITE_TIEMPO_MILP = 10.0
+BRECHA_MILP = 0.005  # Brecha relativa aceptada como óptima (0.5%)
+PENALIZACION_HORAS_MILP = 1e-4
+
+def plan_optimo_milp(grupos_par, maquinas_par, faltantes, prioridades, std_packs, rates, capacidad, tiempo_cambio,
+                     limite_tiempo=LIMITE_TIEMPO_MILP):
+    """Plan semanal como programa entero mixto, resuelto con HiGHS (scipy.optimize.milp).
+    
+    Cada par (grupo, máquina candidata) tiene cajas enteras x y un binario de cambio y;
+    grupos_par, maquinas_par, std_packs y rates describen los pares (códigos de grupo y
+    de máquina), faltantes y prioridades los grupos y capacidad las horas de cada máquina.
+    - Un grupo se produce en una sola máquina y como máximo su faltante redondeado hacia
+      arriba a cajas completas: x <= cajas_max * y, suma de y del grupo <= 1.
+    - Horas de producción más cambios de cada máquina <= su capacidad.
+    - Se maximiza la cobertura ponderada: sum(peso * cubierto) con cubierto la fracción
+      del faltante cubierta (faltante * cubierto <= sets producidos, cubierto <= 1) y
+      peso = 1 / prioridad (los grupos sin prioridad pesan como uno detrás del último).
+    Sólo los grupos flexibles unen máquinas, así que cada conjunto de máquinas conectadas
+    se resuelve por separado dentro del mismo límite de tiempo total. Si el límite se
+    alcanza con una solución factible se usa esa solución aunque no se haya probado óptima.
+    Devuelve (cajas de cada par, si todos los conjuntos llegaron a BRECHA_MILP del
+    óptimo), o None si algún conjunto quedó sin solución factible."""
+    faltantes = np.maximum(np.asarray(faltantes, dtype=float), 0)
+    prioridades = np.asarray(prioridades, dtype=float)
+    peso = 1 / np.where(np.isnan(prioridades), np.nanmax(prioridades, initial=0) + 1, prioridades)
+    
+    # Máquinas conectadas: cada par se une con la primera máquina candidata de su grupo
+    primera = np.full(len(faltantes), -1)
+    primera[grupos_par[::-1]] = maquinas_par[::-1]
+    n_maquinas = len(capacidad)
+    _, componente = connected_components(
+        coo_matrix((np.ones(len(grupos_par)), (maquinas_par, primera[grupos_par])), shape=(n_maquinas, n_maquinas)),
+        directed=False
+    )
+    
+    cajas = np.zeros(len(grupos_par), dtype=np.int64)
+    optimo = True
+    limite = time.perf_counter() + limite_tiempo
+    componente_par = componente[maquinas_par]
+    for indice in np.unique(componente_par):
+        pares = np.flatnonzero(componente_par == indice)
+        grupos, grupos_locales = np.unique(grupos_par[pares], return_inverse=True)
+        maquinas, maquinas_locales = np.unique(maquinas_par[pares], return_inverse=True)
+        restante = limite - time.perf_counter()
+        if restante <= 0:
+            return None
+        resultado = _resolver_milp(
+            grupos_locales, maquinas_locales, faltantes[grupos], peso[grupos], std_packs[pares], rates[pares],
+            np.asarray(capacidad, dtype=float)[maquinas], tiempo_cambio, restante
+        )
+        if resultado is None:
+            return None
+        cajas[pares], optimo_componente = resultado
+        optimo = optimo and optimo_componente
+    return cajas, optimo
+
+def _resolver_milp(grupos_par, maquinas_par, faltantes, peso, std_packs, rates, capacidad, tiempo_cambio, limite_tiempo):
+    # Un subproblema de plan_optimo_milp con códigos locales de grupo y máquina. Devuelve
+    # (cajas, óptimo) o None sin solución factible
+    n_pares, n_grupos, n_maquinas = len(grupos_par), len(faltantes), len(capacidad)
+    cajas_max = np.ceil(faltantes[grupos_par] / std_packs)
+    horas_caja = std_packs / rates
+    
+    # Variables: [x (cajas por par), y (cambio por par), cubierto (fracción por grupo)]
+    x, y, c = np.arange(n_pares), n_pares + np.arange(n_pares), 2 * n_pares + np.arange(n_grupos)
+    n_variables = 2 * n_pares + n_grupos
+    objetivo = np.zeros(n_variables)
+    objetivo[c] = -np.where(faltantes > 0, peso, 0.0)
+    objetivo[x] = PENALIZACION_HORAS_MILP * horas_caja
+    
+    filas, columnas, valores = [], [], []
+    def agregar(fila, columna, valor):
+        filas.append(fila)
+        columnas.append(columna)
+        valores.append(np.broadcast_to(valor, np.shape(fila)))
+    
+    # x - cajas_max * y <= 0
+    agregar(np.arange(n_pares), x, 1.0)
+    agregar(np.arange(n_pares), y, -cajas_max)
+    # faltante * cubierto - sum(std_pack * x) <= 0
+    base = n_pares
+    agregar(base + np.arange(n_grupos), c, faltantes)
+    agregar(base + grupos_par, x, -std_packs)
+    # sum(y) del grupo <= 1
+    base += n_grupos
+    agregar(base + grupos_par, y, 1.0)
+    # sum(horas_caja * x + tiempo_cambio * y) de la máquina <= capacidad
+    base += n_grupos
+    agregar(base + maquinas_par, x, horas_caja)
+    agregar(base + maquinas_par, y, tiempo_cambio)
+    n_filas = base + n_maquinas
+    
+    matriz = coo_matrix(
+        (np.concatenate(valores), (np.concatenate(filas), np.concatenate(columnas))),
+        shape=(n_filas, n_variables)
+    ).tocsr()
+    superior = np.concatenate([np.zeros(n_pares + n_grupos), np.ones(n_grupos), capacidad])
+    resultado = milp(
+        objetivo,
+        integrality=np.r_[np.ones(2 * n_pares), np.zeros(n_grupos)],
+        bounds=Bounds(np.zeros(n_variables), np.r_[cajas_max, np.ones(n_pares), (faltantes > 0).astype(float)]),
+        constraints=LinearConstraint(matriz, -np.inf, superior),
+        options={"time_limit": limite_tiempo, "mip_rel_gap": BRECHA_MILP}
+    )
+    # status 1: se alcanzó el límite de tiempo; la mejor solución encontrada (si hay) es factible
+    if resultado.status not in (0, 1) or resultado.x is None:
+        return None
+    cajas = np.round(resultado.x[x]).astype(np.int64)
+    # Las variables enteras vienen con tolerancia; se revisa que al redondear se respete todo
+    produce = cajas > 0
+    horas = np.bincount(maquinas_par, weights=horas_caja * cajas + tiempo_cambio * produce, minlength=n_maquinas)
+    if (cajas > cajas_max).any() or (horas > capacidad + 1e-6).any() \
+            or (np.bincount(grupos_par, weights=produce, minlength=n_grupos) > 1).any():
+        return None
+    return cajas, resultado.status == 0
+
+# Calendario de turnos del plan semanal
+DIAS_SEMANA = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes']
+HORAS_TURNO = 8.0
+
+def turnos_del_dia(horas_por_dia):
+    """Turnos de un día: tantos turnos completos de HORAS_TURNO como quepan y uno parcial
+    con el resto. Devuelve (etiquetas, horas de cada turno)."""
+    completos = int(horas_por_dia // HORAS_TURNO)
+    horas = [HORAS_TURNO] * completos
+    etiquetas = [f"Turno {i+1}" for i in range(completos)]
+    resto = horas_por_dia - completos * HORAS_TURNO
+    if resto > 1e-9:
+        horas.append(resto)
+        etiquetas.append(f"Turno {completos+1} ({resto:.1f}h)")
+    return etiquetas, horas
+
+def programar_turnos(transfers, productos, duraciones, dias_por_transfer, horas_por_transfer):
+    """Coloca los trabajos de cada transfer, uno tras otro en el orden recibido, en su
+    calendario de turnos.
+    
+    El tiempo disponible de cada transfer es una secuencia de segmentos (días × turnos
+    con su duración real, incluido el turno parcial); con la suma acumulada de los
+    segmentos y de las duraciones (que ya incluyen el cambio), los segmentos que toca cada
+    trabajo se encuentran por búsqueda binaria. Lo que no cabe en la semana se descarta.
+    Devuelve una tabla con un tramo (trabajo × turno) por fila: Transfer, Producto, Dia,
+    Turno, Inicio (horas desde el inicio de la semana), Horas y Utilizacion (% del turno)."""
+    transfers = np.asarray(transfers, dtype=object)
+    productos = np.asarray(productos, dtype=object)
+    duraciones = np.asarray(duraciones, dtype=float)
+    columnas = {'Transfer': [], 'Producto': [], 'Dia': [], 'Turno': [], 'Inicio': [], 'Horas': [], 'Utilizacion': []}
+    
+    codigos, unicos = pd.factorize(transfers)
+    for codigo, transfer in enumerate(unicos):
+        trabajos = np.flatnonzero(codigos == codigo)
+        etiquetas, horas_turno = turnos_del_dia(horas_por_transfer[transfer])
+        dias = min(int(dias_por_transfer[transfer]), len(DIAS_SEMANA))
+        if not horas_turno or dias <= 0:
+            continue
+        
+        # Límites de los segmentos del calendario y posición de cada trabajo en él
+        largo = np.tile(horas_turno, dias)
+        limites = np.r_[0.0, np.cumsum(largo)]
+        fin = np.cumsum(duraciones[trabajos])
+        inicio = fin - duraciones[trabajos]
+        fin = np.minimum(fin, limites[-1])
+        cabe = inicio < fin
+        trabajos, inicio, fin = trabajos[cabe], inicio[cabe], fin[cabe]
+        primero = np.searchsorted(limites, inicio, side='right') - 1
+        ultimo = np.searchsorted(limites, fin, side='left') - 1
+        
+        # Un tramo por cada segmento que toca cada trabajo
+        tramos = ultimo - primero + 1
+        trabajo = np.repeat(np.arange(len(trabajos)), tramos)
+        segmento = primero[trabajo] + np.arange(len(trabajo)) - np.repeat(np.cumsum(tramos) - tramos, tramos)
+        desde = np.maximum(inicio[trabajo], limites[segmento])
+        horas = np.minimum(fin[trabajo], limites[segmento + 1]) - desde
+        
+        columnas['Transfer'].append(np.full(len(trabajo), transfer, dtype=object))
+        columnas['Producto'].append(productos[trabajos][trabajo])
+        columnas['Dia'].append(np.array(DIAS_SEMANA, dtype=object)[segmento // len(horas_turno)])
+        columnas['Turno'].append(np.array(etiquetas, dtype=object)[segmento % len(horas_turno)])
+        columnas['Inicio'].append(desde)
+        columnas['Horas'].append(horas)
+        columnas['Utilizacion'].append(horas / largo[segmento] * 100)
+    
+    if not columnas['Horas']:
+        return pd.DataFrame({columna: [] for columna in columnas})
+    return pd.DataFrame({columna: np.concatenate(valores) for columna, valores in columnas.items()})
+
+# Matriz opcional de tiempos de cambio dependientes de la secuencia: columnas Desde, Hacia
+# (GrupoParte) y Horas; los pares que no aparecen usan el tiempo de cambio general
+ARCHIVO_CAMBIOS = os.environ.get("MATRIZ_CAMBIOS", "cambios.csv")
+PRESUPUESTO_SECUENCIA = 0.5  # Segundos de búsqueda local para todas las transfers
+
+@st.cache_resource
+def obtener_detector_cambios():
+    return DetectorCambiosArchivo(ARCHIVO_CAMBIOS)
+
+@cache_decorator(max_entries=4)  # Indexado por el hash del archivo, como el catálogo
+def cargar_matriz_cambios(hash_actual):
+    """Devuelve ({(desde, hacia): horas}, errores). Sin archivo la matriz queda vacía."""
+    if hash_actual is None:
+        return {}, []
+    try:
+        df = pd.read_csv(ARCHIVO_CAMBIOS, dtype=str, keep_default_na=False)
+        faltantes = [columna for columna in ("Desde", "Hacia", "Horas") if columna not in df.columns]
+        if faltantes:
+            raise ValueError(f"faltan columnas: {', '.join(faltantes)}")
+        desde, hacia = df["Desde"].str.strip(), df["Hacia"].str.strip()
+        horas = pd.to_numeric(df["Horas"].str.strip(), errors="coerce")
+        invalidas = ((desde == "") | (hacia == "") | ~(horas >= 0)).to_numpy()
+        errores = [
+            f"Línea {i + 2}: se requieren Desde, Hacia y Horas no negativas"
+            for i in np.flatnonzero(invalidas)[:MAX_ERRORES_CATALOGO]
+        ]
+        validas = ~invalidas
+        return dict(zip(zip(desde[validas], hacia[validas]), horas[validas].astype(float))), errores
+    except Exception as e:
+        return {}, [f"No se pudo leer {ARCHIVO_CAMBIOS}: {e}"]
+
+def matriz_cambios_grupos(grupos, cambios, tiempo_cambio):
+    # Horas de cambio entre cada par de grupos (fila: grupo anterior, columna: siguiente)
+    return np.array([[cambios.get((anterior, siguiente), tiempo_cambio) for siguiente in grupos]
+                     for anterior in grupos], dtype=float)
+
+def secuenciar_cambios(costo, presupuesto):
+    """Orden de los trabajos de una máquina con la menor suma de cambios entre trabajos
+    consecutivos (costo[i, j]: horas para pasar de i a j; el cambio del primer trabajo no
+    depende del orden).
+    
+    Parte del mejor vecino más cercano desde cada trabajo inicial y lo mejora con 2-opt
+    (invertir un tramo) y Or-opt (mover un tramo de hasta 3 trabajos) hasta que ningún
+    movimiento reduce el costo o se acaba el presupuesto en segundos. La ruta abierta se
+    trata como un ciclo con un nodo ficticio de costo 0 para no tener casos en los extremos.
+    Devuelve la lista de índices en el orden elegido."""
+    n = len(costo)
+    if n < 3:
+        return list(range(n))
+    limite = time.perf_counter() + presupuesto
+    
+    # Vecino más cercano desde cada inicio
+    mejor, mejor_costo = list(range(n)), np.inf
+    for inicio in range(n):
+        orden, libres, total = [inicio], np.ones(n, dtype=bool), 0.0
+        libres[inicio] = False
+        for _ in range(n - 1):
+            fila = np.where(libres, costo[orden[-1]], np.inf)
+            siguiente = int(np.argmin(fila))
+            total += fila[siguiente]
+            libres[siguiente] = False
+            orden.append(siguiente)
+        if total < mejor_costo:
+            mejor, mejor_costo = orden, total
+        if time.perf_counter() > limite:
+            break
+    
+    # Ciclo con el nodo ficticio n fijo en la posición 0
+    matriz = np.zeros((n + 1, n + 1))
+    matriz[:n, :n] = costo
+    ruta = np.array([n] + mejor)
+    m = n + 1
+    posiciones = np.arange(m)
+    mejora = True
+    while mejora and time.perf_counter() < limite:
+        mejora = False
+        
+        # 2-opt: invertir ruta[i..j]; los costos interiores se obtienen de sumas acumuladas
+        # en ambos sentidos (la matriz no es simétrica)
+        siguiente = np.roll(ruta, -1)
+        adelante = np.r_[0.0, np.cumsum(matriz[ruta, siguiente])]
+        atras = np.r_[0.0, np.cumsum(matriz[siguiente, ruta])]
+        i, j = posiciones[1:, None], posiciones[None, 1:]
+        anterior, despues = ruta[i - 1], ruta[(j + 1) % m]
+        delta = (matriz[anterior, ruta[j]] + matriz[ruta[i], despues]
+                 - matriz[anterior, ruta[i]] - matriz[ruta[j], despues]
+                 + (atras[j] - atras[i]) - (adelante[j] - adelante[i]))
+        delta = np.where(j > i, delta, np.inf)
+        mejor_par = np.unravel_index(np.argmin(delta), delta.shape)
+        if delta[mejor_par] < -1e-9:
+            a, b = mejor_par[0] + 1, mejor_par[1] + 1
+            ruta[a:b + 1] = ruta[a:b + 1][::-1]
+            mejora = True
+            continue
+        
+        # Or-opt: mover el tramo ruta[i:i+largo] entre otros dos trabajos, sin invertirlo;
+        # para cada tramo se evalúan todas las posiciones de inserción k a la vez. El
+        # presupuesto se revisa en cada tramo: al agotarse se aplica la mejor mejora hallada
+        lista = ruta.tolist()
+        mejor_movimiento, mejor_delta = None, -1e-9
+        agotado = False
+        for largo in (1, 2, 3):
+            for i in range(1, m - largo + 1):
+                if time.perf_counter() > limite:
+                    agotado = True
+                    break
+                primero, ultimo = lista[i], lista[i + largo - 1]
+                anterior, despues = lista[i - 1], lista[(i + largo) % m]
+                quitar = matriz[anterior, primero] + matriz[ultimo, despues] - matriz[anterior, despues]
+                resto = np.array(lista[:i] + lista[i + largo:])
+                siguientes = np.roll(resto, -1)
+                d = matriz[resto, primero] + matriz[ultimo, siguientes] - matriz[resto, siguientes] - quitar
+                # Insertar después de anterior lo deja donde estaba
+                d[i - 1] = np.inf
+                k = int(np.argmin(d))
+                if d[k] < mejor_delta:
+                    mejor_movimiento, mejor_delta = (i, largo, k), d[k]
+            if agotado:
+                break
+        if mejor_movimiento is not None:
+            i, largo, k = mejor_movimiento
+            tramo = lista[i:i + largo]
+            resto = lista[:i] + lista[i + largo:]
+            nueva = resto[:k + 1] + tramo + resto[k + 1:]
+            # Mantener el nodo ficticio al inicio
+            cero = nueva.index(n)
+            ruta = np.array(nueva[cero:] + nueva[:cero])
+            mejora = True
+    
+    return ruta[1:].tolist()
+
+@cache_decorator(max_entries=8)
+def secuenciar_plan(hash_cambios, trabajos, tiempo_cambio):
+    """Secuencia los grupos de cada transfer para reducir las horas de cambio.
+    
+    trabajos es una tupla de (maquina, grupos en el orden actual). Devuelve
+    {maquina: (grupos en el orden optimizado, horas de cambio de cada uno, horas de cambio
+    del orden actual, horas de cambio del optimizado)}."""
+    cambios, _ = cargar_matriz_cambios(hash_cambios)
+    presupuesto = PRESUPUESTO_SECUENCIA / max(1, len(trabajos))
+    resultado = {}
+    for maquina, grupos in trabajos:
+        costo = matriz_cambios_grupos(grupos, cambios, tiempo_cambio)
+        orden = secuenciar_cambios(costo, presupuesto)
+        actual = tiempo_cambio + sum(costo[i, i + 1] for i in range(len(grupos) - 1))
+        horas = [tiempo_cambio] + [costo[a, b] for a, b in zip(orden, orden[1:])]
+        # Nunca devolver un orden peor que el actual
+        if sum(horas) > actual:
+            orden = list(range(len(grupos)))
+            horas = [tiempo_cambio] + [costo[i, i + 1] for i in range(len(grupos) - 1)]
+        resultado[maquina] = ([grupos[i] for i in orden], [float(h) for h in horas], float(actual), float(sum(horas)))
+    return resultado
+
+# Motor de prioridades vectorizado: devuelve (Prioridad, MaquinaSeleccionada) alineados con df
+def asignar_prioridades(df):
+    """Asigna la prioridad de cada parte con faltante dentro de su máquina.
+    
+    Los grupos flexibles se reparten entre las máquinas donde tienen faltante con
+    asignar_flexibles. Dentro de cada máquina los grupos se ordenan por tiempo necesario
+    descendente (empates: grupos normales antes que flexibles, luego por nombre)."""
+    prioridad = pd.Series(np.nan, index=df.index, dtype=float)
+    maquina_seleccionada = pd.Series(np.nan, index=df.index, dtype=object)
+    
+    mask_faltante = df['Faltante'].to_numpy() > 0
+    if not mask_faltante.any():
+        return prioridad, maquina_seleccionada
+    
+    df_temp = df.loc[mask_faltante, ['GrupoParte', 'Maquina', 'TiempoNecesario', 'EsFlexible']]
+    flexible = df_temp['EsFlexible'].to_numpy(dtype=bool)
+    
+    # Carga de cada máquina con sus partes no flexibles con faltante
+    # (bincount suma en orden de filas, igual que MetricasIncrementales)
+    codigos_maquina, maquinas_temp = pd.factorize(df_temp['Maquina'], sort=True)
+    tiempos = df_temp['TiempoNecesario'].to_numpy(dtype=float)
+    carga_base = np.bincount(codigos_maquina[~flexible], weights=tiempos[~flexible], minlength=len(maquinas_temp))
     
-    # No filtrar por pares completos, incluir todos los grupos
-    # para manejar casos donde hay múltiples LH/RH para el mismo componente base
-    return parejas
+    # Repartir los grupos flexibles considerando la carga que cada uno agrega
+    if flexible.any():
+        codigos_grupo, _ = pd.factorize(df_temp['GrupoParte'].to_numpy()[flexible], sort=True)
+        seleccion = asignar_flexibles(codigos_grupo, codigos_maquina[flexible], tiempos[flexible], carga_base)
+        maquina_seleccionada.loc[df_temp.index[flexible]] = maquinas_temp.to_numpy()[seleccion]
+    
+    # Sólo cuentan las filas normales y las flexibles que están en su máquina seleccionada
+    activa = ~flexible | (df_temp['Maquina'].to_numpy() == maquina_seleccionada.loc[df_temp.index].to_numpy())
+    df_activas = df_temp[activa]
+    
+    # Tiempo de cada grupo en su máquina (el máximo de sus partes) y orden dentro de la máquina
+    tiempo_por_grupo = df_activas.groupby(['Maquina', 'GrupoParte'], sort=False).agg(
+        TiempoNecesario=('TiempoNecesario', 'max'),
+        EsFlexible=('EsFlexible', 'first')
+    ).reset_index()
+    tiempo_por_grupo = tiempo_por_grupo.sort_values(
+        ['Maquina', 'TiempoNecesario', 'EsFlexible', 'GrupoParte'],
+        ascending=[True, False, True, True],
+        kind='mergesort'
+    )
+    tiempo_por_grupo['Prioridad'] = tiempo_por_grupo.groupby('Maquina', sort=False).cumcount() + 1
+    
+    # Llevar la prioridad de cada grupo a sus filas
+    rango = pd.MultiIndex.from_frame(tiempo_por_grupo[['Maquina', 'GrupoParte']])
+    filas = pd.MultiIndex.from_frame(df_activas[['Maquina', 'GrupoParte']])
+    prioridad.loc[df_activas.index] = tiempo_por_grupo['Prioridad'].to_numpy()[rango.get_indexer(filas)]
+    
+    return prioridad, maquina_seleccionada
 
 # Calcular métricas (optimizado y corregido para manejar partes en diferentes máquinas)
-def calcular_metricas(catalogo, inventario):
+def calcular_metricas(catalogo, inventario, parejas=None):
     # Crear una copia del catálogo para no modificar el original
     df = catalogo.copy()
     
@@ -383,118 +2082,455 @@ def calcular_metricas(catalogo, inventario):
     # Calcular tiempo necesario (horas)
     df['TiempoNecesario'] = np.divide(faltante_array, rate_array, out=np.zeros_like(faltante_array, dtype=float), where=rate_array!=0)
     
-    # Crear un mapeo de todas las partes a su grupo base (sin considerar LH/RH)
-    todas_las_partes = tuple(df['Parte'].unique())
-    todos_los_grupos = identificar_parejas(todas_las_partes)
+    # Grupo (nombre base sin la marca de lado) y lado de cada parte
+    if parejas is None:
+        parejas = MotorParejas().analizar(df['Parte'])
+    for columna in ('GrupoParte', 'Lado', 'MarcaLado'):
+        df[columna] = df['Parte'].map(parejas[columna])
     
-    # Crear diccionario de mapeo para todas las partes
-    parte_a_grupo = {}
-    for parte in df['Parte']:
-        parte_a_grupo[parte] = parte  # Por defecto, cada parte es su propio grupo
+    # Marcar las partes que son flexibles (su grupo aparece en más de una máquina)
+    df['EsFlexible'] = df.groupby('GrupoParte')['Maquina'].transform('nunique').to_numpy() > 1
     
-    # Aplicar mapeo de grupos - ahora considerando todas las partes, no solo las que tienen faltante
-    for base_name, parts in todos_los_grupos.items():
-        for part in parts:
-            parte_a_grupo[part] = base_name
+    # Calcular prioridades y máquina seleccionada de forma vectorizada
+    df['Prioridad'], df['MaquinaSeleccionada'] = asignar_prioridades(df)
     
-    # Aplicar directamente el mapeo de grupos a todo el DataFrame
-    df['GrupoParte'] = df['Parte'].map(parte_a_grupo)
+    return df
+
+# Métricas incrementales: al cambiar el conteo de unas pocas partes sólo se recalculan sus filas
+class MetricasIncrementales:
+    """Mantiene las métricas del catálogo y las actualiza a partir de un delta de inventario.
     
-    # Identificar grupos que aparecen en múltiples máquinas
-    grupos_multimaquina = df.groupby('GrupoParte')['Maquina'].nunique()
-    grupos_multimaquina = grupos_multimaquina[grupos_multimaquina > 1].index.tolist()
+    Las columnas derivadas (Faltante, CajasNecesarias, TiempoNecesario) se recalculan sólo
+    para las filas de las partes modificadas y las prioridades se reordenan únicamente en
+    las máquinas afectadas: las de esas filas y las que ganan o pierden un grupo flexible.
+    El resultado es idéntico al de calcular_metricas con el inventario completo."""
     
-    # Marcar las partes que son flexibles (pueden ser producidas en más de una máquina)
-    df['EsFlexible'] = df['GrupoParte'].isin(grupos_multimaquina)
+    def __init__(self, catalogo, inventario, parejas=None):
+        self.catalogo = catalogo
+        self.df = calcular_metricas(catalogo, inventario, parejas)
+        self.inventario = {parte: inventario[parte] for parte in self.df['Parte'].unique()}
+        self.version = 0
+        # El inventario compartido se reemplaza en cada cambio: si es el mismo objeto no hay delta
+        self._ultimo_inventario = inventario
+        
+        # Arreglos base del catálogo (no cambian con el inventario)
+        self._objetivo = self.df['Objetivo'].to_numpy()
+        self._stdpack = self.df['StdPack'].to_numpy()
+        self._rate = self.df['Rate'].to_numpy()
+        self._flexible = self.df['EsFlexible'].to_numpy(dtype=bool)
+        self._cod_maquina, self._maquinas = pd.factorize(self.df['Maquina'], sort=True)
+        # Códigos de grupo en orden alfabético para desempatar igual que asignar_prioridades
+        self._cod_grupo, _ = pd.factorize(self.df['GrupoParte'], sort=True)
+        self._filas_parte = self.df.groupby('Parte', sort=False).indices
+        self._filas_maquina = np.split(
+            np.argsort(self._cod_maquina, kind='stable'),
+            np.cumsum(np.bincount(self._cod_maquina, minlength=len(self._maquinas)))[:-1]
+        )
+        self._filas_flex = np.flatnonzero(self._flexible)
+        # Versión por máquina: sólo avanza cuando cambian las filas o prioridades de esa máquina
+        self.version_maquina = dict.fromkeys(self._maquinas, 0)
+        self._partes = self.df['Parte'].to_numpy(dtype=object)
+        self._grupos = self.df['GrupoParte'].to_numpy(dtype=object)
+        self._colas = {}
+        self._resumen = (None, None)
+        
+        # Arreglos derivados que se actualizan por delta
+        self._inventario = self.df['Inventario'].to_numpy().copy()
+        self._faltante = self.df['Faltante'].to_numpy().copy()
+        self._cajas = self.df['CajasNecesarias'].to_numpy().copy()
+        self._tiempo = self.df['TiempoNecesario'].to_numpy(dtype=float).copy()
+        self._prioridad = self.df['Prioridad'].to_numpy(dtype=float).copy()
+        self._seleccionada = self._maquinas.get_indexer(self.df['MaquinaSeleccionada'])
     
-    # Filtrar para partes con faltante más eficientemente
-    mask_faltante = faltante_array > 0
-    if mask_faltante.any():
-        df_temp = df[mask_faltante].copy()
-        
-        # Calcular prioridades por grupo y máquina
-        # Primero calculamos para grupos normales (no flexibles)
-        tiempo_por_grupo = df_temp[~df_temp['EsFlexible']].groupby(['GrupoParte'])['TiempoNecesario'].max().reset_index()
-        
-        # Unir la información de máquina nuevamente para grupos normales
-        tiempo_por_grupo = tiempo_por_grupo.merge(
-            df_temp[['GrupoParte', 'Maquina']].drop_duplicates(),
-            on='GrupoParte',
-            how='left'
+    def vigente_para(self, catalogo):
+        # Las métricas sólo sirven mientras el catálogo sea el mismo
+        return self.catalogo is catalogo or (
+            len(self.catalogo) == len(catalogo) and self.catalogo.equals(catalogo)
         )
+    
+    def filas_maquina(self, maquina):
+        # Posiciones de las filas de una máquina, sin filtrar todo el DataFrame
+        return self._filas_maquina[self._maquinas.get_loc(maquina)]
+    
+    def cola(self, maquina):
+        """Cola de producción de la máquina: lista de (grupo, prioridad, filas) ordenada por
+        prioridad y luego por la parte de menor nombre, como la muestra el dashboard.
+        
+        filas son las posiciones (para iloc) de las partes del grupo con faltante en la
+        máquina. Se reconstruye sólo cuando cambia la versión de la máquina."""
+        if maquina not in self.version_maquina:
+            return []
+        version, cola = self._colas.get(maquina, (None, None))
+        if version != self.version_maquina[maquina]:
+            version, cola = self.version_maquina[maquina], self._construir_cola(maquina)
+            self._colas[maquina] = (version, cola)
+        return cola
+    
+    def resumen_grupos(self):
+        """Resumen por set: una fila por (GrupoParte, Maquina) con StdPack, Rate, promedios
+        de Inventario/Objetivo/Faltante, FaltanteTotal, CajasNecesarias, TiempoNecesario
+        (máximo), Prioridad, EsFlexible y NumTransfer.
+        
+        Lo usan las pestañas del administrador (la "Vista por Sets" de Tabla General agrupa
+        en cambio las partes filtradas). Se calcula con un solo groupby y se
+        reutiliza mientras no cambie la versión de las métricas; no debe modificarse."""
+        version, resumen = self._resumen
+        if version != self.version:
+            resumen = self.df.groupby(['GrupoParte', 'Maquina'], sort=True).agg(
+                StdPack=('StdPack', 'first'),
+                Rate=('Rate', 'first'),
+                Inventario=('Inventario', 'mean'),
+                Objetivo=('Objetivo', 'mean'),
+                Faltante=('Faltante', 'mean'),
+                FaltanteTotal=('Faltante', 'sum'),
+                CajasNecesarias=('CajasNecesarias', 'sum'),
+                TiempoNecesario=('TiempoNecesario', 'max'),
+                # Sólo las filas activas en la máquina tienen prioridad y todas comparten la del grupo
+                Prioridad=('Prioridad', 'min'),
+                EsFlexible=('EsFlexible', 'first')
+            ).reset_index()
+            # Número de transfer para visualización más limpia ("Transfer 7" -> "7")
+            partes_nombre = resumen['Maquina'].str.split()
+            resumen['NumTransfer'] = partes_nombre.str[1].where(partes_nombre.str.len() > 1, resumen['Maquina'])
+            self._resumen = (self.version, resumen)
+        return resumen
+    
+    def _construir_cola(self, maquina):
+        filas = self.filas_maquina(maquina)
+        # Filas con faltante; las flexibles sólo si esta máquina les asignó prioridad
+        filas = filas[(self._faltante[filas] > 0) & (~self._flexible[filas] | ~np.isnan(self._prioridad[filas]))]
+        grupos = {}
+        for fila in filas.tolist():
+            grupo = self._grupos[fila]
+            if grupo in grupos:
+                grupos[grupo][1] = min(grupos[grupo][1], self._partes[fila])
+                grupos[grupo][2].append(fila)
+            else:
+                # La prioridad del grupo es la de su primera fila
+                grupos[grupo] = [self._prioridad[fila], self._partes[fila], [fila]]
+        orden = sorted(grupos.items(), key=lambda item: (item[1][0], item[1][1]))
+        return [(grupo, prioridad, np.array(filas_grupo)) for grupo, (prioridad, _, filas_grupo) in orden]
+    
+    def actualizar(self, inventario):
+        if inventario is self._ultimo_inventario:
+            return self.df
+        self._ultimo_inventario = inventario
+        # Comparación rápida (en C) antes de calcular el delta contra el último inventario aplicado
+        if inventario == self.inventario:
+            return self.df
+        delta = {
+            parte: cantidad for parte, cantidad in inventario.items()
+            if parte in self.inventario and self.inventario[parte] != cantidad
+        }
+        return self.aplicar_delta(delta)
+    
+    def aplicar_delta(self, delta):
+        delta = {parte: cantidad for parte, cantidad in delta.items() if parte in self._filas_parte}
+        if not delta:
+            return self.df
+        self.inventario.update(delta)
+        
+        filas = np.concatenate([self._filas_parte[parte] for parte in delta])
+        valores = np.concatenate([
+            np.full(len(self._filas_parte[parte]), cantidad) for parte, cantidad in delta.items()
+        ])
+        
+        # Recalcular columnas derivadas sólo para las filas afectadas
+        faltante = np.maximum(self._objetivo[filas] - valores, 0)
+        cajas = faltante / self._stdpack[filas]
+        rate = self._rate[filas]
+        self._inventario[filas] = valores
+        self._faltante[filas] = faltante
+        self._cajas[filas] = np.ceil(np.where(cajas > 0, cajas, 0)).astype(int)
+        self._tiempo[filas] = np.divide(faltante, rate, out=np.zeros(len(filas), dtype=float), where=rate != 0)
+        
+        # Volver a repartir los grupos flexibles con la nueva carga de las partes no flexibles
+        normales = ~self._flexible
+        carga = np.bincount(self._cod_maquina[normales], weights=self._tiempo[normales], minlength=len(self._maquinas))
+        seleccionada = self._seleccionar_flexibles(carga)
+        cambio_seleccion = seleccionada != self._seleccionada
+        
+        # Reordenar sólo las máquinas afectadas
+        afectadas = set(self._cod_maquina[filas].tolist())
+        afectadas.update(self._seleccionada[cambio_seleccion].tolist())
+        afectadas.update(seleccionada[cambio_seleccion].tolist())
+        afectadas.discard(-1)
+        self._seleccionada = seleccionada
+        for maquina in afectadas:
+            self._ordenar_maquina(maquina)
+            self.version_maquina[self._maquinas[maquina]] += 1
+        
+        self.df['Inventario'] = self._inventario.copy()
+        self.df['Faltante'] = self._faltante.copy()
+        self.df['CajasNecesarias'] = self._cajas.copy()
+        self.df['TiempoNecesario'] = self._tiempo.copy()
+        self.df['Prioridad'] = self._prioridad.copy()
+        if cambio_seleccion.any():
+            self.df['MaquinaSeleccionada'] = pd.Series(
+                np.where(seleccionada >= 0, self._maquinas.to_numpy()[seleccionada], np.nan),
+                index=self.df.index, dtype=object
+            )
+        self.version += 1
+        return self.df
+    
+    def _seleccionar_flexibles(self, carga):
+        # Máquina asignada a cada fila flexible con faltante (-1 en las demás)
+        seleccionada = np.full(len(self._cod_maquina), -1)
+        filas = self._filas_flex[self._faltante[self._filas_flex] > 0]
+        if len(filas):
+            seleccionada[filas] = asignar_flexibles(
+                self._cod_grupo[filas], self._cod_maquina[filas], self._tiempo[filas], carga
+            )
+        return seleccionada
+    
+    def _ordenar_maquina(self, maquina):
+        filas = self._filas_maquina[maquina]
+        self._prioridad[filas] = np.nan
+        activas = filas[
+            (self._faltante[filas] > 0)
+            & (~self._flexible[filas] | (self._seleccionada[filas] == maquina))
+        ]
+        if len(activas) == 0:
+            return
+        
+        # Tiempo por grupo (máximo de sus partes) y orden: tiempo desc, normales antes que flexibles, nombre
+        grupos, inverso = np.unique(self._cod_grupo[activas], return_inverse=True)
+        tiempo_grupo = np.full(len(grupos), -np.inf)
+        np.maximum.at(tiempo_grupo, inverso, self._tiempo[activas])
+        flexible_grupo = np.zeros(len(grupos), dtype=bool)
+        flexible_grupo[inverso] = self._flexible[activas]
+        orden = np.lexsort((grupos, flexible_grupo, -tiempo_grupo))
+        rango = np.empty(len(grupos), dtype=float)
+        rango[orden] = np.arange(1, len(grupos) + 1)
+        self._prioridad[activas] = rango[inverso]
+
+# Calcular métricas basadas en inventario actual (el modo kiosko usa las métricas compartidas
+# y cada máquina las consulta desde su propio fragmento)
+if not modo_kiosko:
+    if 'metricas' not in st.session_state or not st.session_state.metricas.vigente_para(catalogo):
+        st.session_state.metricas = MetricasIncrementales(catalogo, st.session_state.inventario, parejas_partes)
+    df_metricas = st.session_state.metricas.actualizar(st.session_state.inventario)
+
+def mostrar_maquina(df_metricas, cola, maquina):
+    """Sección del dashboard de una máquina: grupo prioritario, progreso y siguiente en la cola.
+    
+    cola es el índice precalculado de la máquina (MetricasIncrementales.cola), de modo que
+    no se filtra df_metricas para cada máquina ni para cada grupo."""
+    st.subheader(f"Máquina: {maquina}")
+    
+    if cola:
+        # Tomar el grupo con mayor prioridad (sólo sus filas con faltante en esta máquina)
+        grupo_prioritario, _, filas_prioritario = cola[0]
+        partes_grupo_prioritario = df_metricas.iloc[filas_prioritario]
+        
+        # Ordenar las partes por lado (izquierdo y luego derecho) y luego alfabéticamente
+        partes_grupo_prioritario = partes_grupo_prioritario.sort_values(['Lado', 'Parte'])
+        
+        # Mostrar también el siguiente grupo en la cola (si existe)
+        has_next_group = len(cola) > 1
+        partes_siguiente_grupo = None
+        if has_next_group:
+            next_grupo_prioritario, _, filas_siguiente = cola[1]
+            partes_siguiente_grupo = df_metricas.iloc[filas_siguiente].sort_values('Parte')
+        
+        # Cabecera con el nombre base del grupo
+        if partes_grupo_prioritario['Lado'].iloc[0] != SIN_LADO:
+            nombre_base = grupo_prioritario
+            st.markdown(f"### Set: **{nombre_base}**")
+            prioridad_valor = partes_grupo_prioritario['Prioridad'].iloc[0]
+            prioridad_display = int(prioridad_valor) if pd.notnull(prioridad_valor) else '-'
+            st.markdown(f"**Prioridad:** {prioridad_display}")
+            
+            # Mostrar información del inventario en una caja destacada
+            inventario_total = partes_grupo_prioritario['Inventario'].sum()
+            objetivo_total = partes_grupo_prioritario['Objetivo'].sum()
+            
+            st.info(f"📦 **Inventario Actual Total:** {int(inventario_total)} piezas de {int(objetivo_total)} objetivo")
+            
+            # Crear una tabla para el set
+            data_set = []
+            
+            for _, parte in partes_grupo_prioritario.iterrows():
+                lado = {
+                    LADO_IZQUIERDO: f"Izquierdo ({parte['MarcaLado']})",
+                    LADO_DERECHO: f"Derecho ({parte['MarcaLado']})",
+                }.get(parte['Lado'], "-")
+                data_set.append({
+                    "Parte": parte['Parte'],
+                    "Lado": lado,
+                    "Inventario": int(parte['Inventario']),
+                    "Objetivo": int(parte['Objetivo']),
+                    "Faltante": int(parte['Faltante']),
+                    "Cajas": int(parte['CajasNecesarias'])
+                })
+            
+            # Convertir a DataFrame para mostrar como tabla
+            df_set = pd.DataFrame(data_set)
+            st.table(df_set)
+            
+            # Calcular tiempo total (usar el máximo)
+            tiempo_max = partes_grupo_prioritario['TiempoNecesario'].max()
+            st.metric("Tiempo total necesario (horas)", f"{tiempo_max:.2f}")
         
-        # Para los grupos flexibles (múltiples máquinas), elegiremos solo una máquina basada en la prioridad
-        for grupo in grupos_multimaquina:
-            grupo_df = df_temp[df_temp['GrupoParte'] == grupo]
-            if not grupo_df.empty:
-                # Para cada grupo flexible con faltante, calculamos qué máquina tiene menos carga
-                # y priorizamos colocar el grupo ahí
-                maquinas_disponibles = grupo_df['Maquina'].unique()
+        else:
+            # Si no es un par LH/RH, mostrar como antes
+            parte_asignada = partes_grupo_prioritario.iloc[0]
+            
+            # Crear columnas para mostrar la información
+            col1, col2, col3 = st.columns(3)
+            
+            # Mostrar el nombre completo del producto (sin truncar)
+            with col1:
+                st.write("**Producto:**")
+                st.write(f"**{parte_asignada['Parte']}**")
                 
-                # Elegir la máquina con menor tiempo total acumulado
-                maquina_optima = None
-                min_tiempo_total = float('inf')
+            with col2:
+                st.metric("Objetivo", f"{int(parte_asignada['Objetivo'])}")
                 
-                for maquina in maquinas_disponibles:
-                    tiempo_total = df_temp[df_temp['Maquina'] == maquina]['TiempoNecesario'].sum()
-                    if tiempo_total < min_tiempo_total:
-                        min_tiempo_total = tiempo_total
-                        maquina_optima = maquina
+            with col3:
+                st.metric("Cajas a Correr", f"{int(parte_asignada['CajasNecesarias'])}")
+            
+            # Mostrar inventario y tiempo en columnas
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                # Mostrar inventario con color basado en el nivel
+                inventario = int(parte_asignada['Inventario'])
+                objetivo = int(parte_asignada['Objetivo'])
+                porcentaje = (inventario / objetivo * 100) if objetivo > 0 else 0
                 
-                # Filtrar sólo la máquina óptima para este grupo y añadir a tiempo_por_grupo
-                grupo_fila = {
-                    'GrupoParte': grupo,
-                    'TiempoNecesario': grupo_df[grupo_df['Maquina'] == maquina_optima]['TiempoNecesario'].max(),
-                    'Maquina': maquina_optima
+                if porcentaje >= 75:
+                    st.success(f"📦 **Inventario:** {inventario} piezas ({porcentaje:.1f}%)")
+                elif porcentaje >= 35:
+                    st.warning(f"📦 **Inventario:** {inventario} piezas ({porcentaje:.1f}%)")
+                else:
+                    st.error(f"📦 **Inventario:** {inventario} piezas ({porcentaje:.1f}%)")
+            
+            with col2:
+                st.metric("Tiempo (horas)", f"{parte_asignada['TiempoNecesario']:.2f}")
+            
+            # Mostrar prioridad con un indicador visual
+            prioridad_valor = parte_asignada['Prioridad']
+            prioridad_display = int(prioridad_valor) if pd.notnull(prioridad_valor) else '-'
+            st.write(f"**Prioridad:** {prioridad_display}")
+        
+        # Barra de progreso para visualizar el avance hacia el objetivo para el grupo
+        inventario_promedio = partes_grupo_prioritario['Inventario'].mean()
+        objetivo_promedio = partes_grupo_prioritario['Objetivo'].mean()
+        progreso = min(100, (inventario_promedio / objetivo_promedio) * 100) if objetivo_promedio > 0 else 0
+        
+        # Definir color de la barra de progreso según el nivel
+        if progreso >= 75:
+            st.markdown("""
+            <style>
+                .stProgress > div > div {
+                    background-color: #0c0;
                 }
-                tiempo_por_grupo = pd.concat([tiempo_por_grupo, pd.DataFrame([grupo_fila])], ignore_index=True)
-                
-                # Marcar en df_temp que esta parte flexible usa esta máquina específica
-                df_temp.loc[df_temp['GrupoParte'] == grupo, 'MaquinaSeleccionada'] = maquina_optima
-                
-        # Asignar prioridades de forma vectorizada por máquina
-        prioridad_por_maquina = {}
-        for maquina in df['Maquina'].unique():
-            # Filtrar por máquina y ordenar
-            maquina_grupos = tiempo_por_grupo[tiempo_por_grupo['Maquina'] == maquina]
-            if not maquina_grupos.empty:
-                maquina_grupos_sorted = maquina_grupos.sort_values('TiempoNecesario', ascending=False)
-                # Asignar prioridades
-                for i, (_, row) in enumerate(maquina_grupos_sorted.iterrows()):
-                    prioridad_por_maquina[(row['GrupoParte'], maquina)] = i + 1
-        
-        # Asignar prioridades al DataFrame temporal
-        df_temp['Prioridad'] = None
-        
-        # Para los grupos normales (no flexibles)
-        for idx, row in df_temp[~df_temp['EsFlexible']].iterrows():
-            df_temp.loc[idx, 'Prioridad'] = prioridad_por_maquina.get((row['GrupoParte'], row['Maquina']), None)
-        
-        # Para los grupos flexibles, asignar prioridad solo a la máquina seleccionada
-        for grupo in grupos_multimaquina:
-            grupo_filas = df_temp[df_temp['GrupoParte'] == grupo]
-            if not grupo_filas.empty and 'MaquinaSeleccionada' in grupo_filas.columns:
-                maquina_seleccionada = grupo_filas['MaquinaSeleccionada'].iloc[0]
-                for idx, row in grupo_filas.iterrows():
-                    if row['Maquina'] == maquina_seleccionada:
-                        df_temp.loc[idx, 'Prioridad'] = prioridad_por_maquina.get((row['GrupoParte'], maquina_seleccionada), None)
-        
-        # Convertir a tipo numérico para evitar problemas de tipos mixtos
-        df_temp['Prioridad'] = pd.to_numeric(df_temp['Prioridad'], errors='coerce')
-        
-        # Transferir prioridades al DataFrame principal para las partes con faltante
-        df.loc[mask_faltante, 'Prioridad'] = df_temp['Prioridad'].values
+            </style>""", unsafe_allow_html=True)
+        elif progreso >= 35:
+            st.markdown("""
+            <style>
+                .stProgress > div > div {
+                    background-color: #fc0;
+                }
+            </style>""", unsafe_allow_html=True)
+        else:
+            st.markdown("""
+            <style>
+                .stProgress > div > div {
+                    background-color: #f00;
+                }
+            </style>""", unsafe_allow_html=True)
+            
+        st.progress(progreso / 100)
+        
+        # Mostrar información del siguiente grupo (si existe)
+        if has_next_group and partes_siguiente_grupo is not None and not partes_siguiente_grupo.empty:
+            st.markdown("---")
+            st.markdown("### 🔄 Siguiente en la cola")
+            
+            # Obtener el nombre base del siguiente grupo
+            siguiente_nombre_base = next_grupo_prioritario
+            siguiente_prioridad = partes_siguiente_grupo['Prioridad'].iloc[0]
+            
+            # Cabecera con datos básicos
+            st.markdown(f"**Set:** {siguiente_nombre_base}")
+            prioridad_display = int(siguiente_prioridad) if pd.notnull(siguiente_prioridad) else '-'
+            st.markdown(f"**Prioridad:** {prioridad_display}")
+            
+            # Mostrar inventario del siguiente grupo
+            siguiente_inventario_total = partes_siguiente_grupo['Inventario'].sum()
+            siguiente_objetivo_total = partes_siguiente_grupo['Objetivo'].sum()
+            siguiente_tiempo_max = partes_siguiente_grupo['TiempoNecesario'].max()
+            
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.info(f"📦 **Inventario:** {int(siguiente_inventario_total)} piezas")
+            with col2:
+                st.info(f"⏱ **Tiempo:** {siguiente_tiempo_max:.2f} horas")
+            with col3:
+                st.info(f"📊 **Cajas:** {int(partes_siguiente_grupo['CajasNecesarias'].sum())}")
     else:
-        # Asignar valores NaN en lugar de None para mejor compatibilidad
-        df['Prioridad'] = np.nan
+        st.info("🟢 Máquina Libre")
     
-    return df
+    st.divider()  # Separador visual entre máquinas
 
-# Calcular métricas basadas en inventario actual
-df_metricas = calcular_metricas(catalogo, st.session_state.inventario)
+# Métricas del modo kiosko: una sola instancia por versión del catálogo para todas las pantallas
+# de piso. Las prioridades de una máquina dependen del reparto de los grupos flexibles en todo el
+# catálogo, así que se calculan una vez y cada cambio de inventario se aplica por delta una sola
+# vez para todas las pantallas (el lock serializa las actualizaciones y lecturas de los fragmentos)
+@st.cache_resource(max_entries=2)
+def obtener_metricas_kiosko(hash_catalogo, _catalogo, _parejas, _inventario):
+    return MetricasIncrementales(_catalogo, _inventario, _parejas), threading.Lock()
+
+def mostrar_maquina_kiosko(maquina):
+    """Sección de una máquina en el modo kiosko. Como fragmento se ejecuta cada
+    intervalo_kiosko segundos y sólo se vuelve a dibujar ella misma.
+    
+    Guarda en la sesión los dos grupos que muestra (prioritario y siguiente) con la versión
+    de la máquina; mientras esa versión no cambie se dibujan sin consultar las métricas."""
+    # Un catálogo distinto puede cambiar las máquinas: recargar la página completa
+    if obtener_detector_catalogo().hash() != hash_catalogo:
+        st.rerun()
+    
+    metricas, lock = obtener_metricas_kiosko(hash_catalogo, catalogo, parejas_partes, st.session_state.inventario)
+    inventario, _, _ = cargar_inventario()
+    secciones = st.session_state.setdefault('kiosko_secciones', {})
+    version, df_seccion, cola = secciones.get((hash_catalogo, maquina), (None, None, None))
+    with lock:
+        metricas.actualizar(inventario)
+        if metricas.version_maquina.get(maquina) != version:
+            # Copiar sólo las filas de los dos grupos mostrados, con posiciones relativas a la copia
+            cola = metricas.cola(maquina)[:2]
+            filas = [filas_grupo for _, _, filas_grupo in cola]
+            df_seccion = metricas.df.iloc[np.concatenate(filas) if filas else []].copy()
+            inicios = np.cumsum([0] + [len(f) for f in filas])
+            cola = [(grupo, prioridad, np.arange(inicio, inicio + len(filas_grupo)))
+                    for (grupo, prioridad, filas_grupo), inicio in zip(cola, inicios.tolist())]
+            secciones[(hash_catalogo, maquina)] = (metricas.version_maquina.get(maquina), df_seccion, cola)
+    mostrar_maquina(df_seccion, cola, maquina)
 
 # Contenido principal basado en la página seleccionada
-if st.session_state.page == 'dashboard':
+if modo_kiosko:
+    # PANTALLA DE PISO: sin navegación, cada máquina se actualiza de forma independiente
+    st.markdown("""
+    <style>
+        [data-testid="stSidebar"], [data-testid="collapsedControl"] {
+            display: none;
+        }
+    </style>""", unsafe_allow_html=True)
+    
+    if maquina_kiosko and maquina_kiosko not in maquinas:
+        st.error(f"La máquina '{maquina_kiosko}' no existe en el catálogo. Máquinas: {', '.join(maquinas)}")
+    else:
+        # Con una máquina fijada sólo se prepara y dibuja su sección; cada máquina es un
+        # fragmento que se actualiza por su cuenta sin volver a ejecutar la página
+        seccion_kiosko = (fragmento(run_every=intervalo_kiosko)(mostrar_maquina_kiosko)
+                          if fragmento is not None else mostrar_maquina_kiosko)
+        for maquina in ([maquina_kiosko] if maquina_kiosko else maquinas):
+            seccion_kiosko(maquina)
+
+elif st.session_state.page == 'dashboard':
     # PÁGINA PRINCIPAL - DASHBOARD
     st.header("📊 Dashboard por Máquina")
     
@@ -502,11 +2538,10 @@ if st.session_state.page == 'dashboard':
     if hasattr(st.session_state, 'ultima_actualizacion'):
         if st.session_state.ultima_actualizacion != "Nuevo":
             try:
-                # Cargar datos completos para mostrar usuario
-                with open("inventario.json", "r") as f:
-                    datos = json.load(f)
-                usuario = datos.get("usuario", "Sistema")
-                fecha_str = datos.get("ultima_actualizacion", st.session_state.ultima_actualizacion)
+                # Metadatos del último guardado desde el inventario compartido (en memoria)
+                ultima = obtener_inventario_compartido().metadatos()
+                usuario = ultima["usuario"]
+                fecha_str = ultima["ts"]
                 
                 # Mostrar la fecha directamente (ya está en hora CDMX al guardarse)
                 st.caption(f"📅 Última actualización: {fecha_str} por {usuario}")
@@ -546,302 +2581,161 @@ if st.session_state.page == 'dashboard':
 
     # Crear una fila para cada máquina
     for maquina in maquinas:
-        st.subheader(f"Máquina: {maquina}")
-        
-        # Filtrar partes para esta máquina
-        df_maquina = df_metricas[df_metricas['Maquina'] == maquina].copy()
-        
-        # Para partes flexibles, solo incluir las que tienen prioridad asignada en esta máquina
-        if 'EsFlexible' in df_maquina.columns:
-            mask_flexible = df_maquina['EsFlexible'] == True
-            if mask_flexible.any():
-                # Mantener solo las partes flexibles que tienen prioridad asignada
-                df_maquina = df_maquina[~mask_flexible | (~df_maquina['Prioridad'].isna() & mask_flexible)]
-        
-        # Si hay partes con faltante para esta máquina
-        df_faltante = df_maquina[df_maquina['Faltante'] > 0].copy()
-        
-        if not df_faltante.empty:
-            # Agrupar por GrupoParte para mostrar los sets juntos
-            grupos_partes = df_faltante['GrupoParte'].unique()
-            
-            # Ordenar por prioridad primero, luego por número de parte más bajo
-            prioridades = {}
-            for grupo in grupos_partes:
-                # Filtrar por grupo (ahora el grupo incluye todas las LH y RH)
-                partes_grupo = df_faltante[df_faltante['GrupoParte'] == grupo]
-                if not partes_grupo.empty:
-                    # Guardar prioridad y nombre más corto para ordenar de forma intuitiva
-                    prioridades[grupo] = (
-                        partes_grupo['Prioridad'].iloc[0],  # Prioridad
-                        min(partes_grupo['Parte'].tolist())  # Parte más baja lexicográficamente
-                    )
-            
-            # Ordenar grupos por prioridad primero, luego por nombre
-            grupos_ordenados = sorted(prioridades.items(), key=lambda x: (x[1][0], x[1][1]))
-            
-            # Tomar el grupo con mayor prioridad
-            grupo_prioritario = grupos_ordenados[0][0]
-            
-            # Filtrar las partes de este grupo SOLO para esta máquina
-            # (importante para manejar el caso especial de piezas que pueden estar en múltiples máquinas)
-            partes_grupo_prioritario = df_faltante[df_faltante['GrupoParte'] == grupo_prioritario]
-            
-            # Ordenar las partes primero por LH/RH (para que aparezcan juntas) y luego alfabéticamente
-            def orden_personalizado(parte):
-                if " LH" in parte:
-                    return (parte.replace(" LH", ""), 0)
-                elif " RH" in parte:
-                    return (parte.replace(" RH", ""), 1)
-                return (parte, 2)
-            
-            # Ordenar con la función personalizada
-            partes_grupo_prioritario = partes_grupo_prioritario.copy()
-            partes_grupo_prioritario['orden'] = partes_grupo_prioritario['Parte'].apply(orden_personalizado)
-            partes_grupo_prioritario = partes_grupo_prioritario.sort_values('orden')
-            
-            # Mostrar también el siguiente grupo en la cola (si existe)
-            has_next_group = len(grupos_ordenados) > 1
-            next_group = None
-            partes_siguiente_grupo = None
-            if has_next_group:
-                next_grupo_prioritario = grupos_ordenados[1][0]
-                partes_siguiente_grupo = df_faltante[df_faltante['GrupoParte'] == next_grupo_prioritario].sort_values('Parte')
-            
-            # Cabecera con el nombre base del grupo
-            if "LH" in partes_grupo_prioritario['Parte'].iloc[0] or "RH" in partes_grupo_prioritario['Parte'].iloc[0]:
-                nombre_base = grupo_prioritario
-                st.markdown(f"### Set: **{nombre_base}**")
-                prioridad_valor = partes_grupo_prioritario['Prioridad'].iloc[0]
-                prioridad_display = int(prioridad_valor) if pd.notnull(prioridad_valor) else '-'
-                st.markdown(f"**Prioridad:** {prioridad_display}")
-                
-                # Mostrar información del inventario en una caja destacada
-                inventario_total = partes_grupo_prioritario['Inventario'].sum()
-                objetivo_total = partes_grupo_prioritario['Objetivo'].sum()
-                
-                st.info(f"📦 **Inventario Actual Total:** {int(inventario_total)} piezas de {int(objetivo_total)} objetivo")
-                
-                # Crear una tabla para el set
-                data_set = []
-                
-                for _, parte in partes_grupo_prioritario.iterrows():
-                    lado = "Izquierdo (LH)" if "LH" in parte['Parte'] else "Derecho (RH)"
-                    data_set.append({
-                        "Parte": parte['Parte'],
-                        "Lado": lado,
-                        "Inventario": int(parte['Inventario']),
-                        "Objetivo": int(parte['Objetivo']),
-                        "Faltante": int(parte['Faltante']),
-                        "Cajas": int(parte['CajasNecesarias'])
-                    })
-                
-                # Convertir a DataFrame para mostrar como tabla
-                df_set = pd.DataFrame(data_set)
-                st.table(df_set)
-                
-                # Calcular tiempo total (usar el máximo)
-                tiempo_max = partes_grupo_prioritario['TiempoNecesario'].max()
-                st.metric("Tiempo total necesario (horas)", f"{tiempo_max:.2f}")
-            
-            else:
-                # Si no es un par LH/RH, mostrar como antes
-                parte_asignada = partes_grupo_prioritario.iloc[0]
-                
-                # Crear columnas para mostrar la información
-                col1, col2, col3 = st.columns(3)
-                
-                # Mostrar el nombre completo del producto (sin truncar)
-                with col1:
-                    st.write("**Producto:**")
-                    st.write(f"**{parte_asignada['Parte']}**")
-                    
-                with col2:
-                    st.metric("Objetivo", f"{int(parte_asignada['Objetivo'])}")
-                    
-                with col3:
-                    st.metric("Cajas a Correr", f"{int(parte_asignada['CajasNecesarias'])}")
-                
-                # Mostrar inventario y tiempo en columnas
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    # Mostrar inventario con color basado en el nivel
-                    inventario = int(parte_asignada['Inventario'])
-                    objetivo = int(parte_asignada['Objetivo'])
-                    porcentaje = (inventario / objetivo * 100) if objetivo > 0 else 0
-                    
-                    if porcentaje >= 75:
-                        st.success(f"📦 **Inventario:** {inventario} piezas ({porcentaje:.1f}%)")
-                    elif porcentaje >= 35:
-                        st.warning(f"📦 **Inventario:** {inventario} piezas ({porcentaje:.1f}%)")
-                    else:
-                        st.error(f"📦 **Inventario:** {inventario} piezas ({porcentaje:.1f}%)")
-                
-                with col2:
-                    st.metric("Tiempo (horas)", f"{parte_asignada['TiempoNecesario']:.2f}")
-                
-                # Mostrar prioridad con un indicador visual
-                prioridad_valor = parte_asignada['Prioridad']
-                prioridad_display = int(prioridad_valor) if pd.notnull(prioridad_valor) else '-'
-                st.write(f"**Prioridad:** {prioridad_display}")
-            
-            # Barra de progreso para visualizar el avance hacia el objetivo para el grupo
-            inventario_promedio = partes_grupo_prioritario['Inventario'].mean()
-            objetivo_promedio = partes_grupo_prioritario['Objetivo'].mean()
-            progreso = min(100, (inventario_promedio / objetivo_promedio) * 100) if objetivo_promedio > 0 else 0
-            
-            # Definir color de la barra de progreso según el nivel
-            if progreso >= 75:
-                st.markdown("""
-                <style>
-                    .stProgress > div > div {
-                        background-color: #0c0;
-                    }
-                </style>""", unsafe_allow_html=True)
-            elif progreso >= 35:
-                st.markdown("""
-                <style>
-                    .stProgress > div > div {
-                        background-color: #fc0;
-                    }
-                </style>""", unsafe_allow_html=True)
-            else:
-                st.markdown("""
-                <style>
-                    .stProgress > div > div {
-                        background-color: #f00;
-                    }
-                </style>""", unsafe_allow_html=True)
-                
-            st.progress(progreso / 100)
-            
-            # Mostrar información del siguiente grupo (si existe)
-            if has_next_group and partes_siguiente_grupo is not None and not partes_siguiente_grupo.empty:
-                st.markdown("---")
-                st.markdown("### 🔄 Siguiente en la cola")
-                
-                # Obtener el nombre base del siguiente grupo
-                siguiente_nombre_base = next_grupo_prioritario
-                siguiente_prioridad = partes_siguiente_grupo['Prioridad'].iloc[0]
-                
-                # Cabecera con datos básicos
-                st.markdown(f"**Set:** {siguiente_nombre_base}")
-                prioridad_display = int(siguiente_prioridad) if pd.notnull(siguiente_prioridad) else '-'
-                st.markdown(f"**Prioridad:** {prioridad_display}")
-                
-                # Mostrar inventario del siguiente grupo
-                siguiente_inventario_total = partes_siguiente_grupo['Inventario'].sum()
-                siguiente_objetivo_total = partes_siguiente_grupo['Objetivo'].sum()
-                siguiente_tiempo_max = partes_siguiente_grupo['TiempoNecesario'].max()
-                
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    st.info(f"📦 **Inventario:** {int(siguiente_inventario_total)} piezas")
-                with col2:
-                    st.info(f"⏱ **Tiempo:** {siguiente_tiempo_max:.2f} horas")
-                with col3:
-                    st.info(f"📊 **Cajas:** {int(partes_siguiente_grupo['CajasNecesarias'].sum())}")
-        else:
-            st.info("🟢 Máquina Libre")
-        
-        st.divider()  # Separador visual entre máquinas
+        mostrar_maquina(df_metricas, st.session_state.metricas.cola(maquina), maquina)
 
 elif st.session_state.page == 'update_inventory':
     # PÁGINA DE ACTUALIZACIÓN DE INVENTARIO
     st.header("📝 Actualización de Inventario")
     
-    with st.form("update_inventory_form"):
-        st.write("Ingrese el inventario actual para cada producto:")
-        
-        # Crear dos columnas para organizar mejor los inputs
-        col1, col2 = st.columns(2)
-        
-        # Obtener todas las partes y ordenarlas alfabéticamente
-        partes_unicas = sorted(catalogo['Parte'].unique())
-            
-        # Crear columnas para mostrar las partes
-        container = st.container()
-        
-        # Dividir las partes en dos columnas para mejor visualización
-        mitad = len(partes_unicas) // 2
-        
-        # Primera columna
-        with col1:
-            for parte in partes_unicas[:mitad]:
-                st.session_state.temp_inventario[parte] = st.number_input(
+    temp_inventario = st.session_state.temp_inventario
+    
+    # Filtros por máquina y por texto: sólo se crean widgets para las partes de la página visible
+    def reiniciar_pagina():
+        st.session_state.pagina_inventario = 1
+    
+    col_maquina, col_busqueda = st.columns(2)
+    with col_maquina:
+        maquina_filtro = st.selectbox("Máquina", ["Todas"] + maquinas, key="filtro_maquina_inventario",
+                                      on_change=reiniciar_pagina)
+    with col_busqueda:
+        busqueda = st.text_input("Buscar parte", key="busqueda_inventario", on_change=reiniciar_pagina)
+    
+    # Obtener las partes del filtro (ya ordenadas alfabéticamente)
+    partes_filtradas = sorted(atributos_partes) if maquina_filtro == "Todas" else partes_por_maquina.get(maquina_filtro, [])
+    if busqueda.strip():
+        texto_busqueda = busqueda.strip().lower()
+        partes_filtradas = [parte for parte in partes_filtradas if texto_busqueda in parte.lower()]
+    
+    total_paginas = max(1, math.ceil(len(partes_filtradas) / PARTES_POR_PAGINA))
+    if st.session_state.get('pagina_inventario', 1) > total_paginas:
+        st.session_state.pagina_inventario = total_paginas
+    pagina = st.number_input(f"Página (de {total_paginas})", min_value=1, max_value=total_paginas,
+                             key="pagina_inventario")
+    partes_pagina = partes_filtradas[(pagina - 1) * PARTES_POR_PAGINA:pagina * PARTES_POR_PAGINA]
+    
+    st.write("Ingrese el inventario actual para cada producto:")
+    st.caption(f"{len(partes_filtradas)} partes en el filtro, mostrando {len(partes_pagina)}")
+    
+    # Dividir las partes de la página en dos columnas para mejor visualización; los valores
+    # editados se guardan en temp_inventario y se conservan al cambiar de página o de filtro
+    col1, col2 = st.columns(2)
+    mitad = len(partes_pagina) // 2
+    for columna, partes_columna in ((col1, partes_pagina[:mitad]), (col2, partes_pagina[mitad:])):
+        with columna:
+            for parte in partes_columna:
+                temp_inventario[parte] = st.number_input(
                     f"{parte}", 
                     min_value=0, 
-                    value=st.session_state.inventario[parte],
+                    value=temp_inventario.setdefault(parte, st.session_state.inventario.get(parte, 0)),
                     key=f"inv_{parte}",
-                    help=f"Estándar: {catalogo[catalogo['Parte'] == parte]['StdPack'].iloc[0]}, Objetivo: {catalogo[catalogo['Parte'] == parte]['Objetivo'].iloc[0]}"
+                    help=f"Estándar: {atributos_partes[parte]['StdPack']}, Objetivo: {atributos_partes[parte]['Objetivo']}"
                 )
-            
-        # Segunda columna
-        with col2:
-            for parte in partes_unicas[mitad:]:
-                st.session_state.temp_inventario[parte] = st.number_input(
-                    f"{parte}", 
-                    min_value=0, 
-                    value=st.session_state.inventario[parte],
-                    key=f"inv2_{parte}",
-                    help=f"Estándar: {catalogo[catalogo['Parte'] == parte]['StdPack'].iloc[0]}, Objetivo: {catalogo[catalogo['Parte'] == parte]['Objetivo'].iloc[0]}"
-                )        # Campos para registrar usuario que realiza el cambio
-        if 'ultimo_usuario' not in st.session_state:
-            st.session_state.ultimo_usuario = ""
-            
-        usuario = st.text_input("Su Nombre (para registro de cambios)", 
-                               value=st.session_state.ultimo_usuario,
-                               key="nombre_usuario_actual")
-        
-        # Botón para guardar cambios
-        submitted = st.form_submit_button("Guardar Cambios")
-        
-        if submitted:
-            if not usuario.strip():
-                st.warning("Por favor ingrese su nombre para registrar el cambio")
-            else:
-                # Guardar temporalmente el nombre de usuario
-                st.session_state.ultimo_usuario = usuario
-                
-                # Detectar cambios en el inventario
-                cambios_inventario = []
-                for parte, nuevo_valor in st.session_state.temp_inventario.items():
-                    if parte in st.session_state.inventario:
-                        valor_anterior = st.session_state.inventario.get(parte, 0)
-                        if nuevo_valor != valor_anterior:
-                            cambio = nuevo_valor - valor_anterior
-                            signo = "+" if cambio > 0 else ""
-                            cambios_inventario.append(f"Parte {parte}: {valor_anterior} → {nuevo_valor} ({signo}{cambio})")
-                
-                # Actualizar inventario en session_state
-                st.session_state.inventario = st.session_state.temp_inventario.copy()
-                
-                # Guardar en archivo persistente con registro de cambios
-                # Usar la hora actual en CDMX para la actualización
-                ahora = datetime.datetime.now()
-                if HAS_PYTZ:
-                    # Convertir a hora de Ciudad de México
-                    ahora_cdmx = ahora.astimezone(CDMX_TZ) if ahora.tzinfo else pytz.utc.localize(ahora).astimezone(CDMX_TZ)
-                    timestamp_cdmx = ahora_cdmx.strftime("%Y-%m-%d %H:%M:%S")
-                else:
-                    # Si no está disponible pytz, usar hora del sistema
-                    timestamp_cdmx = ahora.strftime("%Y-%m-%d %H:%M:%S")
-                
-                datos_guardado = {
-                    "inventario": st.session_state.inventario,
-                    "ultima_actualizacion": timestamp_cdmx,
-                    "usuario": usuario
-                }
-                
-                # Añadir cambios al registro si los hubo
-                if cambios_inventario:
-                    datos_guardado["cambios"] = [f"Actualización manual del inventario:"] + cambios_inventario
+    
+    # Cambios pendientes de todas las páginas
+    pendientes = [parte for parte, valor in temp_inventario.items()
+                  if parte in st.session_state.inventario and valor != st.session_state.inventario[parte]]
+    if pendientes:
+        st.info(f"✏️ {len(pendientes)} cambios pendientes sin guardar")
+        if st.button("Descartar cambios pendientes"):
+            for parte in pendientes:
+                temp_inventario[parte] = st.session_state.inventario[parte]
+                st.session_state.pop(f"inv_{parte}", None)
+            st.rerun()
+    
+    # Campos para registrar usuario que realiza el cambio
+    if 'ultimo_usuario' not in st.session_state:
+        st.session_state.ultimo_usuario = ""
+        
+    usuario = st.text_input("Su Nombre (para registro de cambios)", 
+                           value=st.session_state.ultimo_usuario,
+                           key="nombre_usuario_actual")
+    
+    # Importación masiva del conteo de los escáneres: vista previa de diferencias y un solo guardado
+    with st.expander("📥 Importar conteo desde CSV (escáner)"):
+        st.caption("Archivo CSV con columnas Parte y Cantidad. Si una parte se repite se toma la última lectura.")
+        archivo_conteo = st.file_uploader("Archivo de conteo", type=["csv"],
+                                          key=f"archivo_conteo_{st.session_state.get('importacion_id', 0)}")
+        if archivo_conteo is not None:
+            try:
+                cantidades, errores_conteo, total_errores_conteo, duplicadas = leer_conteo_csv(archivo_conteo, atributos_partes.keys())
+            except Exception as e:
+                st.error(f"No se pudo leer el archivo: {e}")
+                cantidades = None
+            
+            if cantidades is not None:
+                if total_errores_conteo:
+                    st.warning(f"⚠️ Se omitirán {total_errores_conteo} filas inválidas")
+                    st.text("\n".join(errores_conteo))
+                if duplicadas:
+                    st.caption(f"{duplicadas} lecturas repetidas: se tomó la última de cada parte")
                 
-                with open("inventario.json", "w") as f:
-                    json.dump(datos_guardado, f, indent=4)
+                # Diferencias contra el inventario actual en una sola pasada vectorizada
+                actuales = pd.Series(st.session_state.inventario).reindex(cantidades.index).fillna(0).astype("int64")
+                cambiadas = cantidades.to_numpy() != actuales.to_numpy()
+                df_diferencias = pd.DataFrame({
+                    "Parte": cantidades.index[cambiadas],
+                    "Actual": actuales.to_numpy()[cambiadas],
+                    "Nuevo": cantidades.to_numpy()[cambiadas],
+                })
+                df_diferencias["Diferencia"] = df_diferencias["Nuevo"] - df_diferencias["Actual"]
                 
-                st.session_state.ultima_actualizacion = datos_guardado["ultima_actualizacion"]
+                st.write(f"**{len(cantidades)}** partes leídas, **{len(df_diferencias)}** con cambios")
+                if not df_diferencias.empty:
+                    st.dataframe(df_diferencias, hide_index=True, use_container_width=True)
+                    if st.button("Aplicar importación", key="aplicar_importacion"):
+                        if not usuario.strip():
+                            st.warning("Por favor ingrese su nombre para registrar el cambio")
+                        else:
+                            delta_importacion = dict(zip(df_diferencias["Parte"].tolist(), df_diferencias["Nuevo"].tolist()))
+                            timestamp_cdmx, _ = guardar_inventario(
+                                delta_importacion,
+                                usuario=usuario,
+                                inventario_anterior=st.session_state.inventario,
+                                origen=f"Importación de inventario desde {archivo_conteo.name}",
+                                version_base=st.session_state.get('version_inventario')
+                            )
+                            if timestamp_cdmx:
+                                # Las partes importadas reemplazan también los valores pendientes del formulario
+                                for parte, cantidad in delta_importacion.items():
+                                    st.session_state.temp_inventario[parte] = cantidad
+                                    st.session_state.pop(f"inv_{parte}", None)
+                                st.session_state.inventario, st.session_state.ultima_actualizacion, version_actual = cargar_inventario()
+                                st.session_state.version_inventario = version_actual
+                                st.session_state.version_vista = version_actual
+                                st.session_state.importacion_id = st.session_state.get('importacion_id', 0) + 1
+                                st.session_state.ultimo_usuario = ""
+                                st.session_state.page = 'dashboard'
+                                st.rerun()
+    
+    # Un solo guardado para los cambios de todas las páginas
+    if st.button("Guardar Cambios", type="primary"):
+        if not pendientes:
+            # Sin cambios no se registra un evento vacío a nombre del usuario
+            st.info("No hay cambios pendientes por guardar.")
+        elif not usuario.strip():
+            st.warning("Por favor ingrese su nombre para registrar el cambio")
+        else:
+            # Guardar temporalmente el nombre de usuario
+            st.session_state.ultimo_usuario = usuario
+            
+            # El delta son las partes pendientes ya detectadas arriba
+            delta_inventario = {parte: temp_inventario[parte] for parte in pendientes}
+            
+            # Registrar en el almacén sólo las partes modificadas, verificando conflictos
+            # contra la versión que leyó esta sesión
+            timestamp_cdmx, version_guardada = guardar_inventario(
+                delta_inventario,
+                usuario=usuario,
+                inventario_anterior=st.session_state.inventario,
+                origen="Actualización manual del inventario",
+                version_base=st.session_state.get('version_inventario')
+            )
+            
+            if timestamp_cdmx:
+                # Pasar al inventario compartido, que ya incluye este guardado
+                st.session_state.inventario, st.session_state.ultima_actualizacion, version_actual = cargar_inventario()
+                st.session_state.version_inventario = version_actual
+                st.session_state.version_vista = version_actual
                 
                 st.success(f"✅ Inventario actualizado correctamente por {usuario}")
                 # Borrar el usuario después de guardar cambios
@@ -850,7 +2744,19 @@ elif st.session_state.page == 'update_inventory':
                 # Volver automáticamente al dashboard después de actualizar
                 st.session_state.page = 'dashboard'
                 st.rerun()
-    
+            else:
+                # Recargar desde el almacén las partes que otra sesión modificó
+                inventario_actual, ultima_act, version_actual = cargar_inventario()
+                for parte, cantidad in inventario_actual.items():
+                    if parte in st.session_state.inventario and st.session_state.inventario[parte] != cantidad:
+                        st.session_state.temp_inventario[parte] = cantidad
+                        st.session_state.pop(f"inv_{parte}", None)
+                # El inventario compartido no se modifica en sitio: sólo se reemplaza la referencia
+                st.session_state.inventario = inventario_actual
+                st.session_state.ultima_actualizacion = ultima_act
+                st.session_state.version_inventario = version_actual
+                st.session_state.version_vista = version_actual
+
     # Botón para cancelar y volver al dashboard
     if st.button("Cancelar"):
         # También borrar el usuario al cancelar
@@ -955,25 +2861,18 @@ elif st.session_state.page == 'admin' and st.session_state.is_admin:
     show_grouped = st.checkbox("Mostrar agrupado por sets", value=True)
     
     if show_grouped:
-        # Filtrar por máquina si se seleccionó una específica
-        df_para_agrupar = df_tabla
-        
-        # Convertir temporalmente la prioridad a numérico para evitar errores en la agrupación
-        # Guardar los valores originales para restaurarlos después
-        prioridades_originales = df_para_agrupar['Prioridad'].copy()
-        
-        # Reemplazar valores no numéricos con NaN
-        df_para_agrupar['Prioridad'] = pd.to_numeric(df_para_agrupar['Prioridad'], errors='coerce')
-        
-        # Agrupar por GrupoParte y Máquina
-        df_grouped = df_para_agrupar.groupby(['GrupoParte', 'Maquina']).agg({
-            'Inventario': 'mean',
-            'Objetivo': 'mean',
-            'Faltante': 'sum',
-            'CajasNecesarias': 'sum',
-            'TiempoNecesario': 'max',
-            'Prioridad': 'min'  # Ahora es seguro aplicar min() ya que todos son valores numéricos o NaN
-        }).reset_index()
+        # Agrupar las partes de la tabla filtrada (no el resumen en caché, que suma todas las
+        # partes del set); la prioridad ya está formateada, se vuelve a numérico sólo aquí
+        df_grouped = df_tabla.assign(
+            Prioridad=pd.to_numeric(df_tabla['Prioridad'], errors='coerce')
+        ).groupby(['GrupoParte', 'Maquina']).agg(
+            Inventario=('Inventario', 'mean'),
+            Objetivo=('Objetivo', 'mean'),
+            Faltante=('Faltante', 'sum'),
+            CajasNecesarias=('CajasNecesarias', 'sum'),
+            TiempoNecesario=('TiempoNecesario', 'max'),
+            Prioridad=('Prioridad', 'min')
+        ).reset_index()
         
         # Formatear columnas numéricas
         df_grouped['Inventario'] = df_grouped['Inventario'].astype(int)
@@ -1039,6 +2938,14 @@ elif st.session_state.page == 'admin' and st.session_state.is_admin:
         CAPACIDAD_SEMANAL = 22.5 * 5.6  # 22.5 horas por 5.6 días
         TIEMPO_CAMBIO = 1.0  # 1 hora por cambio de producto
         
+        # Matriz de cambios dependientes de la secuencia (opcional; sin ella todos los cambios valen TIEMPO_CAMBIO)
+        hash_cambios = obtener_detector_cambios().hash()
+        matriz_cambios, errores_cambios = cargar_matriz_cambios(hash_cambios)
+        if errores_cambios:
+            st.warning(f"⚠️ Hay filas inválidas u omitidas en {ARCHIVO_CAMBIOS}")
+            with st.expander("Ver errores de la matriz de cambios"):
+                st.text("\n".join(errores_cambios))
+        
         st.info("Esta es una herramienta de simulación para planificar la producción semanal. Los valores ingresados no afectarán el inventario real.")
         
         # Extraer números de las máquinas para referencias
@@ -1047,32 +2954,16 @@ elif st.session_state.page == 'admin' and st.session_state.is_admin:
         # Usar todas las máquinas en lugar de seleccionar una
         st.write("### Plan de producción para todas las transfers")
         
-        # Obtener grupos de partes para todas las máquinas
-        df_maquina_cap = df_metricas.copy()
-        
-        # Obtener grupos de partes únicos
-        grupos_unicos = sorted(df_maquina_cap['GrupoParte'].unique())
-        
-        # Crear un DataFrame para la simulación
-        df_simulacion = pd.DataFrame({
-            'GrupoParte': grupos_unicos
-        })
-        
-        # Añadir información de cada grupo
-        for grupo in grupos_unicos:
-            partes_grupo = df_maquina_cap[df_maquina_cap['GrupoParte'] == grupo]
-            df_simulacion.loc[df_simulacion['GrupoParte'] == grupo, 'StdPack'] = partes_grupo['StdPack'].iloc[0]
-            df_simulacion.loc[df_simulacion['GrupoParte'] == grupo, 'Rate'] = partes_grupo['Rate'].iloc[0]
-            df_simulacion.loc[df_simulacion['GrupoParte'] == grupo, 'Inventario'] = partes_grupo['Inventario'].mean()
-            df_simulacion.loc[df_simulacion['GrupoParte'] == grupo, 'Objetivo'] = partes_grupo['Objetivo'].mean()
-            df_simulacion.loc[df_simulacion['GrupoParte'] == grupo, 'Faltante'] = partes_grupo['Faltante'].mean()
-            df_simulacion.loc[df_simulacion['GrupoParte'] == grupo, 'Prioridad'] = partes_grupo['Prioridad'].iloc[0]
-            df_simulacion.loc[df_simulacion['GrupoParte'] == grupo, 'Maquina'] = partes_grupo['Maquina'].iloc[0]
-            
-            # Extraer solo el número de transfer para visualización más limpia
-            maquina_txt = partes_grupo['Maquina'].iloc[0]
-            num_transfer = maquina_txt.split()[1] if len(maquina_txt.split()) > 1 else maquina_txt
-            df_simulacion.loc[df_simulacion['GrupoParte'] == grupo, 'NumTransfer'] = num_transfer        # Inicializar la variable de modo en el estado de la sesión si no existe
+        # Una fila por grupo a partir del resumen por set en caché: un grupo flexible se
+        # planea en la máquina donde tiene prioridad (o en la primera si no tiene faltante)
+        df_simulacion = st.session_state.metricas.resumen_grupos().sort_values(
+            ['GrupoParte', 'Prioridad'], na_position='last', kind='stable'
+        ).drop_duplicates('GrupoParte')[
+            ['GrupoParte', 'StdPack', 'Rate', 'Inventario', 'Objetivo', 'Faltante', 'Prioridad', 'Maquina', 'NumTransfer']
+        ].reset_index(drop=True)
+        grupos_unicos = df_simulacion['GrupoParte'].tolist()
+        
+        # Inicializar la variable de modo en el estado de la sesión si no existe
         if 'modo_plan_actual' not in st.session_state:
             st.session_state.modo_plan_actual = "Plan automático"
             
@@ -1105,7 +2996,8 @@ elif st.session_state.page == 'admin' and st.session_state.is_admin:
                 if modo_plan_actual == "Plan automático":
                     tipo_plan = st.radio(
                         "Tipo de plan a generar:",
-                        ["Basado en faltantes", "Basado en prioridad", "Producción mínima para todos"],
+                        ["Basado en faltantes", "Basado en prioridad", "Producción mínima para todos"]
+                        + (["Óptimo (MILP)"] if HAS_SCIPY else []),
                         index=0
                     )
                 else:
@@ -1116,8 +3008,39 @@ elif st.session_state.page == 'admin' and st.session_state.is_admin:
                 dias_produccion = st.slider("Días de producción", 1, 5, 5)
                 horas_por_dia = st.number_input("Horas efectivas por día", min_value=1.0, max_value=24.0, value=22.5)
             
-            # Calcular capacidad disponible
-            capacidad_disponible = dias_produccion * horas_por_dia
+            # Capacidad independiente por transfer: las celdas vacías usan los valores generales
+            with st.expander("Capacidad por transfer"):
+                st.caption("Deje vacío para usar los días y horas generales. 0 días = transfer sin producción esta semana.")
+                config_capacidad = st.data_editor(
+                    pd.DataFrame({
+                        'Maquina': maquinas,
+                        'Dias': pd.Series(np.nan, index=range(len(maquinas))),
+                        'Horas': pd.Series(np.nan, index=range(len(maquinas)))
+                    }),
+                    column_config={
+                        'Maquina': st.column_config.TextColumn("Transfer", disabled=True),
+                        'Dias': st.column_config.NumberColumn("Días de producción", min_value=0, max_value=5, step=1),
+                        'Horas': st.column_config.NumberColumn("Horas efectivas por día", min_value=0.0, max_value=24.0, step=0.5)
+                    },
+                    hide_index=True,
+                    key="capacidad_por_transfer"
+                )
+            
+            # Secuenciar los cambios de cada transfer sólo si hay matriz de cambios
+            if matriz_cambios:
+                optimizar_secuencia = st.checkbox(
+                    "Optimizar secuencia de cambios",
+                    value=True,
+                    help=f"Ordena los grupos de cada transfer para reducir las horas de cambio según {ARCHIVO_CAMBIOS}"
+                )
+            else:
+                optimizar_secuencia = False
+            
+            # Calcular capacidad disponible de cada transfer (las transfers trabajan en paralelo)
+            dias_por_maquina = dict(zip(config_capacidad['Maquina'], config_capacidad['Dias'].fillna(dias_produccion).astype(int)))
+            horas_por_maquina = dict(zip(config_capacidad['Maquina'], config_capacidad['Horas'].fillna(horas_por_dia).astype(float)))
+            capacidad_por_maquina = {maquina: dias_por_maquina[maquina] * horas_por_maquina[maquina] for maquina in dias_por_maquina}
+            capacidad_disponible = sum(capacidad_por_maquina.values())
             
             # Sección para ingreso manual de cantidades
             if modo_plan_actual == "Plan manual (ingresar cantidades)":
@@ -1130,8 +3053,8 @@ elif st.session_state.page == 'admin' and st.session_state.is_admin:
                 manual_input_container = st.container()
                 
                 with manual_input_container:
-                    # Ordenar grupos alfabéticamente
-                    grupos_ordenados = sorted(grupos_unicos)
+                    # Grupos en orden alfabético (df_simulacion ya está ordenado por grupo)
+                    grupos_ordenados = grupos_unicos
                     
                     # Organizar los grupos en columnas para mejor visualización
                     cols_por_fila = 2
@@ -1145,7 +3068,7 @@ elif st.session_state.page == 'admin' and st.session_state.is_admin:
                                 grupo = grupos_ordenados[idx]
                                 
                                 # Obtener información del grupo
-                                row = df_simulacion.loc[df_simulacion['GrupoParte'] == grupo].iloc[0]
+                                row = df_simulacion.iloc[idx]
                                 std_pack = int(row['StdPack'])
                                 rate = int(row['Rate'])
                                 inventario_actual = row['Inventario']
@@ -1177,8 +3100,9 @@ elif st.session_state.page == 'admin' and st.session_state.is_admin:
                 submitted = st.form_submit_button("Calcular Plan con Cantidades Ingresadas")
             
             if submitted:
-                # Inicializar diccionario para cantidades
+                # Inicializar diccionario para cantidades y máquinas elegidas por el plan óptimo
                 cantidades_plan = {}
+                maquinas_plan = {}
                 
                 # Obtener modo actual desde el estado de la sesión
                 modo_plan_actual = st.session_state.modo_plan_actual
@@ -1188,82 +3112,70 @@ elif st.session_state.page == 'admin' and st.session_state.is_admin:
                     cantidades_plan = cantidades_manuales
                     
                 else:  # Plan automático
-                    # Lógica para determinar las cantidades según el tipo de plan
-                    if tipo_plan == "Basado en faltantes":
-                        # Ordenar por faltante mayor a menor
-                        df_plan = df_simulacion.sort_values('Faltante', ascending=False)
-                        
-                        # Asignar producción según faltantes
-                        tiempo_asignado = 0
-                        for idx, row in df_plan.iterrows():
-                            if tiempo_asignado >= capacidad_disponible:
-                                cantidades_plan[row['GrupoParte']] = 0
-                                continue
-                                
-                            faltante = max(0, row['Faltante'])
-                            std_pack = row['StdPack']
-                            rate = row['Rate']
-                            
-                            # Calcular cantidad redondeando al std_pack más cercano
-                            cantidad_raw = faltante
-                            cantidad = int(np.ceil(cantidad_raw / std_pack) * std_pack)
-                            
-                            # Calcular tiempo necesario
-                            tiempo_necesario = cantidad / rate
-                            
-                            # Si el tiempo excede lo disponible, ajustar
-                            if tiempo_asignado + tiempo_necesario > capacidad_disponible:
-                                tiempo_restante = capacidad_disponible - tiempo_asignado
-                                cantidad = int(np.floor(tiempo_restante * rate / std_pack) * std_pack)
-                                if cantidad <= 0:
-                                    cantidad = 0
-                                    
-                            cantidades_plan[row['GrupoParte']] = cantidad
-                            tiempo_asignado += cantidad / rate + (1.0 if cantidad > 0 else 0)  # Sumar tiempo de cambio si hay producción
+                    tipo_calculo = tipo_plan
                     
-                    elif tipo_plan == "Basado en prioridad":
-                        # Convertir prioridad a numérico para ordenar correctamente
-                        df_simulacion['Prioridad_num'] = pd.to_numeric(df_simulacion['Prioridad'], errors='coerce')
+                    if tipo_plan == "Óptimo (MILP)":
+                        # Pares (grupo, máquina candidata) del resumen por set: el solver elige la
+                        # máquina de los grupos flexibles
+                        pares = st.session_state.metricas.resumen_grupos()
+                        pares = pares[pares['GrupoParte'].isin(grupos_unicos)]
+                        with st.spinner("Resolviendo el plan óptimo..."):
+                            resultado_milp = plan_optimo_milp(
+                                pd.Index(grupos_unicos).get_indexer(pares['GrupoParte']),
+                                pd.Index(maquinas).get_indexer(pares['Maquina']),
+                                df_simulacion['Faltante'].to_numpy(dtype=float),
+                                pd.to_numeric(df_simulacion['Prioridad'], errors='coerce').to_numpy(dtype=float),
+                                pares['StdPack'].to_numpy(dtype=float),
+                                pares['Rate'].to_numpy(dtype=float),
+                                np.array([capacidad_por_maquina[maquina] for maquina in maquinas], dtype=float),
+                                TIEMPO_CAMBIO
+                            )
                         
-                        # Ordenar por prioridad (menor número es más prioritario)
-                        df_plan = df_simulacion.sort_values('Prioridad_num', ascending=True)
+                        if resultado_milp is None:
+                            st.warning(f"⚠️ El optimizador no encontró un plan factible en {LIMITE_TIEMPO_MILP:.0f} segundos; se usa el plan basado en prioridad.")
+                            tipo_calculo = "Basado en prioridad"
+                        else:
+                            cajas, optimo = resultado_milp
+                            if not optimo:
+                                st.info(f"ℹ️ El optimizador llegó al límite de {LIMITE_TIEMPO_MILP:.0f} segundos; se usa la mejor solución que encontró, que puede no ser la óptima.")
+                            sets = cajas * pares['StdPack'].to_numpy()
+                            producidos = sets > 0
+                            cantidades_plan = dict.fromkeys(grupos_unicos, 0)
+                            cantidades_plan.update(zip(pares['GrupoParte'][producidos], sets[producidos].tolist()))
+                            maquinas_plan = dict(zip(pares['GrupoParte'][producidos], pares['Maquina'][producidos]))
+                    
+                    # Lógica para determinar las cantidades según el tipo de plan
+                    if tipo_calculo in ("Basado en faltantes", "Basado en prioridad"):
+                        if tipo_calculo == "Basado en faltantes":
+                            # Faltante mayor primero
+                            clave_orden = -df_simulacion['Faltante'].to_numpy(dtype=float)
+                        else:
+                            # Menor número de prioridad primero (los grupos sin prioridad al final)
+                            clave_orden = pd.to_numeric(df_simulacion['Prioridad'], errors='coerce').to_numpy(dtype=float)
                         
-                        # Asignar producción según prioridad
-                        tiempo_asignado = 0
-                        for idx, row in df_plan.iterrows():
-                            if tiempo_asignado >= capacidad_disponible:
-                                cantidades_plan[row['GrupoParte']] = 0
-                                continue
-                                
-                            faltante = max(0, row['Faltante'])
-                            std_pack = row['StdPack']
-                            rate = row['Rate']
-                            
-                            # Calcular cantidad redondeando al std_pack más cercano
-                            cantidad_raw = faltante
-                            cantidad = int(np.ceil(cantidad_raw / std_pack) * std_pack)
-                            
-                            # Calcular tiempo necesario
-                            tiempo_necesario = cantidad / rate
-                            
-                            # Si el tiempo excede lo disponible, ajustar
-                            if tiempo_asignado + tiempo_necesario > capacidad_disponible:
-                                tiempo_restante = capacidad_disponible - tiempo_asignado
-                                cantidad = int(np.floor(tiempo_restante * rate / std_pack) * std_pack)
-                                if cantidad <= 0:
-                                    cantidad = 0
-                                    
-                            cantidades_plan[row['GrupoParte']] = cantidad
-                            tiempo_asignado += cantidad / rate + (1.0 if cantidad > 0 else 0)  # Sumar tiempo de cambio si hay producción
+                        # Asignar producción contra la capacidad de la transfer de cada grupo
+                        cantidades = asignar_por_capacidad(
+                            pd.Categorical(df_simulacion['Maquina'], categories=maquinas).codes,
+                            df_simulacion['Faltante'].to_numpy(dtype=float),
+                            df_simulacion['StdPack'].to_numpy(dtype=float),
+                            df_simulacion['Rate'].to_numpy(dtype=float),
+                            np.array([capacidad_por_maquina[maquina] for maquina in maquinas], dtype=float),
+                            clave_orden,
+                            TIEMPO_CAMBIO
+                        )
+                        cantidades_plan = dict(zip(df_simulacion['GrupoParte'], cantidades.tolist()))
                     
-                    else:  # Producción mínima para todos
+                    elif tipo_calculo == "Producción mínima para todos":
                         # Priorizar productos con faltante
                         df_con_faltante = df_simulacion[df_simulacion['Faltante'] > 0].copy()
                         
                         if not df_con_faltante.empty:
-                            # Calcular producción proporcional
-                            tiempo_total_requerido = sum([f / r + 1.0 for f, r in zip(df_con_faltante['Faltante'], df_con_faltante['Rate'])])
-                            factor_ajuste = min(1.0, capacidad_disponible / tiempo_total_requerido if tiempo_total_requerido > 0 else 1.0)
+                            # Calcular producción proporcional a la capacidad de cada transfer
+                            tiempo_requerido = (df_con_faltante['Faltante'] / df_con_faltante['Rate'] + 1.0).groupby(df_con_faltante['Maquina']).sum()
+                            factor_ajuste = {
+                                maquina: min(1.0, capacidad_por_maquina.get(maquina, 0.0) / requerido if requerido > 0 else 1.0)
+                                for maquina, requerido in tiempo_requerido.items()
+                            }
                             
                             for idx, row in df_con_faltante.iterrows():
                                 faltante = max(0, row['Faltante'])
@@ -1271,7 +3183,7 @@ elif st.session_state.page == 'admin' and st.session_state.is_admin:
                                 rate = row['Rate']
                                 
                                 # Calcular producción proporcional
-                                cantidad_raw = faltante * factor_ajuste
+                                cantidad_raw = faltante * factor_ajuste[row['Maquina']]
                                 cantidad = int(np.ceil(cantidad_raw / std_pack) * std_pack)
                                 
                                 cantidades_plan[row['GrupoParte']] = cantidad
@@ -1281,12 +3193,15 @@ elif st.session_state.page == 'admin' and st.session_state.is_admin:
                                 if grupo not in cantidades_plan:
                                     cantidades_plan[grupo] = 0
                         else:
-                            # Si no hay faltantes, asignar una cantidad mínima a todos
-                            tiempo_por_grupo = capacidad_disponible / len(grupos_unicos)
+                            # Si no hay faltantes, repartir la capacidad de cada transfer entre sus grupos
+                            grupos_por_maquina = df_simulacion['Maquina'].value_counts()
                             
-                            for grupo in grupos_unicos:
-                                std_pack = df_simulacion.loc[df_simulacion['GrupoParte'] == grupo, 'StdPack'].iloc[0]
-                                rate = df_simulacion.loc[df_simulacion['GrupoParte'] == grupo, 'Rate'].iloc[0]
+                            for row in df_simulacion.to_dict('records'):
+                                grupo = row['GrupoParte']
+                                std_pack = row['StdPack']
+                                rate = row['Rate']
+                                maquina = row['Maquina']
+                                tiempo_por_grupo = capacidad_por_maquina.get(maquina, 0.0) / grupos_por_maquina[maquina]
                                 
                                 # Calcular cantidad según tiempo disponible
                                 cantidad_raw = tiempo_por_grupo * rate
@@ -1297,6 +3212,11 @@ elif st.session_state.page == 'admin' and st.session_state.is_admin:
                 # Guardar el plan en la sesión
                 st.session_state.cantidades_plan = cantidades_plan
                 st.session_state.capacidad_disponible = capacidad_disponible
+                st.session_state.capacidad_por_maquina = capacidad_por_maquina
+                st.session_state.dias_por_maquina = dias_por_maquina
+                st.session_state.horas_por_maquina = horas_por_maquina
+                st.session_state.optimizar_secuencia = optimizar_secuencia
+                st.session_state.maquinas_plan = maquinas_plan
                 st.session_state.modo_plan = modo_plan
         
         if submitted or 'cantidades_plan' in st.session_state:
@@ -1306,22 +3226,56 @@ elif st.session_state.page == 'admin' and st.session_state.is_admin:
             else:
                 cantidades_plan = st.session_state.cantidades_plan
             
+            # Máquina elegida por el plan óptimo para los grupos flexibles
+            maquinas_plan = st.session_state.get('maquinas_plan', {})
+            if maquinas_plan:
+                df_simulacion['Maquina'] = df_simulacion['GrupoParte'].map(maquinas_plan).fillna(df_simulacion['Maquina'])
+                partes_nombre = df_simulacion['Maquina'].str.split()
+                df_simulacion['NumTransfer'] = partes_nombre.str[1].where(partes_nombre.str.len() > 1, df_simulacion['Maquina'])
+            
             # Añadir cantidades al DataFrame
-            for grupo, cantidad in cantidades_plan.items():
-                df_simulacion.loc[df_simulacion['GrupoParte'] == grupo, 'Cantidad'] = cantidad
+            df_simulacion['Cantidad'] = df_simulacion['GrupoParte'].map(cantidades_plan)
             
             # Calcular tiempos
             df_simulacion['Tiempo Produccion'] = df_simulacion['Cantidad'] / df_simulacion['Rate']
             
-            # Filtrar solo grupos con producción planeada
-            df_simulacion_filtrado = df_simulacion[df_simulacion['Cantidad'] > 0].copy()
+            # Filtrar solo grupos con producción planeada, en orden de prioridad dentro de cada transfer
+            df_simulacion_filtrado = df_simulacion[df_simulacion['Cantidad'] > 0].sort_values(
+                ['Maquina', 'Prioridad'], na_position='last', kind='stable'
+            )
             
             # Calcular grupos de producto (cada grupo requiere un cambio)
             grupos_a_producir = len(df_simulacion_filtrado)
-            tiempo_cambios = grupos_a_producir * TIEMPO_CAMBIO
+            
+            # Tiempo de cambio de cada grupo según el que le precede en su transfer (orden de
+            # prioridad, u optimizado si se pidió); sin matriz todos valen TIEMPO_CAMBIO
+            trabajos = tuple(
+                (maquina, tuple(grupos))
+                for maquina, grupos in df_simulacion_filtrado.groupby('Maquina', sort=True)['GrupoParte']
+            )
+            resumen_secuencia = None
+            if matriz_cambios and st.session_state.get('optimizar_secuencia', False):
+                secuencias = secuenciar_plan(hash_cambios, trabajos, TIEMPO_CAMBIO)
+                resumen_secuencia = pd.DataFrame([
+                    {"Transfer": maquina, "Cambios orden actual (hrs)": actual, "Cambios optimizado (hrs)": optimizado,
+                     "Horas recuperadas": actual - optimizado}
+                    for maquina, (_, _, actual, optimizado) in secuencias.items()
+                ])
+            else:
+                secuencias = {}
+                for maquina, grupos in trabajos:
+                    costo = matriz_cambios_grupos(grupos, matriz_cambios, TIEMPO_CAMBIO)
+                    horas = [TIEMPO_CAMBIO] + [float(costo[i, i + 1]) for i in range(len(grupos) - 1)]
+                    secuencias[maquina] = (list(grupos), horas, sum(horas), sum(horas))
+            
+            secuencia = {grupo: posicion for orden, _, _, _ in secuencias.values() for posicion, grupo in enumerate(orden)}
+            horas_cambio = {grupo: horas for orden, lista_horas, _, _ in secuencias.values() for grupo, horas in zip(orden, lista_horas)}
+            df_simulacion_filtrado['Secuencia'] = df_simulacion_filtrado['GrupoParte'].map(secuencia)
+            df_simulacion_filtrado['Tiempo Cambio'] = df_simulacion_filtrado['GrupoParte'].map(horas_cambio)
+            df_simulacion_filtrado = df_simulacion_filtrado.sort_values(['Maquina', 'Secuencia'])
+            tiempo_cambios = df_simulacion_filtrado['Tiempo Cambio'].sum()
             
             # Añadir tiempo de cambio a cada grupo
-            df_simulacion_filtrado['Tiempo Cambio'] = TIEMPO_CAMBIO
             df_simulacion_filtrado['Tiempo Total'] = df_simulacion_filtrado['Tiempo Produccion'] + df_simulacion_filtrado['Tiempo Cambio']
             
             # Calcular tiempo total necesario para la producción
@@ -1329,6 +3283,19 @@ elif st.session_state.page == 'admin' and st.session_state.is_admin:
             
             # Calcular tiempo total incluyendo cambios
             tiempo_total = tiempo_total_produccion + tiempo_cambios
+            
+            # Cada transfer se compara contra su propia capacidad, no contra el total de la planta
+            capacidad_por_maquina = st.session_state.get('capacidad_por_maquina', dict.fromkeys(maquinas, CAPACIDAD_SEMANAL))
+            df_capacidad = pd.DataFrame({'Capacidad': pd.Series(capacidad_por_maquina, dtype=float)})
+            df_capacidad['Sets'] = df_simulacion_filtrado.groupby('Maquina')['Cantidad'].sum().reindex(df_capacidad.index, fill_value=0)
+            df_capacidad['Tiempo'] = df_simulacion_filtrado.groupby('Maquina')['Tiempo Total'].sum().reindex(df_capacidad.index, fill_value=0.0)
+            df_capacidad['Exceso'] = (df_capacidad['Tiempo'] - df_capacidad['Capacidad']).clip(lower=0)
+            df_capacidad['Utilizacion'] = (df_capacidad['Tiempo'] / df_capacidad['Capacidad'] * 100).fillna(0.0)
+            # La producción se asigna con TIEMPO_CAMBIO por grupo: horas de cambio de la
+            # secuencia (con la matriz) por encima de ese presupuesto
+            cambios_maquina = df_simulacion_filtrado.groupby('Maquina')['Tiempo Cambio'].agg(['sum', 'size'])
+            df_capacidad['Cambios Extra'] = (cambios_maquina['sum'] - TIEMPO_CAMBIO * cambios_maquina['size']).reindex(
+                df_capacidad.index, fill_value=0.0).clip(lower=0)
         
         # Mostrar resultados
         if 'cantidades_plan' in st.session_state:
@@ -1337,33 +3304,51 @@ elif st.session_state.page == 'admin' and st.session_state.is_admin:
             
             col1, col2, col3 = st.columns(3)
             with col1:
-                st.metric("Capacidad Disponible", f"{capacidad_usar:.1f} hrs")
+                st.metric("Capacidad Disponible", f"{capacidad_usar:.1f} hrs", help=f"Suma de la capacidad de {len(df_capacidad)} transfers trabajando en paralelo")
             with col2:
                 st.metric("Tiempo de Producción", f"{tiempo_total_produccion:.1f} hrs")
             with col3:
                 st.metric("Tiempo de Cambios", f"{tiempo_cambios:.1f} hrs ({grupos_a_producir} cambios)")
             
-            # Calcular porcentaje de utilización
-            porcentaje_utilizacion = (tiempo_total / capacidad_usar) * 100
+            # Horas de cambio recuperadas al secuenciar cada transfer
+            if resumen_secuencia is not None:
+                horas_recuperadas = resumen_secuencia['Horas recuperadas'].sum()
+                st.success(f"🔀 Secuencia optimizada: se recuperan **{horas_recuperadas:.1f} horas** de cambio respecto al orden por prioridad")
+                with st.expander("Horas de cambio por transfer"):
+                    st.dataframe(resumen_secuencia.round(2), hide_index=True)
+            
+            # Calcular porcentaje de utilización general y de la transfer más cargada
+            porcentaje_utilizacion = (tiempo_total / capacidad_usar) * 100 if capacidad_usar > 0 else 0.0
+            utilizacion_maxima = df_capacidad['Utilizacion'].max() if not df_capacidad.empty else 0.0
+            transfers_sobrecapacidad = df_capacidad.index[df_capacidad['Exceso'] > 0].tolist()
             
             # Mostrar gráfico de utilización
             st.subheader("Utilización de Capacidad")
             
-            # Determinar color según utilización
-            if porcentaje_utilizacion > 100:
+            # Determinar color según la transfer más cargada
+            if transfers_sobrecapacidad:
                 color_barra = "red"
-                mensaje = "⚠️ **SOBRECAPACIDAD**: La máquina no tiene suficiente tiempo para completar toda la producción"
-            elif porcentaje_utilizacion > 85:
+                mensaje = f"⚠️ **SOBRECAPACIDAD**: {', '.join(transfers_sobrecapacidad)} no tiene(n) suficiente tiempo para completar su producción"
+            elif utilizacion_maxima > 85:
                 color_barra = "orange"
-                mensaje = "⚠️ **ATENCIÓN**: La máquina está operando cerca de su capacidad máxima"
+                mensaje = "⚠️ **ATENCIÓN**: Al menos una transfer está operando cerca de su capacidad máxima"
             else:
                 color_barra = "green"
-                mensaje = "✅ **CAPACIDAD SUFICIENTE**: La máquina tiene capacidad para la producción actual"
+                mensaje = "✅ **CAPACIDAD SUFICIENTE**: Todas las transfers tienen capacidad para la producción actual"
             
             # Mostrar barra de progreso personalizada
-            st.progress(min(porcentaje_utilizacion / 100, 1.0), text=f"Utilización: {porcentaje_utilizacion:.1f}%")
+            st.progress(min(porcentaje_utilizacion / 100, 1.0), text=f"Utilización general: {porcentaje_utilizacion:.1f}% (máxima por transfer: {utilizacion_maxima:.1f}%)")
             st.markdown(mensaje)
             
+            # Sobrecapacidad causada por cambios de la matriz más largos que los de la asignación
+            cambios_extra = df_capacidad.loc[transfers_sobrecapacidad, 'Cambios Extra']
+            cambios_extra = cambios_extra[cambios_extra > 1e-9]
+            if not cambios_extra.empty:
+                detalle = ", ".join(f"{maquina}: {horas:.1f} h" for maquina, horas in cambios_extra.items())
+                st.warning(f"⚠️ La producción se asignó con cambios de {TIEMPO_CAMBIO:g} h, pero con la matriz de cambios "
+                           f"la secuencia necesita más horas de cambio ({detalle}). Lo que excede la capacidad no cabe "
+                           "en el calendario.")
+            
             # Mostrar tabla de partes a producir
             st.subheader("Detalle del Plan de Producción")
             
@@ -1392,15 +3377,14 @@ elif st.session_state.page == 'admin' and st.session_state.is_admin:
             transfers_unicos = sorted(df_mostrar['Transfer'].unique())
             transfer_stats = []
             
-            for transfer in transfers_unicos:
-                # Filtrar por transfer para calcular totales
-                df_transfer = df_mostrar[df_mostrar['Transfer'] == transfer]
-                sets_transfer = df_transfer['Cantidad (sets)'].sum()
-                tiempo_transfer = df_transfer['Tiempo Total (hrs)'].sum()
+            for maquina, fila in df_capacidad.iterrows():
+                # Totales de la transfer contra su propia capacidad
                 transfer_stats.append({
-                    "Transfer": transfer,
-                    "Sets": sets_transfer,
-                    "Tiempo (hrs)": f"{tiempo_transfer:.2f}"
+                    "Transfer": maquina.split()[1] if len(maquina.split()) > 1 else maquina,
+                    "Sets": int(fila['Sets']),
+                    "Tiempo (hrs)": f"{fila['Tiempo']:.2f}",
+                    "Capacidad (hrs)": f"{fila['Capacidad']:.2f}",
+                    "Utilización": f"{fila['Utilizacion']:.1f}%"
                 })
             
             # Mostrar resumen de transfers como una tabla más compacta
@@ -1435,100 +3419,35 @@ elif st.session_state.page == 'admin' and st.session_state.is_admin:
         if 'cantidades_plan' in st.session_state:
             st.subheader("Visualización del Plan Semanal")
             
-            # Obtener los días y turnos necesarios según la configuración
-            dias_disponibles = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes']
-            dias = dias_disponibles[:st.session_state.get('dias_produccion', 5)]
+            # Días y horas de cada transfer según la configuración del plan
+            dias_por_maquina = st.session_state.get('dias_por_maquina', {})
+            horas_por_maquina = st.session_state.get('horas_por_maquina', {})
             
-            # Calcular número de turnos según las horas por día
-            horas_por_dia = st.session_state.get('horas_por_dia', 22.5)
-            turnos_completos = int(horas_por_dia // 8)
-            horas_ultimo_turno = horas_por_dia % 8
+            # Distribuir productos en el calendario en la secuencia de cada transfer
+            productos_asignados = df_simulacion_filtrado
             
-            turnos = []
-            for i in range(turnos_completos):
-                turnos.append(f"Turno {i+1}")
-                
-            if horas_ultimo_turno > 0:
-                turnos.append(f"Turno {len(turnos)+1} ({horas_ultimo_turno:.1f}h)")
-            
-            # Si no hay turnos definidos (caso extremo), crear al menos uno
-            if not turnos:
-                turnos = ["Turno 1"]
-            
-            # Horas efectivas por turno
-            horas_por_turno = [8] * turnos_completos
-            if horas_ultimo_turno > 0:
-                horas_por_turno.append(horas_ultimo_turno)
-            
-            # Datos para visualización
-            datos_produccion = []
-            
-            # Distribuir productos en el calendario según prioridad
-            productos_asignados = df_simulacion_filtrado.sort_values(
-                'Prioridad', 
-                key=lambda x: pd.to_numeric(x, errors='coerce'),
-                ascending=True
-            ).copy()
-            
-            # Procesar cada transfer por separado
-            transfers_unicos = sorted(productos_asignados['NumTransfer'].unique())
-            
-            # Para cada transfer, crear su propio calendario
-            for transfer in transfers_unicos:
-                # Filtrar productos para esta transfer
-                productos_transfer = productos_asignados[productos_asignados['NumTransfer'] == transfer].copy()
-                
-                # Variables para seguimiento (reiniciadas para cada transfer)
-                tiempo_actual = 0
-                dia_actual = 0
-                turno_actual = 0
-                
-                # Recorrer cada producto para distribuirlo en el calendario
-                for idx, producto in productos_transfer.iterrows():
-                    tiempo_producto = producto['Tiempo Total']  # Incluye tiempo de cambio
-                    tiempo_restante = tiempo_producto
-                
-                while tiempo_restante > 0 and dia_actual < len(dias):
-                    # Calcular cuánto tiempo se puede asignar en el turno actual
-                    horas_turno_actual = horas_por_turno[turno_actual]
-                    tiempo_usado_turno = tiempo_actual % horas_turno_actual
-                    tiempo_disponible_turno = horas_turno_actual - tiempo_usado_turno
-                    
-                    # No permitir tiempos negativos o cero
-                    if tiempo_disponible_turno <= 0:
-                        turno_actual += 1
-                        if turno_actual >= len(turnos):
-                            turno_actual = 0
-                            dia_actual += 1
-                        tiempo_actual = 0
-                        continue
-                    
-                    tiempo_asignado = min(tiempo_restante, tiempo_disponible_turno)
-                    
-                    # Añadir entrada al calendario con información de transfer
-                    datos_produccion.append({
-                        'Dia': dias[dia_actual],
-                        'Turno': turnos[turno_actual],
-                        'Horas': tiempo_asignado,
-                        'Producto': producto['GrupoParte'],
-                        'Transfer': f"Transfer {transfer}",
-                        'Utilizacion': (tiempo_asignado / horas_turno_actual) * 100
-                    })
-                    
-                    # Actualizar tiempos
-                    tiempo_actual += tiempo_asignado
-                    tiempo_restante -= tiempo_asignado
-                    
-                    # Pasar al siguiente turno/día si es necesario
-                    if tiempo_actual >= horas_turno_actual:
-                        tiempo_actual = 0
-                        turno_actual += 1
-                        if turno_actual >= len(turnos):
-                            turno_actual = 0
-                            dia_actual += 1
+            # Calendario de turnos de cada transfer (los tiempos incluyen el cambio)
+            df_produccion = programar_turnos(
+                productos_asignados['Maquina'].to_numpy(),
+                productos_asignados['GrupoParte'].to_numpy(),
+                productos_asignados['Tiempo Total'].to_numpy(),
+                {maquina: dias_por_maquina.get(maquina, len(DIAS_SEMANA)) for maquina in maquinas},
+                {maquina: horas_por_maquina.get(maquina, 22.5) for maquina in maquinas}
+            )
             
-            # Convertir a dataframe
-            df_produccion = pd.DataFrame(datos_produccion)
+            # Lo que no cabe en el calendario de su transfer se informa en lugar de omitirlo en silencio
+            horas_programadas = df_produccion.groupby('Producto')['Horas'].sum()
+            horas_fuera = (productos_asignados['Tiempo Total'].to_numpy()
+                           - horas_programadas.reindex(productos_asignados['GrupoParte']).fillna(0.0).to_numpy())
+            df_fuera = productos_asignados.assign(**{'Horas fuera': horas_fuera})[horas_fuera > 1e-6]
+            if not df_fuera.empty:
+                detalle = ", ".join(f"{maquina}: {horas:.1f} h" for maquina, horas in df_fuera.groupby('Maquina')['Horas fuera'].sum().items())
+                st.warning(f"⚠️ No cabe en el calendario de la semana ({detalle}); esa producción no aparece en la visualización.")
+                with st.expander("Producción fuera del calendario"):
+                    st.dataframe(df_fuera[['Maquina', 'GrupoParte', 'Tiempo Total', 'Horas fuera']].rename(columns={
+                        'Maquina': 'Transfer', 'GrupoParte': 'Grupo de Parte', 'Tiempo Total': 'Tiempo Total (hrs)',
+                        'Horas fuera': 'Fuera del calendario (hrs)'
+                    }).round(2), hide_index=True)
             
             if not df_produccion.empty:
                 # Crear gráfico de barras apiladas
@@ -1547,6 +3466,10 @@ elif st.session_state.page == 'admin' and st.session_state.is_admin:
                     # Filtrar datos para esta transfer
                     df_transfer = df_produccion[df_produccion['Transfer'] == transfer]
                     
+                    # Calendario propio de la transfer
+                    dias = DIAS_SEMANA[:dias_por_maquina.get(transfer, len(DIAS_SEMANA))]
+                    turnos, horas_por_turno = turnos_del_dia(horas_por_maquina.get(transfer, 22.5))
+                    
                     # Crear gráfico de barras para esta transfer
                     fig = px.bar(
                         df_transfer,
@@ -1591,7 +3514,7 @@ elif st.session_state.page == 'admin' and st.session_state.is_admin:
                         columns='Dia',
                         fill_value=0,
                         aggfunc='sum'
-                    ).reset_index()
+                    ).reindex(index=turnos, columns=dias, fill_value=0).rename_axis('Turno').reset_index()
                     
                     st.write(f"#### Horas por turno - {transfer}")
                     st.dataframe(pivot_horas, hide_index=True)
@@ -1599,7 +3522,7 @@ elif st.session_state.page == 'admin' and st.session_state.is_admin:
                     # Mostrar tabla de distribución por producto, día y turno
                     st.write(f"#### Producción detallada - {transfer}")
                     st.dataframe(
-                        df_transfer[['Dia', 'Turno', 'Producto', 'Horas']].sort_values(['Dia', 'Turno']),
+                        df_transfer.sort_values('Inicio')[['Dia', 'Turno', 'Producto', 'Horas']],
                         hide_index=True
                     )
                 
@@ -1614,17 +3537,15 @@ elif st.session_state.page == 'admin' and st.session_state.is_admin:
                     columns='Dia',
                     fill_value=0,
                     aggfunc='sum'
-                ).reset_index()
+                )
+                pivot_total = pivot_total[[dia for dia in DIAS_SEMANA if dia in pivot_total.columns]].reset_index()
                 
                 st.write("### Horas totales por transfer y día")
                 st.dataframe(pivot_total, hide_index=True)
         
-        # Sugerir optimizaciones si es necesario
-        if 'cantidades_plan' in st.session_state and porcentaje_utilizacion > 100:
+        # Sugerir optimizaciones si es necesario (solo en las transfers que exceden su capacidad)
+        if 'cantidades_plan' in st.session_state and transfers_sobrecapacidad:
             st.subheader("Sugerencias para Optimización")
-            capacidad_usar = st.session_state.capacidad_disponible if 'capacidad_disponible' in st.session_state else CAPACIDAD_SEMANAL
-            exceso = tiempo_total - capacidad_usar
-            st.write(f"Necesitas reducir aproximadamente **{exceso:.1f} horas** para estar dentro de la capacidad disponible.")
             
             # Sugerir eliminar algunos productos según prioridad numérica
             try:
@@ -1635,27 +3556,30 @@ elif st.session_state.page == 'admin' and st.session_state.is_admin:
             except:
                 # Si hay error, ordenar por tiempo total
                 df_candidatos = df_simulacion_filtrado.sort_values('Tiempo Total', ascending=False)
-                
-            st.write("Considera mover estos productos a la siguiente semana:")
             
-            # Encontrar combinación de productos que sumen cerca del exceso de tiempo
-            tiempo_encontrado = 0
-            productos_a_mover = []
-            
-            for i, producto in df_candidatos.iterrows():
-                if tiempo_encontrado >= exceso:
-                    break
-                    
-                tiempo_producto = producto['Tiempo Total']
-                productos_a_mover.append({
-                    'nombre': producto['GrupoParte'],
-                    'tiempo': tiempo_producto
-                })
-                tiempo_encontrado += tiempo_producto
+            for maquina in transfers_sobrecapacidad:
+                exceso = df_capacidad.at[maquina, 'Exceso']
+                st.write(f"**{maquina}:** necesitas reducir aproximadamente **{exceso:.1f} horas** para estar dentro de su capacidad disponible.")
+                st.write("Considera mover estos productos a la siguiente semana:")
                 
-                st.write(f"- {producto['GrupoParte']}: {tiempo_producto:.1f} hrs")
+                # Encontrar combinación de productos que sumen cerca del exceso de tiempo
+                tiempo_encontrado = 0
+                productos_a_mover = []
                 
-            st.info(f"Moviendo estos productos liberarías {tiempo_encontrado:.1f} de las {exceso:.1f} horas necesarias.")
+                for i, producto in df_candidatos[df_candidatos['Maquina'] == maquina].iterrows():
+                    if tiempo_encontrado >= exceso:
+                        break
+                        
+                    tiempo_producto = producto['Tiempo Total']
+                    productos_a_mover.append({
+                        'nombre': producto['GrupoParte'],
+                        'tiempo': tiempo_producto
+                    })
+                    tiempo_encontrado += tiempo_producto
+                    
+                    st.write(f"- {producto['GrupoParte']}: {tiempo_producto:.1f} hrs")
+                    
+                st.info(f"Moviendo estos productos liberarías {tiempo_encontrado:.1f} de las {exceso:.1f} horas necesarias.")
     
     with tab3:
         # Mostrar registro de cambios en el catálogo y en el inventario
@@ -1692,39 +3616,73 @@ elif st.session_state.page == 'admin' and st.session_state.is_admin:
         
         st.markdown("---")
         
-        if os.path.exists("inventario.json"):
+        # Cantidad de eventos del historial a mostrar (se leen desde el final del log / por índice)
+        almacen = obtener_almacen()
+        num_eventos = st.number_input("Eventos del historial a mostrar", min_value=1, max_value=HISTORIAL_POR_PARTE, value=20, step=10)
+        
+        try:
+            eventos_recientes = almacen.eventos_recientes(int(num_eventos) + 1)
+            ultima = almacen.ultima_actualizacion()
+        except Exception as e:
+            st.error(f"Error al cargar el registro de cambios: {e}")
+            eventos_recientes, ultima = [], None
+        
+        if ultima:
             try:
-                # Cargar desde archivo JSON
-                with open("inventario.json", "r") as f:
-                    datos_inventario = json.load(f)
+                datos_inventario = {
+                    "ultima_actualizacion": ultima.get("ts") or "Desconocida",
+                    "usuario": ultima.get("usuario", "Sistema"),
+                    "origen": ultima.get("origen"),
+                    "cambios": ultima.get("cambios", [])
+                }
                 
                 # Mostrar información de la última actualización
                 st.markdown("### Última Actualización del Inventario")
                 fecha_str = datos_inventario.get('ultima_actualizacion', 'Desconocida')
                 
                 # Mostrar la fecha directamente (ya está en hora CDMX al guardarse)
-                if fecha_str != 'Desconocida':
-                    st.markdown(f"**Fecha:** {fecha_str}")
-                else:
-                    st.markdown(f"**Fecha:** {fecha_str}")
-                    
+                st.markdown(f"**Fecha:** {fecha_str}")
                 st.markdown(f"**Usuario:** {datos_inventario.get('usuario', 'Sistema')}")
+                if datos_inventario.get("origen"):
+                    st.markdown(f"**Origen:** {datos_inventario['origen']}")
                 
                 # Mostrar cambios si existen
-                if "cambios" in datos_inventario:
+                if datos_inventario.get("cambios"):
                     st.markdown("### Cambios Realizados")
                     for cambio in datos_inventario["cambios"]:
-                        st.markdown(f"- {cambio}")
+                        st.markdown(f"- {formatear_cambio(cambio)}")
                     
-                    # Mostrar detalles expandibles si hay muchos cambios
-                    if any("  - " in cambio for cambio in datos_inventario["cambios"]):
+                    # Mostrar detalles expandibles si hay muchos cambios (registros de texto de la sincronización)
+                    if any(isinstance(cambio, str) and "  - " in cambio for cambio in datos_inventario["cambios"]):
                         with st.expander("Ver detalles completos de los cambios"):
                             for cambio in datos_inventario["cambios"]:
-                                if "  - " in cambio:
+                                if isinstance(cambio, str) and "  - " in cambio:
                                     st.markdown(f"{cambio}")
                 
-                # Mostrar historial de actualizaciones previas (podría implementarse en el futuro)
-                st.info("El registro detallado de cambios históricos se implementará en una actualización futura.")
+                # Historial de actualizaciones previas desde el log de eventos
+                if len(eventos_recientes) > 1:
+                    st.markdown("### Historial de Cambios")
+                    for evento in eventos_recientes[1:]:
+                        partes_modificadas = len(evento.get("inventario", {}))
+                        with st.expander(f"{evento.get('ts', 'Desconocida')} - {evento.get('usuario', 'Sistema')} ({partes_modificadas} partes)"):
+                            if evento.get("origen"):
+                                st.caption(evento["origen"])
+                            if evento.get("cambios"):
+                                for cambio in evento["cambios"]:
+                                    st.markdown(f"- {formatear_cambio(cambio)}")
+                            else:
+                                st.caption("Sin cambios en las cantidades.")
+                
+                # Historial de una parte (consulta indexada en SQLite)
+                st.markdown("### Historial por Parte")
+                parte_historial = st.selectbox("Parte", sorted(catalogo['Parte'].unique()), key="parte_historial")
+                historial = almacen.historial_parte(parte_historial, limite=int(num_eventos))
+                if historial:
+                    st.dataframe(pd.DataFrame(historial).rename(columns={
+                        "ts": "Fecha", "usuario": "Usuario", "cantidad": "Cantidad"
+                    }), hide_index=True)
+                else:
+                    st.caption("Sin registros para esta parte.")
             except Exception as e:
                 st.error(f"Error al cargar el registro de cambios: {e}")
         else:
@@ -0,0 +1,94 @@
+"""Guardados concurrentes de varios procesos sobre los dos almacenes de inventario.
+
+Cada proceso guarda deltas de 20 partes al azar partiendo de la última versión que
+conoce; reporta latencias p50/p95/p99, conflictos detectados y el tiempo de
+historial_parte al final. Uso:
+
+    python -m bench.bench_almacen_concurrente [procesos] [guardados_por_proceso]"""
+import fcntl
+import multiprocessing as mp
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+
+from bench.comun import cargar_funciones
+
+N_PARTES = 5000
+PARTES_POR_GUARDADO = 20
+
+def cargar_almacenes():
+    return cargar_funciones(
+        ["ARCHIVO_INVENTARIO", "ARCHIVO_EVENTOS", "EVENTOS_POR_SNAPSHOT", "FORMATO_SNAPSHOT", "HISTORIAL_POR_PARTE",
+         "ARCHIVO_SQLITE", "serializar_json", "deserializar_json", "obtener_timestamp", "InventarioDañado",
+         "ConflictoInventario", "AlmacenInventarioArchivo", "AlmacenInventarioSQLite"],
+        {"st": types.SimpleNamespace(), "HAS_FCNTL": True, "fcntl": fcntl, "threading": threading},
+    )
+
+def crear_almacen(app, backend):
+    return app["AlmacenInventarioSQLite"]() if backend == "sqlite" else app["AlmacenInventarioArchivo"]()
+
+def trabajador(args):
+    backend, directorio, id_trabajador, guardados, partes = args
+    os.chdir(directorio)
+    app = cargar_almacenes()
+    almacen = crear_almacen(app, backend)
+    rng = random.Random(id_trabajador)
+    latencias, conflictos = [], 0
+    _, _, version = almacen.cargar()
+    for _ in range(guardados):
+        delta = {parte: rng.randint(0, 999) for parte in rng.sample(partes, PARTES_POR_GUARDADO)}
+        evento = {"ts": app["obtener_timestamp"](), "usuario": f"w{id_trabajador}", "inventario": delta, "cambios": []}
+        inicio = time.perf_counter()
+        try:
+            _, version = almacen.guardar(evento, version_base=version)
+            latencias.append(time.perf_counter() - inicio)
+        except app["ConflictoInventario"]:
+            conflictos += 1
+            version = almacen.version()
+    return latencias, conflictos
+
+def percentil(valores, p):
+    return valores[min(int(len(valores) * p), len(valores) - 1)] * 1000
+
+def main(procesos=32, guardados=50):
+    partes = [f"P{i:05d} LH" for i in range(N_PARTES)]
+    for backend in ("sqlite", "archivo"):
+        directorio = tempfile.mkdtemp()
+        anterior = os.getcwd()
+        os.chdir(directorio)
+        try:
+            app = cargar_almacenes()
+            almacen = crear_almacen(app, backend)
+            almacen.guardar({"ts": "inicio", "usuario": "inicio", "inventario": dict.fromkeys(partes, 0)})
+
+            inicio = time.perf_counter()
+            with mp.Pool(procesos) as pool:
+                resultados = pool.map(trabajador, [(backend, directorio, w, guardados, partes) for w in range(procesos)])
+            total = time.perf_counter() - inicio
+
+            latencias = sorted(x for lat, _ in resultados for x in lat)
+            conflictos = sum(c for _, c in resultados)
+            inventario, _, _ = almacen.cargar()
+
+            # Historial de una parte: primera consulta (índice desde cero) y siguiente rerun
+            tiempos = []
+            for _ in range(2):
+                inicio = time.perf_counter()
+                almacen.historial_parte(partes[0])
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+
+            print(f"{backend}: {len(latencias)} guardados en {total:.2f} s, p50={percentil(latencias, .5):.2f} ms "
+                  f"p95={percentil(latencias, .95):.2f} ms p99={percentil(latencias, .99):.2f} ms "
+                  f"conflictos={conflictos} partes={len(inventario)} | historial_parte {tiempos[0]:.1f} ms, "
+                  f"siguiente {tiempos[1]:.2f} ms")
+        finally:
+            os.chdir(anterior)
+            shutil.rmtree(directorio)
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,38 @@
+"""Textos de ayuda del formulario de inventario: búsqueda original por parte contra el
+índice de atributos (obtener_atributos_partes). Uso:
+
+    python -m bench.bench_atributos [n_partes ...]"""
+import sys
+import time
+
+from bench import referencia
+from bench.comun import cargar_funciones, generar_catalogo
+
+# Con catálogos grandes la búsqueda original se mide sobre una muestra y se extrapola
+MUESTRA_ORIGINAL = 1000
+
+def main(tamaños):
+    obtener_atributos_partes = cargar_funciones(["obtener_atributos_partes"])["obtener_atributos_partes"]
+    for n_partes in tamaños:
+        catalogo, _ = generar_catalogo(n_partes, semilla=n_partes)
+        partes = sorted(catalogo['Parte'].unique())
+
+        muestra = partes if len(partes) <= 5 * MUESTRA_ORIGINAL else partes[:MUESTRA_ORIGINAL]
+        inicio = time.perf_counter()
+        esperado = referencia.textos_ayuda(catalogo, muestra)
+        t_original = (time.perf_counter() - inicio) * 1000 * len(partes) / len(muestra)
+
+        inicio = time.perf_counter()
+        atributos = obtener_atributos_partes(None, catalogo)
+        t_indice = (time.perf_counter() - inicio) * 1000
+        inicio = time.perf_counter()
+        textos = [f"Estándar: {atributos[parte]['StdPack']}, Objetivo: {atributos[parte]['Objetivo']}" for parte in partes]
+        t_textos = (time.perf_counter() - inicio) * 1000
+
+        assert textos[:len(muestra)] == esperado
+        extrapolado = " (extrapolado)" if len(muestra) < len(partes) else ""
+        print(f"{len(partes):>6} partes: original {t_original:9.1f} ms{extrapolado} | "
+              f"índice (una vez por catálogo) {t_indice:6.1f} ms | textos {t_textos:6.2f} ms")
+
+if __name__ == "__main__":
+    main([int(n) for n in sys.argv[1:]] or [500, 5000, 20000])
@@ -0,0 +1,70 @@
+"""Preparación del dashboard por máquina: filtrado original contra la cola precalculada.
+
+Verifica además que la cola de MetricasIncrementales da los mismos grupos y filas que
+el filtrado original mientras se aplican deltas de inventario. Uso:
+
+    python -m bench.bench_colas [n_partes] [n_maquinas]"""
+import sys
+import time
+
+import numpy as np
+
+from bench import referencia
+from bench.comun import cargar_funciones, generar_catalogo
+
+def preparar_con_cola(metricas, df, maquina):
+    cola = metricas.cola(maquina)
+    if not cola:
+        return None
+    resultado = [(cola[0][0], list(df.index[cola[0][2]]))]
+    if len(cola) > 1:
+        resultado.append((cola[1][0], list(df.iloc[cola[1][2]].sort_values('Parte').index)))
+    return resultado
+
+def verificar(Metricas):
+    rng = np.random.default_rng(1)
+    for semilla in range(3):
+        catalogo, inventario = generar_catalogo(1500, n_maquinas=12, semilla=semilla, empates=semilla % 2 == 1,
+                                                fraccion_flexible=0.3)
+        metricas = Metricas(catalogo, inventario)
+        for _ in range(5):
+            df = metricas.df
+            for maquina in sorted(catalogo['Maquina'].unique()):
+                assert referencia.preparar_maquina(df, maquina) == preparar_con_cola(metricas, df, maquina), maquina
+            inventario = dict(inventario)
+            for parte in rng.choice(list(inventario), 40):
+                inventario[parte] = int(rng.choice([0, 50, 500, 5000]))
+            metricas.actualizar(inventario)
+
+def main(n_partes=5000, n_maquinas=50):
+    app = cargar_funciones([
+        "PAREJAS_LADOS_PREDETERMINADAS", "leer_reglas_parejas", "REGLAS_PAREJAS",
+        "LADO_IZQUIERDO", "MotorParejas", "LIMITE_COMBINACIONES_EXACTO", "asignar_flexibles",
+        "_asignar_flexibles_exacto", "asignar_prioridades", "calcular_metricas", "MetricasIncrementales",
+    ])
+    Metricas = app["MetricasIncrementales"]
+    verificar(Metricas)
+
+    catalogo, inventario = generar_catalogo(n_partes, n_maquinas=n_maquinas, semilla=3)
+    metricas = Metricas(catalogo, inventario)
+    df = metricas.df
+    maquinas = sorted(catalogo['Maquina'].unique())
+
+    def medir(funcion):
+        inicio = time.perf_counter()
+        for maquina in maquinas:
+            funcion(maquina)
+        return (time.perf_counter() - inicio) * 1000
+
+    t_original = medir(lambda maquina: referencia.preparar_maquina(df, maquina))
+    t_fria = medir(metricas.cola)
+    t_cache = medir(metricas.cola)
+    parte = next(iter(inventario))
+    inventario = dict(inventario, **{parte: inventario[parte] + 1})
+    metricas.actualizar(inventario)
+    t_delta = medir(metricas.cola)
+    print(f"{n_maquinas} máquinas, {len(catalogo)} filas: filtrado original {t_original:.1f} ms | "
+          f"colas en frío {t_fria:.2f} ms | en caché {t_cache:.3f} ms | tras delta de 1 parte {t_delta:.2f} ms")
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,76 @@
+"""Costo de la persistencia segura del inventario con el almacén en archivos.
+
+Compara la escritura original del inventario completo (json.dump directo sobre
+inventario.json en modo "w") con el snapshot atómico (temporal + fsync + rename +
+respaldo .bak + checksum) y mide el guardado de un delta en el log de eventos y la
+carga con verificación del checksum. Uso:
+
+    python -m bench.bench_guardado [n_partes]"""
+import fcntl
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from bench.comun import cargar_funciones
+
+REPETICIONES = 20
+PARTES_POR_GUARDADO = 30
+
+def cargar_almacen():
+    app = cargar_funciones(
+        ["ARCHIVO_INVENTARIO", "ARCHIVO_EVENTOS", "EVENTOS_POR_SNAPSHOT", "FORMATO_SNAPSHOT", "HISTORIAL_POR_PARTE",
+         "serializar_json", "deserializar_json", "InventarioDañado", "ConflictoInventario", "AlmacenInventarioArchivo"],
+        {"HAS_FCNTL": True, "fcntl": fcntl, "threading": threading},
+    )
+    return app["AlmacenInventarioArchivo"]
+
+def mediana_ms(funcion, repeticiones=REPETICIONES):
+    tiempos = []
+    for i in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(i)
+        tiempos.append(time.perf_counter() - inicio)
+    tiempos.sort()
+    return statistics.median(tiempos) * 1000, tiempos[int(len(tiempos) * .95)] * 1000
+
+def main(n_partes=5000):
+    Almacen = cargar_almacen()
+    inventario = {f"P{i:05d} LH": i for i in range(n_partes)}
+    directorio = tempfile.mkdtemp()
+    try:
+        ruta_original = os.path.join(directorio, "original.json")
+
+        def escribir_original(i):
+            with open(ruta_original, "w") as f:
+                json.dump({"inventario": inventario, "ultima_actualizacion": str(i), "usuario": "u"}, f, indent=4)
+
+        almacen = Almacen(os.path.join(directorio, "inventario.json"), os.path.join(directorio, "inventario_eventos.jsonl"))
+
+        def escribir_snapshot(i):
+            almacen._escribir_snapshot({"inventario": inventario, "ultima_actualizacion": str(i), "usuario": "u",
+                                        "eventos_offset": 0})
+
+        def guardar_delta(i):
+            delta = {f"P{j:05d} LH": i for j in range(PARTES_POR_GUARDADO)}
+            almacen.guardar({"ts": str(i), "usuario": "u", "inventario": delta}, version_base=almacen.version())
+
+        t_original = mediana_ms(escribir_original)
+        t_snapshot = mediana_ms(escribir_snapshot)
+        t_delta = mediana_ms(guardar_delta, repeticiones=100)
+        t_carga = mediana_ms(lambda i: almacen.cargar())
+
+        print(f"{n_partes} partes (mediana / p95):")
+        print(f"  inventario completo con json.dump en modo 'w' (original) {t_original[0]:7.2f} / {t_original[1]:7.2f} ms")
+        print(f"  snapshot atómico con fsync, respaldo y checksum          {t_snapshot[0]:7.2f} / {t_snapshot[1]:7.2f} ms")
+        print(f"  guardado de {PARTES_POR_GUARDADO} partes en el log de eventos (con fsync)     {t_delta[0]:7.2f} / {t_delta[1]:7.2f} ms")
+        print(f"  carga con verificación del checksum y 100 eventos        {t_carga[0]:7.2f} / {t_carga[1]:7.2f} ms")
+    finally:
+        shutil.rmtree(directorio)
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,85 @@
+"""Asignación del plan semanal: recorrido original por filas contra asignar_por_capacidad.
+
+Además del caso típico mide los dos peores casos del kernel con n grupos en una máquina:
+
+- recortes a 0: el primer grupo llena casi toda la capacidad y ninguno de los demás cabe
+  ni con una caja (una sola máscara después del corte);
+- intercalado: grupos pequeños que caben intercalados con grupos que no caben. Cada tramo
+  que cabe vuelve a sumar desde el tiempo usado (hay hasta capacidad / tiempo_cambio + 1
+  tramos por máquina), pero cada búsqueda se limita a una ventana que se duplica al
+  agotarse, así que el trabajo sigue siendo lineal en el número de grupos.
+
+Verifica que los resultados sean iguales. Uso:
+
+    python -m bench.bench_plan_semanal [n_grupos]"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from bench import referencia
+from bench.comun import cargar_funciones
+
+CAPACIDAD = 112.5
+TIEMPO_CAMBIO = 1.0
+
+def caso_tipico(n, rng):
+    return pd.DataFrame({
+        "GrupoParte": [f"G{i:06d}" for i in range(n)],
+        "Maquina": rng.choice([f"Transfer {i}" for i in range(50)], n),
+        "Faltante": rng.integers(0, 2000, n),
+        "StdPack": rng.choice([10, 24, 54, 100], n),
+        "Rate": rng.choice([50, 100, 120, 130], n),
+    })
+
+def caso_recortes_a_cero(n, rng):
+    # 110 h para el primero; los demás necesitan 5 h por caja y sólo quedan 1.5 h
+    return pd.DataFrame({
+        "GrupoParte": [f"G{i:06d}" for i in range(n)],
+        "Maquina": "Transfer 1",
+        "Faltante": np.r_[11000, rng.integers(600, 1000, n - 1)],
+        "StdPack": np.r_[100, np.full(n - 1, 500)],
+        "Rate": 100,
+    })
+
+def caso_intercalado(n, rng):
+    # Pares (grupo de 0.1 h que cabe, grupo de 200 h que no cabe ni con una caja)
+    pequeño = np.arange(n) % 2 == 0
+    return pd.DataFrame({
+        "GrupoParte": [f"G{i:06d}" for i in range(n)],
+        "Maquina": "Transfer 1",
+        "Faltante": np.where(pequeño, 10, 20000),
+        "StdPack": np.where(pequeño, 10, 20000),
+        "Rate": 100,
+    })
+
+def main(n_grupos=100000):
+    asignar_por_capacidad = cargar_funciones(["VENTANA_ASIGNACION", "asignar_por_capacidad"])["asignar_por_capacidad"]
+    rng = np.random.default_rng(0)
+    for nombre, generar in [("típico (50 máquinas)", caso_tipico), ("recortes a 0", caso_recortes_a_cero),
+                            ("intercalado", caso_intercalado)]:
+        df = generar(n_grupos, rng)
+        maquinas = sorted(df['Maquina'].unique())
+        capacidad = dict.fromkeys(maquinas, CAPACIDAD)
+        # El orden de atención es el del DataFrame (como "Basado en prioridad" con prioridades 1..n)
+        clave = np.arange(len(df), dtype=float)
+
+        inicio = time.perf_counter()
+        esperado = referencia.asignar_por_capacidad(df, capacidad, TIEMPO_CAMBIO)
+        t_original = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        cantidades = asignar_por_capacidad(
+            pd.Categorical(df['Maquina'], categories=maquinas).codes,
+            df['Faltante'].to_numpy(dtype=float), df['StdPack'].to_numpy(dtype=float),
+            df['Rate'].to_numpy(dtype=float), np.full(len(maquinas), CAPACIDAD), clave, TIEMPO_CAMBIO,
+        )
+        t_kernel = time.perf_counter() - inicio
+
+        assert dict(zip(df['GrupoParte'], cantidades.tolist())) == esperado, nombre
+        print(f"{nombre:22s} {n_grupos} grupos: por filas {t_original * 1000:8.1f} ms | "
+              f"kernel {t_kernel * 1000:7.2f} ms | {t_original / t_kernel:6.1f}x")
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,28 @@
+"""Tiempo de calcular_metricas original contra la versión vectorizada.
+
+Uso: python -m bench.bench_prioridades [n_partes ...]"""
+import sys
+import time
+
+from bench import referencia
+from bench.comun import cargar_funciones, generar_catalogo
+
+def main(tamaños):
+    app = cargar_funciones([
+        "PAREJAS_LADOS_PREDETERMINADAS", "leer_reglas_parejas", "REGLAS_PAREJAS",
+        "LADO_IZQUIERDO", "MotorParejas", "LIMITE_COMBINACIONES_EXACTO",
+        "asignar_flexibles", "_asignar_flexibles_exacto", "asignar_prioridades", "calcular_metricas",
+    ])
+    for n_partes in tamaños:
+        catalogo, inventario = generar_catalogo(n_partes, semilla=n_partes)
+        inicio = time.perf_counter()
+        referencia.calcular_metricas(catalogo, inventario)
+        t_original = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        app["calcular_metricas"](catalogo, inventario)
+        t_actual = time.perf_counter() - inicio
+        print(f"{len(catalogo):>6} filas: original {t_original * 1000:9.1f} ms | "
+              f"vectorizado {t_actual * 1000:7.1f} ms | {t_original / t_actual:6.1f}x")
+
+if __name__ == "__main__":
+    main([int(n) for n in sys.argv[1:]] or [500, 2000, 12000])
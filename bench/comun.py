@@ -0,0 +1,94 @@
+"""Utilidades compartidas por las pruebas y los benchmarks.
+
+app.py es un script de Streamlit (se ejecuta completo en cada recarga), así que no se
+puede importar: cargar_funciones extrae del código fuente sólo las funciones, clases y
+constantes pedidas y las ejecuta en un espacio de nombres propio."""
+import ast
+import os
+
+import numpy as np
+import pandas as pd
+
+RUTA_APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+IMPORTS_APP = """
+import os, re, math, json, time, hashlib, tempfile, shutil, threading, datetime, sqlite3
+from collections import deque
+from contextlib import closing
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+"""
+
+def _nombres_asignados(nodo):
+    nombres = []
+    for destino in nodo.targets:
+        if isinstance(destino, ast.Name):
+            nombres.append(destino.id)
+        elif isinstance(destino, ast.Tuple):
+            nombres.extend(e.id for e in destino.elts if isinstance(e, ast.Name))
+    return nombres
+
+def cargar_funciones(nombres, espacio=None, ruta=RUTA_APP):
+    """Ejecuta las definiciones de nivel superior de app.py cuyo nombre esté en nombres y
+    devuelve el espacio de nombres resultante. Se quitan los decoradores de caché de
+    Streamlit; espacio permite pasar módulos opcionales (fcntl, orjson, scipy...) o
+    sustitutos de st."""
+    with open(ruta, encoding="utf-8") as archivo:
+        arbol = ast.parse(archivo.read())
+
+    nombres = set(nombres)
+    codigo = [IMPORTS_APP]
+    # Las constantes que se validan al cargar (try/except con st.error) se toman sin el manejo de errores
+    nodos = [hijo for nodo in arbol.body for hijo in (nodo.body if isinstance(nodo, ast.Try) else [nodo])]
+    for nodo in nodos:
+        if isinstance(nodo, (ast.FunctionDef, ast.ClassDef)) and nodo.name in nombres:
+            nodo.decorator_list = [d for d in nodo.decorator_list
+                                   if not ast.unparse(d).startswith(("st.", "cache_decorator"))]
+            codigo.append(ast.unparse(nodo))
+        elif isinstance(nodo, ast.Assign) and nombres.intersection(_nombres_asignados(nodo)):
+            codigo.append(ast.unparse(nodo))
+
+    espacio = {} if espacio is None else espacio
+    espacio.setdefault("HAS_ORJSON", False)
+    espacio.setdefault("HAS_PYTZ", False)
+    exec(compile("\n\n".join(codigo), ruta, "exec"), espacio)
+    return espacio
+
+def generar_catalogo(n_partes, n_maquinas=50, semilla=0, empates=False, fraccion_flexible=0.1):
+    """Catálogo sintético con el formato de catalogo.csv y un inventario para sus partes.
+
+    El 80% de los componentes son sets LH/RH; fraccion_flexible de ellos se pueden
+    producir además en una segunda máquina. Con empates=True los StdPack, objetivos,
+    rates e inventarios se toman de pocos valores para forzar tiempos iguales."""
+    rng = np.random.default_rng(semilla)
+    maquinas = [f"Transfer {i + 1}" for i in range(n_maquinas)]
+    filas = []
+    componente = 0
+    while len(filas) < n_partes:
+        base = f"P{componente:05d} Comp {rng.integers(0, 99)}"
+        componente += 1
+        if empates:
+            std_pack = int(rng.choice([20, 40, 54, 56, 70]))
+            objetivo = int(rng.choice([260, 702, 760, 980]))
+            rate = int(rng.choice([110, 120, 130]))
+        else:
+            std_pack = int(rng.integers(10, 90))
+            objetivo = int(rng.integers(100, 2000))
+            rate = int(rng.integers(50, 200))
+        maquinas_componente = [maquinas[rng.integers(n_maquinas)]]
+        if rng.random() < fraccion_flexible:
+            maquinas_componente.append(maquinas[rng.integers(n_maquinas)])
+        partes = [base + " LH", base + " RH"] if rng.random() < 0.8 else [base]
+        for maquina in maquinas_componente:
+            for parte in partes:
+                filas.append([parte, std_pack, objetivo, maquina, rate])
+
+    catalogo = pd.DataFrame(filas, columns=["Parte", "StdPack", "Objetivo", "Maquina", "Rate"])
+    catalogo = catalogo.drop_duplicates(subset=["Parte", "Maquina"], keep="first").reset_index(drop=True)
+    partes = catalogo["Parte"].unique()
+    if empates:
+        inventario = {p: int(rng.choice([0, 0, 100, 1000])) for p in partes}
+    else:
+        inventario = {p: int(rng.integers(0, 2500)) for p in partes}
+    return catalogo, inventario
@@ -0,0 +1,296 @@
+"""Implementaciones originales que se conservan como referencia para las pruebas de
+equivalencia (tests/) y para comparar tiempos en los benchmarks (bench/).
+
+calcular_metricas e identificar_parejas están sin cambios respecto a la versión
+anterior a la vectorización de las prioridades."""
+import pandas as pd
+import numpy as np
+from functools import lru_cache
+
+# Función para identificar parejas LH/RH (mejorada para considerar todos los grupos)
+@lru_cache(maxsize=32)
+def identificar_parejas(partes_tuple):
+    partes = list(partes_tuple)
+    parejas = {}
+    
+    # Para cada parte, extraer el nombre base (sin LH/RH)
+    for parte in partes:
+        # Verificar si es LH o RH
+        if " LH" in parte or " RH" in parte:
+            # Extraer el nombre base quitando solo la marca LH/RH, no toda la palabra
+            if " LH" in parte:
+                base_name = parte.replace(" LH", "")
+            else:
+                base_name = parte.replace(" RH", "")
+                
+            # Asignar al grupo correcto
+            if base_name not in parejas:
+                parejas[base_name] = []
+            parejas[base_name].append(parte)
+    
+    # No filtrar por pares completos, incluir todos los grupos
+    # para manejar casos donde hay múltiples LH/RH para el mismo componente base
+    return parejas
+
+# Calcular métricas (optimizado y corregido para manejar partes en diferentes máquinas)
+def calcular_metricas(catalogo, inventario):
+    # Crear una copia del catálogo para no modificar el original
+    df = catalogo.copy()
+    
+    # Convertir a numpy para cálculos más rápidos
+    parte_series = df['Parte']
+    
+    # Crear vectores para cálculos
+    inventario_array = pd.Series(inventario).loc[parte_series].values
+    objetivo_array = df['Objetivo'].values
+    stdpack_array = df['StdPack'].values
+    rate_array = df['Rate'].values
+    
+    # Calcular directamente sin apply
+    df['Inventario'] = inventario_array
+    
+    # Calcular faltante
+    faltante_array = objetivo_array - inventario_array
+    faltante_array = np.maximum(faltante_array, 0)  # Más eficiente que max()
+    df['Faltante'] = faltante_array
+    
+    # Calcular cajas necesarias
+    cajas_array = faltante_array / stdpack_array
+    df['CajasNecesarias'] = np.ceil(np.where(cajas_array > 0, cajas_array, 0)).astype(int)
+    
+    # Calcular tiempo necesario (horas)
+    df['TiempoNecesario'] = np.divide(faltante_array, rate_array, out=np.zeros_like(faltante_array, dtype=float), where=rate_array!=0)
+    
+    # Crear un mapeo de todas las partes a su grupo base (sin considerar LH/RH)
+    todas_las_partes = tuple(df['Parte'].unique())
+    todos_los_grupos = identificar_parejas(todas_las_partes)
+    
+    # Crear diccionario de mapeo para todas las partes
+    parte_a_grupo = {}
+    for parte in df['Parte']:
+        parte_a_grupo[parte] = parte  # Por defecto, cada parte es su propio grupo
+    
+    # Aplicar mapeo de grupos - ahora considerando todas las partes, no solo las que tienen faltante
+    for base_name, parts in todos_los_grupos.items():
+        for part in parts:
+            parte_a_grupo[part] = base_name
+    
+    # Aplicar directamente el mapeo de grupos a todo el DataFrame
+    df['GrupoParte'] = df['Parte'].map(parte_a_grupo)
+    
+    # Identificar grupos que aparecen en múltiples máquinas
+    grupos_multimaquina = df.groupby('GrupoParte')['Maquina'].nunique()
+    grupos_multimaquina = grupos_multimaquina[grupos_multimaquina > 1].index.tolist()
+    
+    # Marcar las partes que son flexibles (pueden ser producidas en más de una máquina)
+    df['EsFlexible'] = df['GrupoParte'].isin(grupos_multimaquina)
+    
+    # Filtrar para partes con faltante más eficientemente
+    mask_faltante = faltante_array > 0
+    if mask_faltante.any():
+        df_temp = df[mask_faltante].copy()
+        
+        # Calcular prioridades por grupo y máquina
+        # Primero calculamos para grupos normales (no flexibles)
+        tiempo_por_grupo = df_temp[~df_temp['EsFlexible']].groupby(['GrupoParte'])['TiempoNecesario'].max().reset_index()
+        
+        # Unir la información de máquina nuevamente para grupos normales
+        tiempo_por_grupo = tiempo_por_grupo.merge(
+            df_temp[['GrupoParte', 'Maquina']].drop_duplicates(),
+            on='GrupoParte',
+            how='left'
+        )
+        
+        # Para los grupos flexibles (múltiples máquinas), elegiremos solo una máquina basada en la prioridad
+        for grupo in grupos_multimaquina:
+            grupo_df = df_temp[df_temp['GrupoParte'] == grupo]
+            if not grupo_df.empty:
+                # Para cada grupo flexible con faltante, calculamos qué máquina tiene menos carga
+                # y priorizamos colocar el grupo ahí
+                maquinas_disponibles = grupo_df['Maquina'].unique()
+                
+                # Elegir la máquina con menor tiempo total acumulado
+                maquina_optima = None
+                min_tiempo_total = float('inf')
+                
+                for maquina in maquinas_disponibles:
+                    tiempo_total = df_temp[df_temp['Maquina'] == maquina]['TiempoNecesario'].sum()
+                    if tiempo_total < min_tiempo_total:
+                        min_tiempo_total = tiempo_total
+                        maquina_optima = maquina
+                
+                # Filtrar sólo la máquina óptima para este grupo y añadir a tiempo_por_grupo
+                grupo_fila = {
+                    'GrupoParte': grupo,
+                    'TiempoNecesario': grupo_df[grupo_df['Maquina'] == maquina_optima]['TiempoNecesario'].max(),
+                    'Maquina': maquina_optima
+                }
+                tiempo_por_grupo = pd.concat([tiempo_por_grupo, pd.DataFrame([grupo_fila])], ignore_index=True)
+                
+                # Marcar en df_temp que esta parte flexible usa esta máquina específica
+                df_temp.loc[df_temp['GrupoParte'] == grupo, 'MaquinaSeleccionada'] = maquina_optima
+                
+        # Asignar prioridades de forma vectorizada por máquina
+        prioridad_por_maquina = {}
+        for maquina in df['Maquina'].unique():
+            # Filtrar por máquina y ordenar
+            maquina_grupos = tiempo_por_grupo[tiempo_por_grupo['Maquina'] == maquina]
+            if not maquina_grupos.empty:
+                maquina_grupos_sorted = maquina_grupos.sort_values('TiempoNecesario', ascending=False)
+                # Asignar prioridades
+                for i, (_, row) in enumerate(maquina_grupos_sorted.iterrows()):
+                    prioridad_por_maquina[(row['GrupoParte'], maquina)] = i + 1
+        
+        # Asignar prioridades al DataFrame temporal
+        df_temp['Prioridad'] = None
+        
+        # Para los grupos normales (no flexibles)
+        for idx, row in df_temp[~df_temp['EsFlexible']].iterrows():
+            df_temp.loc[idx, 'Prioridad'] = prioridad_por_maquina.get((row['GrupoParte'], row['Maquina']), None)
+        
+        # Para los grupos flexibles, asignar prioridad solo a la máquina seleccionada
+        for grupo in grupos_multimaquina:
+            grupo_filas = df_temp[df_temp['GrupoParte'] == grupo]
+            if not grupo_filas.empty and 'MaquinaSeleccionada' in grupo_filas.columns:
+                maquina_seleccionada = grupo_filas['MaquinaSeleccionada'].iloc[0]
+                for idx, row in grupo_filas.iterrows():
+                    if row['Maquina'] == maquina_seleccionada:
+                        df_temp.loc[idx, 'Prioridad'] = prioridad_por_maquina.get((row['GrupoParte'], maquina_seleccionada), None)
+        
+        # Convertir a tipo numérico para evitar problemas de tipos mixtos
+        df_temp['Prioridad'] = pd.to_numeric(df_temp['Prioridad'], errors='coerce')
+        
+        # Transferir prioridades al DataFrame principal para las partes con faltante
+        df.loc[mask_faltante, 'Prioridad'] = df_temp['Prioridad'].values
+    else:
+        # Asignar valores NaN en lugar de None para mejor compatibilidad
+        df['Prioridad'] = np.nan
+    
+    return df
+
+
+def preparar_maquina(df_metricas, maquina):
+    """Preparación original de la sección de una máquina en el dashboard: filtra
+    df_metricas por máquina, por faltante y por cada grupo. Devuelve el índice de las
+    filas del grupo prioritario y las del siguiente (ordenadas por Parte)."""
+    df_maquina = df_metricas[df_metricas['Maquina'] == maquina].copy()
+    mask_flexible = df_maquina['EsFlexible'] == True
+    if mask_flexible.any():
+        df_maquina = df_maquina[~mask_flexible | (~df_maquina['Prioridad'].isna() & mask_flexible)]
+    df_faltante = df_maquina[df_maquina['Faltante'] > 0].copy()
+    if df_faltante.empty:
+        return None
+    prioridades = {}
+    for grupo in df_faltante['GrupoParte'].unique():
+        partes_grupo = df_faltante[df_faltante['GrupoParte'] == grupo]
+        prioridades[grupo] = (partes_grupo['Prioridad'].iloc[0], min(partes_grupo['Parte'].tolist()))
+    grupos_ordenados = sorted(prioridades.items(), key=lambda x: (x[1][0], x[1][1]))
+    resultado = [(grupos_ordenados[0][0], list(df_faltante[df_faltante['GrupoParte'] == grupos_ordenados[0][0]].index))]
+    if len(grupos_ordenados) > 1:
+        siguiente = df_faltante[df_faltante['GrupoParte'] == grupos_ordenados[1][0]].sort_values('Parte')
+        resultado.append((grupos_ordenados[1][0], list(siguiente.index)))
+    return resultado
+
+def textos_ayuda(catalogo, partes):
+    """Textos de ayuda del formulario de inventario con la búsqueda original: dos
+    recorridos completos del catálogo por parte."""
+    return [
+        f"Estándar: {catalogo[catalogo['Parte'] == parte]['StdPack'].iloc[0]}, "
+        f"Objetivo: {catalogo[catalogo['Parte'] == parte]['Objetivo'].iloc[0]}"
+        for parte in partes
+    ]
+
+def asignar_por_capacidad(df_plan, capacidad_por_maquina, tiempo_cambio=1.0):
+    """Asignación original del plan semanal, fila por fila en el orden de df_plan
+    (columnas GrupoParte, Maquina, Faltante, StdPack, Rate)."""
+    cantidades_plan = {}
+    tiempo_asignado = dict.fromkeys(capacidad_por_maquina, 0.0)
+    for row in df_plan.to_dict('records'):
+        maquina = row['Maquina']
+        capacidad_maquina = capacidad_por_maquina.get(maquina, 0.0)
+        if tiempo_asignado.get(maquina, 0.0) >= capacidad_maquina:
+            cantidades_plan[row['GrupoParte']] = 0
+            continue
+        faltante = max(0, row['Faltante'])
+        std_pack = row['StdPack']
+        rate = row['Rate']
+        cantidad = int(np.ceil(faltante / std_pack) * std_pack)
+        tiempo_necesario = cantidad / rate
+        if tiempo_asignado[maquina] + tiempo_necesario > capacidad_maquina:
+            tiempo_restante = capacidad_maquina - tiempo_asignado[maquina]
+            cantidad = int(np.floor(tiempo_restante * rate / std_pack) * std_pack)
+            if cantidad <= 0:
+                cantidad = 0
+        cantidades_plan[row['GrupoParte']] = cantidad
+        tiempo_asignado[maquina] += cantidad / rate + (tiempo_cambio if cantidad > 0 else 0)
+    return cantidades_plan
+
+def elegir_flexibles(grupos, maquinas, tiempos, carga_base):
+    """Regla original de calcular_metricas para los grupos flexibles, con la firma de
+    asignar_flexibles: cada grupo va a la máquina (entre las que tienen faltante del
+    grupo) con menor tiempo total de todas sus partes con faltante, flexibles incluidas;
+    la carga no se actualiza al asignar. En empate exacto la original elige la primera
+    máquina en orden del catálogo; aquí, la primera en orden alfabético."""
+    carga_total = carga_base + np.bincount(maquinas, weights=tiempos, minlength=len(carga_base))
+    eleccion = {}
+    for grupo, maquina in zip(grupos.tolist(), maquinas.tolist()):
+        actual = eleccion.get(grupo)
+        if actual is None or carga_total[maquina] < carga_total[actual]:
+            eleccion[grupo] = maquina
+    return np.array([eleccion[grupo] for grupo in grupos.tolist()], dtype=np.int64)
+
+def programar_turnos(transfers, productos, duraciones, dias_por_transfer, horas_por_transfer):
+    """Distribución original de la visualización del plan semanal: cada producto avanza
+    turno por turno con un ciclo while. Se corrigen sus dos errores (el while quedaba fuera
+    del ciclo de productos y el tiempo usado del turno salía de un módulo que falla con el
+    turno parcial); devuelve las mismas columnas que programar_turnos."""
+    dias_disponibles = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes']
+    datos_produccion = []
+    for transfer in dict.fromkeys(transfers):
+        dias = dias_disponibles[:int(dias_por_transfer[transfer])]
+        
+        # Turnos completos de 8 h y uno parcial con el resto
+        horas_por_dia = horas_por_transfer[transfer]
+        turnos_completos = int(horas_por_dia // 8)
+        horas_ultimo_turno = horas_por_dia % 8
+        turnos = [f"Turno {i+1}" for i in range(turnos_completos)]
+        horas_por_turno = [8.0] * turnos_completos
+        if horas_ultimo_turno > 0:
+            turnos.append(f"Turno {len(turnos)+1} ({horas_ultimo_turno:.1f}h)")
+            horas_por_turno.append(horas_ultimo_turno)
+        if not turnos:
+            continue
+        
+        # Variables para seguimiento (reiniciadas para cada transfer)
+        inicio_turno = 0.0
+        tiempo_actual = 0.0  # Horas usadas del turno actual
+        dia_actual = 0
+        turno_actual = 0
+        for transfer_producto, producto, tiempo_producto in zip(transfers, productos, duraciones):
+            if transfer_producto != transfer:
+                continue
+            tiempo_restante = tiempo_producto
+            while tiempo_restante > 0 and dia_actual < len(dias):
+                horas_turno_actual = horas_por_turno[turno_actual]
+                tiempo_asignado = min(tiempo_restante, horas_turno_actual - tiempo_actual)
+                datos_produccion.append({
+                    'Transfer': transfer,
+                    'Producto': producto,
+                    'Dia': dias[dia_actual],
+                    'Turno': turnos[turno_actual],
+                    'Inicio': inicio_turno + tiempo_actual,
+                    'Horas': tiempo_asignado,
+                    'Utilizacion': (tiempo_asignado / horas_turno_actual) * 100
+                })
+                tiempo_actual += tiempo_asignado
+                tiempo_restante -= tiempo_asignado
+                
+                # Pasar al siguiente turno/día si es necesario
+                if tiempo_actual >= horas_turno_actual:
+                    inicio_turno += horas_turno_actual
+                    tiempo_actual = 0.0
+                    turno_actual += 1
+                    if turno_actual >= len(turnos):
+                        turno_actual = 0
+                        dia_actual += 1
+    return pd.DataFrame(datos_produccion, columns=['Transfer', 'Producto', 'Dia', 'Turno', 'Inicio', 'Horas', 'Utilizacion'])
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Permite importar bench.* desde las pruebas
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,99 @@
+"""Almacén de inventario en archivos: compactación desde el guardado."""
+import fcntl
+import threading
+
+import pytest
+
+from bench.comun import cargar_funciones
+
+app = cargar_funciones(
+    ["ARCHIVO_INVENTARIO", "ARCHIVO_EVENTOS", "EVENTOS_POR_SNAPSHOT", "FORMATO_SNAPSHOT", "HISTORIAL_POR_PARTE", "serializar_json",
+     "deserializar_json", "InventarioDañado", "ConflictoInventario", "AlmacenInventarioArchivo", "InventarioCompartido"],
+    {"HAS_FCNTL": True, "fcntl": fcntl, "threading": threading},
+)
+EVENTOS_POR_SNAPSHOT = app["EVENTOS_POR_SNAPSHOT"]
+
+@pytest.fixture
+def almacen(tmp_path):
+    return app["AlmacenInventarioArchivo"](str(tmp_path / "inventario.json"), str(tmp_path / "inventario_eventos.jsonl"))
+
+def guardar(almacen, compartido, delta, usuario="prueba"):
+    # Mismo camino que guardar_inventario: guardar, publicar en memoria y compactar
+    evento = {"ts": f"t{almacen.version()}", "usuario": usuario, "inventario": delta}
+    version_anterior, version = almacen.guardar(evento, version_base=compartido.version)
+    inventario = compartido.registrar(evento, version_anterior, version)
+    if inventario is not None:
+        almacen.compactar(inventario, evento, version)
+    return version
+
+def test_compacta_sin_recargar(almacen):
+    compartido = app["InventarioCompartido"](almacen)
+    compartido.obtener()
+    esperado = {}
+    for i in range(2 * EVENTOS_POR_SNAPSHOT + 10):
+        delta = {f"P{i % 37:03d}": i}
+        esperado.update(delta)
+        version = guardar(almacen, compartido, delta)
+
+    # El proceso nunca volvió a llamar a cargar y aun así el snapshot avanzó
+    encabezado = almacen._leer_snapshot(solo_encabezado=True)
+    assert sum(1 for _ in almacen.eventos(encabezado["eventos_offset"])) == 10
+    assert almacen.eventos_sin_compactar == 10
+
+    inventario, ultima_act, version_cargada = app["AlmacenInventarioArchivo"](
+        almacen.ruta_snapshot, almacen.ruta_eventos).cargar()
+    assert inventario == esperado
+    assert version_cargada == version
+    assert ultima_act == almacen.eventos_recientes(1)[0]["ts"]
+
+def test_no_compacta_con_inventario_desactualizado(almacen):
+    compartido = app["InventarioCompartido"](almacen)
+    compartido.obtener()
+    # Otro proceso escribe directamente en el log: el inventario en memoria queda atrás
+    otro = app["AlmacenInventarioArchivo"](almacen.ruta_snapshot, almacen.ruta_eventos)
+    for i in range(EVENTOS_POR_SNAPSHOT):
+        guardar(almacen, compartido, {"A": i})
+    otro.guardar({"ts": "x", "usuario": "otro", "inventario": {"B": 1}})
+    guardar(almacen, compartido, {"C": 1})
+
+    # El último guardado no partió de la versión en memoria: no se compacta con ese inventario
+    assert almacen._leer_snapshot()["inventario"] == {"A": EVENTOS_POR_SNAPSHOT - 1}
+    inventario, _, _ = app["AlmacenInventarioArchivo"](almacen.ruta_snapshot, almacen.ruta_eventos).cargar()
+    assert inventario == {"A": EVENTOS_POR_SNAPSHOT - 1, "B": 1, "C": 1}
+
+def test_historial_parte_incremental(almacen):
+    compartido = app["InventarioCompartido"](almacen)
+    compartido.obtener()
+    for i in range(60):
+        guardar(almacen, compartido, {"A": i, f"P{i % 3}": i}, usuario=f"u{i}")
+        if i % 25 == 0:
+            # Consultas intermedias: el índice se amplía sólo con los eventos nuevos
+            assert almacen.historial_parte("A", limite=1)[0]["cantidad"] == i
+
+    historial = almacen.historial_parte("A", limite=5)
+    assert [h["cantidad"] for h in historial] == [59, 58, 57, 56, 55]
+    assert historial[0]["usuario"] == "u59"
+    assert [h["cantidad"] for h in almacen.historial_parte("P1")] == list(range(58, 0, -3))
+    assert almacen.historial_parte("Z") == []
+
+    # Otra instancia (otro proceso) construye el mismo índice desde el log
+    otro = app["AlmacenInventarioArchivo"](almacen.ruta_snapshot, almacen.ruta_eventos)
+    assert otro.historial_parte("A", limite=50) == almacen.historial_parte("A", limite=50)
+
+def test_version_coincide_tras_linea_incompleta(almacen):
+    almacen.guardar({"ts": "t1", "usuario": "u", "inventario": {"A": 1}})
+    almacen.guardar({"ts": "t2", "usuario": "u", "inventario": {"B": 2}})
+    with open(almacen.ruta_eventos, "ab") as f:
+        f.write(b"no es json\n")  # Línea completa pero inválida: se ignora
+        f.write(b'{"ts": "t3", "usuario": "u", "inven')  # Escritura interrumpida
+
+    inventario, ultima_act, version = almacen.cargar()
+    assert inventario == {"A": 1, "B": 2}
+    assert ultima_act == "t2"
+    # La versión cargada es la del almacén: InventarioCompartido no recarga en cada rerun
+    assert version == almacen.version()
+    compartido = app["InventarioCompartido"](almacen)
+    assert compartido.obtener()[2] == almacen.version()
+
+    _, version_nueva = almacen.guardar({"ts": "t4", "usuario": "u", "inventario": {"C": 3}}, version_base=version)
+    assert almacen.cargar() == ({"A": 1, "B": 2, "C": 3}, "t4", version_nueva)
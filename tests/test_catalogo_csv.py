@@ -0,0 +1,93 @@
+"""Lectura y validación de catalogo.csv (leer_catalogo_csv)."""
+import re
+
+import pytest
+
+from bench.comun import cargar_funciones
+
+app = cargar_funciones(["COLUMNAS_CATALOGO", "FILAS_POR_BLOQUE_CATALOGO", "MAX_ERRORES_CATALOGO",
+                        "validar_bloque_catalogo", "leer_catalogo_csv"])
+
+ENCABEZADO = "Parte,StdPack,Objetivo,Maquina,Rate\n"
+
+@pytest.fixture
+def escribir(tmp_path):
+    def escribir(contenido, encoding="utf-8"):
+        ruta = tmp_path / "catalogo.csv"
+        ruta.write_bytes(contenido.encode(encoding))
+        return str(ruta)
+    return escribir
+
+def test_catalogo_valido(escribir):
+    ruta = escribir(ENCABEZADO + "CX430 Header Rear LH,54,702,Transfer 7, 120 \n"
+                                 "\n"
+                                 "CX430 Header Rear RH, 54 ,702,Transfer 7,120\n"
+                                 "CX430 Header Rear LH,54,702,Transfer 8,110\n")
+    df, errores, total = app["leer_catalogo_csv"](ruta)
+    assert (errores, total) == ([], 0)
+    assert list(df.columns) == app["COLUMNAS_CATALOGO"]
+    # Espacios recortados, línea vacía ignorada y la misma parte en dos máquinas se conserva
+    assert df.values.tolist() == [["CX430 Header Rear LH", 54, 702, "Transfer 7", 120],
+                                  ["CX430 Header Rear RH", 54, 702, "Transfer 7", 120],
+                                  ["CX430 Header Rear LH", 54, 702, "Transfer 8", 110]]
+    assert str(df["StdPack"].dtype) == "int64"
+
+def test_bom_aceptado(escribir):
+    df, errores, _ = app["leer_catalogo_csv"](escribir(ENCABEZADO + "A LH,10,100,T1,50\n", encoding="utf-8-sig"))
+    assert errores == []
+    assert df["Parte"].tolist() == ["A LH"]
+
+@pytest.mark.parametrize("fila, motivo", [
+    (",10,100,T1,50", "Parte vacía"),
+    ("A,diez,100,T1,50", "StdPack debe ser un entero positivo ('diez')"),
+    ("A,0,100,T1,50", "StdPack debe ser un entero positivo ('0')"),
+    ("A,10.5,100,T1,50", "StdPack debe ser un entero positivo ('10.5')"),
+    ("A,10,-1,T1,50", "Objetivo debe ser un entero no negativo ('-1')"),
+    ("A,10,100,,50", "Maquina vacía"),
+    ("A,10,100,T1,", "Rate debe ser un entero positivo"),
+    ("A,10,100,T1,rápido", "Rate debe ser un entero positivo ('rápido')"),
+])
+def test_fila_invalida(escribir, fila, motivo):
+    df, errores, total = app["leer_catalogo_csv"](escribir(ENCABEZADO + "B,10,100,T1,50\n" + fila + "\n"))
+    assert df["Parte"].tolist() == ["B"]
+    assert total == 1
+    assert errores == [f"Línea 3: {motivo}"]
+
+def test_varios_motivos_en_una_fila(escribir):
+    _, errores, _ = app["leer_catalogo_csv"](escribir(ENCABEZADO + "A,x,100,T1,0\n"))
+    assert errores == ["Línea 2: StdPack debe ser un entero positivo ('x'); Rate debe ser un entero positivo ('0')"]
+
+def test_partes_repetidas(escribir):
+    ruta = escribir(ENCABEZADO + "A,10,100,T1,50\nB,10,100,T1,50\nA,20,200,T1,60\nA,20,200,T2,60\n")
+    df, errores, total = app["leer_catalogo_csv"](ruta)
+    # Se conserva la primera fila de cada (Parte, Maquina) y la repetida se reporta
+    assert df[["Parte", "StdPack", "Maquina"]].values.tolist() == [["A", 10, "T1"], ["B", 10, "T1"], ["A", 20, "T2"]]
+    assert (errores, total) == (["Línea 4: parte repetida en la misma máquina ('A')"], 1)
+
+def test_numeracion_entre_bloques(escribir, monkeypatch):
+    monkeypatch.setitem(app, "FILAS_POR_BLOQUE_CATALOGO", 3)
+    filas = [f"P{i},10,100,T1,50" for i in range(8)]
+    filas[4] = "P4,10,100,T1,x"
+    filas[7] = "P0,10,100,T1,50"
+    df, errores, total = app["leer_catalogo_csv"](escribir(ENCABEZADO + "\n".join(filas) + "\n"))
+    assert total == 2
+    assert errores == ["Línea 6: Rate debe ser un entero positivo ('x')",
+                       "Línea 9: parte repetida en la misma máquina ('P0')"]
+    assert df["Parte"].tolist() == ["P0", "P1", "P2", "P3", "P5", "P6"]
+
+def test_errores_limitados(escribir):
+    limite = app["MAX_ERRORES_CATALOGO"]
+    df, errores, total = app["leer_catalogo_csv"](escribir(ENCABEZADO + "A,x,1,T1,1\n" * (limite + 20)))
+    assert df.empty
+    assert total == limite + 20
+    assert len(errores) == limite
+
+@pytest.mark.parametrize("encabezado, mensaje", [
+    ("Parte,StdPack,Objetivo,Maquina\n", "faltan columnas en el catálogo: Rate"),
+    ("parte,stdpack,objetivo,maquina,rate\n", "faltan columnas en el catálogo: Parte, StdPack, Objetivo, Maquina, Rate"),
+    ("Parte;StdPack;Objetivo;Maquina;Rate\n", "el catálogo usa ';' como separador; se espera ','"),
+])
+def test_encabezado_invalido(escribir, encabezado, mensaje):
+    fila = "A,10,100,T1,50\n" if ";" not in encabezado else "A;10;100;T1;50\n"
+    with pytest.raises(ValueError, match=f"^{re.escape(mensaje)}$"):
+        app["leer_catalogo_csv"](escribir(encabezado + fila))
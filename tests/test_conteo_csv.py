@@ -0,0 +1,68 @@
+"""Importación de conteos de los escáneres (leer_conteo_csv)."""
+import io
+import re
+
+import pytest
+
+from bench.comun import cargar_funciones
+
+app = cargar_funciones(["FILAS_POR_BLOQUE_CATALOGO", "MAX_ERRORES_CATALOGO", "leer_conteo_csv"])
+
+PARTES = {"A LH", "A RH", "B"}
+
+def leer(contenido, encoding="utf-8"):
+    # Mismo tipo de objeto que entrega st.file_uploader
+    return app["leer_conteo_csv"](io.BytesIO(contenido.encode(encoding)), PARTES)
+
+def test_conteo_valido():
+    cantidades, errores, total, duplicadas = leer(" parte ,CANTIDAD\nA LH, 5\n\nB,0\nA RH,12.0\n")
+    assert (errores, total, duplicadas) == ([], 0, 0)
+    assert cantidades.to_dict() == {"A LH": 5, "B": 0, "A RH": 12}
+    assert str(cantidades.dtype) == "int64"
+
+def test_bom_aceptado():
+    cantidades, errores, _, _ = leer("Parte,Cantidad\nB,7\n", encoding="utf-8-sig")
+    assert errores == []
+    assert cantidades.to_dict() == {"B": 7}
+
+def test_lecturas_repetidas_gana_la_ultima():
+    cantidades, _, _, duplicadas = leer("Parte,Cantidad\nB,1\nA LH,2\nB,3\nB,4\n")
+    assert cantidades.to_dict() == {"B": 4, "A LH": 2}
+    assert duplicadas == 2
+
+@pytest.mark.parametrize("fila, motivo", [
+    ("C,5", "parte no está en el catálogo ('C')"),
+    ("B,cinco", "Cantidad debe ser un entero no negativo ('cinco')"),
+    ("B,-1", "Cantidad debe ser un entero no negativo ('-1')"),
+    ("B,2.5", "Cantidad debe ser un entero no negativo ('2.5')"),
+    ("B,", "Cantidad debe ser un entero no negativo ('')"),
+    ("C,x", "parte no está en el catálogo ('C'); Cantidad debe ser un entero no negativo ('x')"),
+])
+def test_fila_invalida(fila, motivo):
+    cantidades, errores, total, _ = leer("Parte,Cantidad\nA LH,1\n" + fila + "\n")
+    assert cantidades.to_dict() == {"A LH": 1}
+    assert total == 1
+    assert errores == [f"Línea 3: {motivo}"]
+
+def test_numeracion_entre_bloques(monkeypatch):
+    monkeypatch.setitem(app, "FILAS_POR_BLOQUE_CATALOGO", 2)
+    cantidades, errores, total, _ = leer("Parte,Cantidad\nB,1\n\nA LH,1\nZ,1\nA RH,x\n")
+    assert total == 2
+    assert errores == ["Línea 5: parte no está en el catálogo ('Z')",
+                       "Línea 6: Cantidad debe ser un entero no negativo ('x')"]
+    assert cantidades.to_dict() == {"B": 1, "A LH": 1}
+
+def test_errores_limitados():
+    limite = app["MAX_ERRORES_CATALOGO"]
+    cantidades, errores, total, _ = leer("Parte,Cantidad\n" + "Z,1\n" * (limite + 5))
+    assert cantidades.empty
+    assert (len(errores), total) == (limite, limite + 5)
+
+@pytest.mark.parametrize("contenido, mensaje", [
+    ("Parte,Conteo\nB,1\n", "faltan columnas en el archivo: Cantidad"),
+    ("Numero de parte,Cantidad\nB,1\n", "faltan columnas en el archivo: Parte"),
+    ("Parte;Cantidad\nB;1\n", "el archivo usa ';' como separador; se espera ','"),
+])
+def test_encabezado_invalido(contenido, mensaje):
+    with pytest.raises(ValueError, match=f"^{re.escape(mensaje)}$"):
+        leer(contenido)
@@ -0,0 +1,76 @@
+"""Asignación de grupos flexibles (asignar_flexibles)."""
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bench.comun import cargar_funciones, generar_catalogo
+
+app = cargar_funciones([
+    "PAREJAS_LADOS_PREDETERMINADAS", "leer_reglas_parejas", "REGLAS_PAREJAS",
+    "LADO_IZQUIERDO", "MotorParejas", "LIMITE_COMBINACIONES_EXACTO",
+    "asignar_flexibles", "_asignar_flexibles_exacto", "asignar_prioridades", "calcular_metricas",
+    "MetricasIncrementales",
+])
+
+def costo(grupos, maquinas, tiempos, carga_base, seleccion):
+    carga = carga_base.astype(float) + np.bincount(maquinas[maquinas == seleccion],
+                                                   weights=tiempos[maquinas == seleccion], minlength=len(carga_base))
+    return carga.max(), (carga * carga).sum()
+
+def test_muchos_grupos_con_una_sola_candidata():
+    # 1200 sets flexibles (LH en Transfer 7, RH en Transfer 8) con faltante sólo en el LH:
+    # cada grupo tiene una única candidata y no debe agotar la pila de la búsqueda exacta
+    filas = []
+    for i in range(1200):
+        filas.append([f"P{i:04d} LH", 50, 1000, "Transfer 7", 100])
+        filas.append([f"P{i:04d} RH", 50, 1000, "Transfer 8", 100])
+    catalogo = pd.DataFrame(filas, columns=["Parte", "StdPack", "Objetivo", "Maquina", "Rate"])
+    inventario = {parte: (0 if parte.endswith("LH") else 1000) for parte in catalogo["Parte"]}
+
+    df = app["calcular_metricas"](catalogo, inventario)
+    lh = df[df["Parte"].str.endswith("LH")]
+    assert df["EsFlexible"].all()
+    assert (lh["MaquinaSeleccionada"] == "Transfer 7").all()
+    assert sorted(lh["Prioridad"].astype(int)) == list(range(1, 1201))
+
+@pytest.mark.parametrize("semilla", range(200))
+def test_busqueda_exacta_optima(semilla):
+    rng = np.random.default_rng(semilla)
+    n_maquinas = int(rng.integers(2, 5))
+    grupos, maquinas = [], []
+    for grupo in range(int(rng.integers(1, 7))):  # A lo más 4^6 combinaciones: búsqueda exacta
+        candidatas = 1 if rng.random() < 0.3 else int(rng.integers(2, n_maquinas + 1))
+        for maquina in sorted(rng.choice(n_maquinas, candidatas, replace=False)):
+            grupos.append(grupo)
+            maquinas.append(maquina)
+    grupos, maquinas = np.array(grupos), np.array(maquinas)
+    tiempos = rng.random(len(grupos)) * 10
+    carga_base = rng.random(n_maquinas) * 10
+
+    seleccion = app["asignar_flexibles"](grupos, maquinas, tiempos, carga_base)
+
+    # Cada grupo queda en una de sus máquinas y el costo es el mínimo por fuerza bruta
+    candidatas = [sorted(set(maquinas[grupos == g].tolist())) for g in range(grupos.max() + 1)]
+    assert all(seleccion[k] in candidatas[g] for k, g in enumerate(grupos))
+    optimo = min(costo(grupos, maquinas, tiempos, carga_base, np.array(combinacion)[grupos])
+                 for combinacion in itertools.product(*candidatas))
+    obtenido = costo(grupos, maquinas, tiempos, carga_base, seleccion)
+    assert obtenido[0] == pytest.approx(optimo[0])
+    assert obtenido[1] == pytest.approx(optimo[1])
+
+def test_incremental_igual_a_completo():
+    catalogo, inventario = generar_catalogo(3000, n_maquinas=20, semilla=7, fraccion_flexible=0.4)
+    rng = np.random.default_rng(7)
+    metricas = app["MetricasIncrementales"](catalogo, inventario)
+    partes = list(inventario)
+    for _ in range(15):
+        inventario = dict(inventario)
+        for parte in rng.choice(partes, int(rng.integers(1, 30)), replace=False):
+            inventario[parte] = int(rng.choice([0, rng.integers(0, 2500), 10 ** 6]))
+        incremental = metricas.actualizar(inventario)
+        completo = app["calcular_metricas"](catalogo, inventario)
+        for columna in ["Faltante", "TiempoNecesario", "Prioridad", "MaquinaSeleccionada"]:
+            pd.testing.assert_series_equal(incremental[columna].astype(object), completo[columna].astype(object),
+                                           check_names=False)
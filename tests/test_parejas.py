@@ -0,0 +1,73 @@
+"""Reglas de parejas (PAREJAS_LADOS) y reconocimiento de sets con MotorParejas."""
+import pytest
+
+from bench.comun import cargar_funciones
+
+app = cargar_funciones(["PAREJAS_LADOS_PREDETERMINADAS", "leer_reglas_parejas", "REGLAS_PAREJAS",
+                        "LADO_IZQUIERDO", "LADO_DERECHO", "SIN_LADO", "MotorParejas"])
+IZQ, DER, SIN = app["LADO_IZQUIERDO"], app["LADO_DERECHO"], app["SIN_LADO"]
+
+def analizar(partes, reglas=None):
+    motor = app["MotorParejas"]() if reglas is None else app["MotorParejas"](app["leer_reglas_parejas"](reglas))
+    df = motor.analizar(partes)
+    return {parte: (grupo, int(lado), marca if isinstance(marca, str) else None)
+            for parte, grupo, lado, marca in zip(df.index, df["GrupoParte"], df["Lado"], df["MarcaLado"])}
+
+def test_reglas_predeterminadas():
+    assert app["REGLAS_PAREJAS"] == [("LH", "RH"), ("IZQ", "DER")]
+    assert analizar(["CX430 Header Front LH", "CX430 Header Front RH", "Soporte-IZQ", "Soporte-DER",
+                     "Base_LH_2", "CX430 OB RR"]) == {
+        "CX430 Header Front LH": ("CX430 Header Front", IZQ, "LH"),
+        "CX430 Header Front RH": ("CX430 Header Front", DER, "RH"),
+        "Soporte-IZQ": ("Soporte", IZQ, "IZQ"),
+        "Soporte-DER": ("Soporte", DER, "DER"),
+        "Base_LH_2": ("Base_2", IZQ, "LH"),
+        "CX430 OB RR": ("CX430 OB RR", SIN, None),
+    }
+
+def test_marca_solo_como_palabra_aparte():
+    # "RHINO" y "LHX" contienen una marca pero no como palabra; al inicio no hay separador
+    assert analizar(["Tapa RHINO", "Tapa LHX", "LH Tapa"]) == {
+        "Tapa RHINO": ("Tapa RHINO", SIN, None),
+        "Tapa LHX": ("Tapa LHX", SIN, None),
+        "LH Tapa": ("LH Tapa", SIN, None),
+    }
+
+def test_nombre_con_ambas_marcas():
+    # Se quita la primera marca que aparece como palabra aparte; la otra queda en el grupo
+    assert analizar(["Panel LH RH", "Panel RH LH", "Riel LH-RH Frente"]) == {
+        "Panel LH RH": ("Panel RH", IZQ, "LH"),
+        "Panel RH LH": ("Panel LH", DER, "RH"),
+        "Riel LH-RH Frente": ("Riel-RH Frente", IZQ, "LH"),
+    }
+
+def test_reglas_personalizadas():
+    assert app["leer_reglas_parejas"](" L / R ,LH/RH, Izq/Der ") == [("L", "R"), ("LH", "RH"), ("Izq", "Der")]
+    # Con L/R y LH/RH la marca más larga se reconoce completa
+    assert analizar(["Poste L", "Poste R", "Viga LH", "Viga RH", "Placa Izq"], " L / R ,LH/RH, Izq/Der ") == {
+        "Poste L": ("Poste", IZQ, "L"),
+        "Poste R": ("Poste", DER, "R"),
+        "Viga LH": ("Viga", IZQ, "LH"),
+        "Viga RH": ("Viga", DER, "RH"),
+        "Placa Izq": ("Placa", IZQ, "Izq"),
+    }
+    # Las reglas predeterminadas ya no aplican
+    assert analizar(["Soporte IZQ"], "L/R") == {"Soporte IZQ": ("Soporte IZQ", SIN, None)}
+
+def test_misma_marca_en_varias_reglas_del_mismo_lado():
+    assert app["leer_reglas_parejas"]("LH/RH,LH/DER") == [("LH", "RH"), ("LH", "DER")]
+
+@pytest.mark.parametrize("texto, mensaje", [
+    ("LH", "la regla 'LH' debe tener la forma izquierdo/derecho"),
+    ("LH/RH/X", "la regla 'LH/RH/X' debe tener la forma izquierdo/derecho"),
+    ("LH/RH,", "la regla '' debe tener la forma izquierdo/derecho"),
+    ("", "la regla '' debe tener la forma izquierdo/derecho"),
+    ("LH/ ", "la regla 'LH/' tiene una marca vacía"),
+    ("L H/RH", "la regla 'L H/RH' tiene una marca vacía o con espacios"),
+    ("LH/R-H", "la regla 'LH/R-H' tiene una marca vacía o con espacios"),
+    ("LH/LH", "la marca 'LH' aparece como izquierda y como derecha"),
+    ("LH/RH,RH/LH", "la marca 'RH' aparece como izquierda y como derecha"),
+])
+def test_reglas_invalidas(texto, mensaje):
+    with pytest.raises(ValueError, match=mensaje):
+        app["leer_reglas_parejas"](texto)
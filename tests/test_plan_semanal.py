@@ -0,0 +1,319 @@
+"""Plan semanal: asignación de la producción contra la capacidad de cada máquina, plan
+óptimo (MILP) y calendario de turnos."""
+import itertools
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.optimize import OptimizeResult, milp, LinearConstraint, Bounds
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from bench import referencia
+from bench.comun import cargar_funciones
+
+app = cargar_funciones(["VENTANA_ASIGNACION", "asignar_por_capacidad", "DIAS_SEMANA", "HORAS_TURNO",
+                        "turnos_del_dia", "programar_turnos"])
+NOMBRES_MILP = ["LIMITE_TIEMPO_MILP", "BRECHA_MILP", "PENALIZACION_HORAS_MILP", "plan_optimo_milp", "_resolver_milp"]
+
+def cargar_milp(resolver=milp):
+    # resolver sustituye a scipy.optimize.milp para simular el límite de tiempo o un fallo
+    return cargar_funciones(NOMBRES_MILP, {"milp": resolver, "LinearConstraint": LinearConstraint, "Bounds": Bounds,
+                                           "coo_matrix": coo_matrix, "connected_components": connected_components})
+
+optimo = cargar_milp()
+
+def asignar(df, capacidad_por_maquina, clave_orden, tiempo_cambio=1.0):
+    maquinas = sorted(capacidad_por_maquina)
+    cantidades = app["asignar_por_capacidad"](
+        pd.Categorical(df['Maquina'], categories=maquinas).codes,
+        df['Faltante'].to_numpy(dtype=float),
+        df['StdPack'].to_numpy(dtype=float),
+        df['Rate'].to_numpy(dtype=float),
+        np.array([capacidad_por_maquina[maquina] for maquina in maquinas], dtype=float),
+        clave_orden,
+        tiempo_cambio,
+    )
+    return dict(zip(df['GrupoParte'], cantidades.tolist()))
+
+def test_grupo_sin_produccion_no_consume_tiempo():
+    df = pd.DataFrame({"GrupoParte": ["A", "B", "C"], "Maquina": "T1", "Faltante": [1000, 50, 50],
+                       "StdPack": [1000, 10, 10], "Rate": 100})
+    clave = -df['Faltante'].to_numpy(dtype=float)
+    # A cabe sin contar su cambio (10 h de 10.5 h); después ya no queda tiempo
+    assert asignar(df, {"T1": 10.5}, clave) == {"A": 1000, "B": 0, "C": 0}
+    # A no cabe y su recorte es 0: B y C usan el tiempo que queda
+    assert asignar(df, {"T1": 9.5}, clave) == {"A": 0, "B": 50, "C": 50}
+
+@pytest.mark.parametrize("modo", ["faltantes", "prioridad"])
+@pytest.mark.parametrize("semilla", range(150))
+def test_igual_a_la_asignacion_por_filas(modo, semilla):
+    rng = np.random.default_rng(semilla)
+    n_grupos = int(rng.integers(1, 60))
+    maquinas = [f"Transfer {i}" for i in range(int(rng.integers(1, 6)))]
+    df = pd.DataFrame({
+        "GrupoParte": [f"G{i:03d}" for i in range(n_grupos)],
+        "Maquina": rng.choice(maquinas, n_grupos),
+        "Faltante": rng.choice([0, 0, 5, 40, 300, 1200, 5000], n_grupos) + rng.integers(0, 50, n_grupos),
+        "StdPack": rng.choice([10, 24, 54, 100, 1000], n_grupos),
+        "Rate": rng.choice([50, 100, 120, 130], n_grupos),
+        "Prioridad": np.where(rng.random(n_grupos) < 0.2, np.nan, rng.permutation(n_grupos) + 1.0),
+    })
+    capacidad = {maquina: float(rng.choice([0, 0.5, 8, 10.5, 16, 40, 120])) for maquina in maquinas}
+    tiempo_cambio = float(rng.choice([0.0, 0.25, 1.0]))
+
+    if modo == "faltantes":
+        clave = -df['Faltante'].to_numpy(dtype=float)
+        df_plan = df.sort_values('Faltante', ascending=False, kind='stable')
+    else:
+        clave = df['Prioridad'].to_numpy(dtype=float)
+        df_plan = df.sort_values('Prioridad', ascending=True, kind='stable')
+
+    esperado = referencia.asignar_por_capacidad(df_plan, capacidad, tiempo_cambio)
+    assert asignar(df, capacidad, clave, tiempo_cambio) == esperado
+
+def test_secuenciar_cambios_respeta_presupuesto():
+    sec = cargar_funciones(["secuenciar_cambios"])["secuenciar_cambios"]
+    # Cambios como distancias entre trabajos: la búsqueda local sigue mejorando al agotar el tiempo
+    puntos = np.random.default_rng(1).random((400, 2)) * 10
+    costo = np.abs(puntos[:, None, :] - puntos[None, :, :]).sum(axis=-1)
+    inicio = time.perf_counter()
+    orden = sec(costo, 2.0)
+    # El presupuesto se revisa dentro de cada pasada de Or-opt, no sólo entre pasadas
+    assert time.perf_counter() - inicio < 2.0 + 0.15
+    assert sorted(orden) == list(range(400))
+
+def comparar_turnos(transfers, productos, duraciones, dias, horas, tolerancia=0.0):
+    obtenido = app["programar_turnos"](transfers, productos, duraciones, dias, horas)
+    esperado = referencia.programar_turnos(list(transfers), list(productos), list(duraciones), dias, horas)
+    if tolerancia:
+        # Con horas arbitrarias los dos recorridos pueden diferir en tramos de redondeo
+        obtenido = obtenido[obtenido['Horas'] > tolerancia].reset_index(drop=True)
+        esperado = esperado[esperado['Horas'] > tolerancia].reset_index(drop=True)
+    columnas = ['Transfer', 'Producto', 'Dia', 'Turno']
+    assert obtenido[columnas].values.tolist() == esperado[columnas].values.tolist()
+    for columna in ['Inicio', 'Horas', 'Utilizacion']:
+        assert obtenido[columna].tolist() == pytest.approx(esperado[columna].tolist(), abs=tolerancia * 100)
+    return obtenido
+
+@pytest.mark.parametrize("duraciones, dias, horas", [
+    ([3.0, 6.0, 2.0], 1, 16.0),      # el segundo trabajo cruza del turno 1 al 2
+    ([8.0, 8.0], 2, 8.0),            # cada trabajo llena exactamente un día
+    ([20.0, 10.0], 2, 22.5),         # cruza días y el turno parcial de 6.5 h
+    ([0.0, 5.0, 0.0, 0.0, 4.0], 1, 16.0),  # trabajos de duración 0 no ocupan turnos
+    ([50.0], 2, 20.0),               # no cabe en la semana: se recorta al final del día 2
+    ([30.0, 2.0], 1, 24.0),          # el segundo trabajo ya no cabe
+    ([4.0, 4.0], 7, 5.5),            # sólo hay un turno parcial y más días que la semana
+    ([4.0], 0, 16.0),                # transfer sin días
+    ([4.0], 3, 0.0),                 # transfer sin horas
+])
+def test_turnos_casos_limite(duraciones, dias, horas):
+    productos = [f"G{i}" for i in range(len(duraciones))]
+    obtenido = comparar_turnos(["T1"] * len(duraciones), productos, duraciones, {"T1": dias}, {"T1": horas})
+    assert list(obtenido.columns) == ['Transfer', 'Producto', 'Dia', 'Turno', 'Inicio', 'Horas', 'Utilizacion']
+
+def test_turnos_tramos_de_un_trabajo_que_cruza_dias():
+    tabla = comparar_turnos(["T1", "T1"], ["A", "B"], [20.0, 10.0], {"T1": 2}, {"T1": 22.5})
+    assert tabla[['Producto', 'Dia', 'Turno', 'Horas']].values.tolist() == [
+        ["A", "Lunes", "Turno 1", 8.0], ["A", "Lunes", "Turno 2", 8.0], ["A", "Lunes", "Turno 3 (6.5h)", 4.0],
+        ["B", "Lunes", "Turno 3 (6.5h)", 2.5], ["B", "Martes", "Turno 1", 7.5],
+    ]
+
+@pytest.mark.parametrize("semilla", range(60))
+def test_turnos_igual_al_recorrido_por_turnos(semilla):
+    rng = np.random.default_rng(semilla)
+    n = int(rng.integers(1, 40))
+    transfers = rng.choice([f"Transfer {i}" for i in range(int(rng.integers(1, 5)))], n)
+    dias = {transfer: int(rng.integers(0, 7)) for transfer in transfers}
+    horas = {transfer: float(rng.choice([0, 5.5, 8, 12.25, 16, 20, 22.5, 24])) for transfer in transfers}
+    productos = [f"G{i:03d}" for i in range(n)]
+    # Múltiplos de 0.25 h (sumas exactas) con ceros y trabajos más largos que un turno o un día
+    duraciones = rng.choice([0, 0.25, 1, 2.5, 6, 8, 9.75, 26], n)
+    comparar_turnos(transfers, productos, duraciones, dias, horas)
+    # Horas arbitrarias, como las de cantidad / Rate + cambio
+    comparar_turnos(transfers, productos, rng.uniform(0, 30, n) * (rng.random(n) < 0.9), dias, horas,
+                    tolerancia=1e-9)
+
+def instancia_milp(rng, n_grupos, n_maquinas, fraccion_flexible=0.3, cajas_max=None):
+    """Pares (grupo, máquina) con los argumentos de plan_optimo_milp; los grupos flexibles
+    tienen dos máquinas candidatas."""
+    grupos_par, maquinas_par = [], []
+    for grupo in range(n_grupos):
+        candidatas = 2 if n_maquinas > 1 and rng.random() < fraccion_flexible else 1
+        for maquina in rng.choice(n_maquinas, candidatas, replace=False):
+            grupos_par.append(grupo)
+            maquinas_par.append(int(maquina))
+    n_pares = len(grupos_par)
+    std_packs = rng.choice([10.0, 24.0, 54.0, 100.0], n_pares)
+    if cajas_max is None:
+        faltantes = rng.choice([0, 0, 30, 300, 1200], n_grupos) + rng.integers(0, 50, n_grupos)
+    else:
+        # Faltante de a lo más cajas_max cajas en cada par (para enumerar todas las soluciones)
+        std_grupo = np.zeros(n_grupos)
+        np.maximum.at(std_grupo, grupos_par, std_packs)
+        faltantes = rng.integers(0, cajas_max, n_grupos) * std_grupo + rng.integers(0, 5, n_grupos) * (std_grupo > 0)
+        std_packs = std_grupo[grupos_par]
+    prioridades = np.where(rng.random(n_grupos) < 0.2, np.nan, rng.permutation(n_grupos) + 1.0)
+    return dict(
+        grupos_par=np.array(grupos_par), maquinas_par=np.array(maquinas_par),
+        faltantes=faltantes.astype(float), prioridades=prioridades,
+        std_packs=std_packs, rates=rng.choice([50.0, 100.0, 120.0], n_pares),
+        capacidad=rng.choice([0.0, 2.0, 8.0, 20.0, 112.5], n_maquinas), tiempo_cambio=float(rng.choice([0.0, 0.5, 1.0])),
+    )
+
+def peso_grupos(instancia):
+    prioridades = instancia["prioridades"]
+    return 1 / np.where(np.isnan(prioridades), np.nanmax(prioridades, initial=0) + 1, prioridades)
+
+def cobertura(instancia, cajas):
+    # Objetivo del plan: fracción del faltante cubierta por grupo, ponderada por 1/prioridad
+    faltantes = instancia["faltantes"]
+    sets = np.bincount(instancia["grupos_par"], weights=cajas * instancia["std_packs"], minlength=len(faltantes))
+    fraccion = np.divide(sets, faltantes, out=np.zeros_like(faltantes), where=faltantes > 0)
+    return float((peso_grupos(instancia) * np.minimum(fraccion, 1)).sum())
+
+def verificar_factible(instancia, cajas):
+    grupos_par, maquinas_par = instancia["grupos_par"], instancia["maquinas_par"]
+    assert cajas.dtype == np.int64 and len(cajas) == len(grupos_par)
+    # Cajas completas (los sets son múltiplos de StdPack) sin pasar del faltante redondeado a cajas
+    assert (cajas >= 0).all()
+    assert (cajas <= np.ceil(np.maximum(instancia["faltantes"][grupos_par], 0) / instancia["std_packs"])).all()
+    produce = cajas > 0
+    # Cada grupo en una sola máquina
+    assert np.bincount(grupos_par, weights=produce, minlength=len(instancia["faltantes"])).max(initial=0) <= 1
+    # Horas de producción más cambios de cada máquina dentro de su capacidad
+    horas = np.bincount(maquinas_par, weights=cajas * instancia["std_packs"] / instancia["rates"]
+                        + instancia["tiempo_cambio"] * produce, minlength=len(instancia["capacidad"]))
+    assert (horas <= instancia["capacidad"] + 1e-6).all()
+
+@pytest.mark.parametrize("semilla", range(25))
+def test_milp_factible(semilla):
+    rng = np.random.default_rng(semilla)
+    instancia = instancia_milp(rng, int(rng.integers(1, 80)), int(rng.integers(1, 8)))
+    resultado = optimo["plan_optimo_milp"](**instancia)
+    assert resultado is not None
+    cajas, es_optimo = resultado
+    assert es_optimo
+    verificar_factible(instancia, cajas)
+
+def test_milp_conjuntos_de_maquinas_independientes():
+    # T0-T1 unidas por un grupo flexible, T2 sola: cada conjunto respeta la capacidad de
+    # sus máquinas y el resultado es el de resolver todo como un solo problema
+    instancia = dict(
+        grupos_par=np.array([0, 0, 1, 2, 3, 3]), maquinas_par=np.array([0, 1, 0, 1, 2, 2]),
+        faltantes=np.array([500.0, 400.0, 300.0, 800.0]), prioridades=np.array([1.0, 2.0, 3.0, 4.0]),
+        std_packs=np.array([50.0, 50.0, 100.0, 100.0, 100.0, 100.0]), rates=np.full(6, 100.0),
+        capacidad=np.array([6.0, 5.0, 3.0]), tiempo_cambio=1.0,
+    )
+    cajas, es_optimo = optimo["plan_optimo_milp"](**instancia)
+    assert es_optimo
+    verificar_factible(instancia, cajas)
+    completo = optimo["_resolver_milp"](
+        instancia["grupos_par"], instancia["maquinas_par"], instancia["faltantes"], peso_grupos(instancia),
+        instancia["std_packs"], instancia["rates"], instancia["capacidad"], instancia["tiempo_cambio"], 10.0
+    )
+    assert cobertura(instancia, cajas) == pytest.approx(cobertura(instancia, completo[0]))
+    # El grupo 3 tiene dos pares en T2 (mismo grupo, misma máquina): sólo uno produce
+    assert (cajas[4:] > 0).sum() == 1
+
+@pytest.mark.parametrize("capacidad", [0.0, 1000.0])
+@pytest.mark.parametrize("semilla", range(10))
+def test_milp_igual_al_plan_por_prioridad_en_casos_triviales(semilla, capacidad):
+    # Sin grupos flexibles y con capacidad de sobra (o ninguna) los dos planes producen
+    # todo el faltante redondeado a cajas (o nada)
+    rng = np.random.default_rng(semilla)
+    instancia = instancia_milp(rng, int(rng.integers(1, 40)), int(rng.integers(1, 5)), fraccion_flexible=0)
+    instancia["capacidad"] = np.full(len(instancia["capacidad"]), capacidad)
+    cajas, _ = optimo["plan_optimo_milp"](**instancia)
+
+    df = pd.DataFrame({"GrupoParte": np.arange(len(instancia["faltantes"]))[instancia["grupos_par"]],
+                       "Maquina": [f"Transfer {m}" for m in instancia["maquinas_par"]],
+                       "Faltante": instancia["faltantes"][instancia["grupos_par"]],
+                       "StdPack": instancia["std_packs"], "Rate": instancia["rates"]})
+    por_prioridad = asignar(df, {f"Transfer {m}": capacidad for m in range(len(instancia["capacidad"]))},
+                            instancia["prioridades"][instancia["grupos_par"]], instancia["tiempo_cambio"])
+    assert (cajas * instancia["std_packs"]).tolist() == [por_prioridad[grupo] for grupo in df["GrupoParte"]]
+
+@pytest.mark.parametrize("semilla", range(30))
+def test_milp_igual_a_fuerza_bruta(semilla):
+    rng = np.random.default_rng(semilla)
+    instancia = instancia_milp(rng, int(rng.integers(1, 5)), int(rng.integers(1, 3)), fraccion_flexible=0.5, cajas_max=4)
+    cajas, es_optimo = optimo["plan_optimo_milp"](**instancia)
+    assert es_optimo
+    verificar_factible(instancia, cajas)
+
+    # Todas las opciones de cada grupo: no producir o un par de sus máquinas con 1..cajas_max cajas
+    grupos_par, std_packs = instancia["grupos_par"], instancia["std_packs"]
+    opciones = []
+    for grupo, faltante in enumerate(instancia["faltantes"]):
+        pares = np.flatnonzero(grupos_par == grupo)
+        opciones.append([None] + [(par, n) for par in pares for n in range(1, int(np.ceil(max(faltante, 0) / std_packs[par])) + 1)])
+    mejor = 0.0
+    for eleccion in itertools.product(*opciones):
+        propuesta = np.zeros(len(grupos_par), dtype=np.int64)
+        for opcion in eleccion:
+            if opcion is not None:
+                propuesta[opcion[0]] = opcion[1]
+        produce = propuesta > 0
+        horas = np.bincount(instancia["maquinas_par"], weights=propuesta * std_packs / instancia["rates"]
+                            + instancia["tiempo_cambio"] * produce, minlength=len(instancia["capacidad"]))
+        if (horas <= instancia["capacidad"] + 1e-9).all():
+            mejor = max(mejor, cobertura(instancia, propuesta))
+    # Dentro de la brecha aceptada (la penalización por hora sólo desempata)
+    assert cobertura(instancia, cajas) >= mejor * (1 - optimo["BRECHA_MILP"]) - 1e-6
+
+def test_milp_sin_tiempo_devuelve_none():
+    instancia = instancia_milp(np.random.default_rng(0), 20, 3)
+    assert optimo["plan_optimo_milp"](**instancia, limite_tiempo=0) is None
+
+def test_milp_al_limite_de_tiempo_usa_la_mejor_solucion():
+    def al_limite(*args, **kwargs):
+        resultado = milp(*args, **kwargs)
+        resultado.status = 1
+        return resultado
+    instancia = instancia_milp(np.random.default_rng(1), 40, 4)
+    cajas, es_optimo = cargar_milp(al_limite)["plan_optimo_milp"](**instancia)
+    assert not es_optimo
+    verificar_factible(instancia, cajas)
+    assert cajas.tolist() == optimo["plan_optimo_milp"](**instancia)[0].tolist()
+
+@pytest.mark.parametrize("status, solucion", [
+    (1, None),      # límite de tiempo sin solución factible
+    (2, None),      # infactible
+    (1, 1e6),       # solución que al redondear pasa del faltante
+])
+def test_milp_sin_solucion_factible_devuelve_none(status, solucion):
+    def resolver(objetivo, **kwargs):
+        x = None if solucion is None else np.full(len(objetivo), solucion)
+        return OptimizeResult(status=status, x=x, success=False, message="")
+    instancia = instancia_milp(np.random.default_rng(2), 20, 3)
+    assert cargar_milp(resolver)["plan_optimo_milp"](**instancia) is None
+
+def test_milp_sin_solucion_usa_plan_por_prioridad(tmp_path, monkeypatch):
+    from streamlit.testing.v1 import AppTest
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    shutil.copy(os.path.join(raiz, "catalogo.csv"), tmp_path)
+    with open(os.path.join(raiz, "app.py"), encoding="utf-8") as archivo:
+        fuente = archivo.read().replace("LIMITE_TIEMPO_MILP = 10.0", "LIMITE_TIEMPO_MILP = 0.0")
+    (tmp_path / "app.py").write_text(fuente, encoding="utf-8")
+    monkeypatch.chdir(tmp_path)
+
+    def generar_plan(tipo):
+        at = AppTest.from_file(str(tmp_path / "app.py"), default_timeout=120)
+        at.run()
+        at.session_state.page, at.session_state.is_admin = "admin", True
+        at.run()
+        [s for s in at.slider if s.label == "Días de producción"][0].set_value(1)
+        [n for n in at.number_input if n.label == "Horas efectivas por día"][0].set_value(8.0)
+        [r for r in at.radio if r.label.startswith("Tipo de plan")][0].set_value(tipo)
+        [b for b in at.button if "Generar Plan" in b.label][0].click()
+        at.run()
+        assert not at.exception
+        return at
+
+    at = generar_plan("Óptimo (MILP)")
+    assert any("no encontró un plan factible" in w.value for w in at.warning)
+    assert at.session_state.cantidades_plan == generar_plan("Basado en prioridad").session_state.cantidades_plan
@@ -0,0 +1,119 @@
+"""Equivalencia del motor de prioridades vectorizado con la implementación original.
+
+La implementación original (bench/referencia.py) ordena los grupos de cada máquina con
+un sort no estable, así que en empates de TiempoNecesario el orden es arbitrario; la
+versión actual desempata por nombre. Por eso las prioridades se comparan como la
+secuencia de tiempos de cada máquina y el conjunto de grupos priorizados.
+
+En catálogos con grupos flexibles el motor vectorizado se ejecuta con la regla original
+de elección de máquina (referencia.elegir_flexibles) y se exige la misma equivalencia,
+MaquinaSeleccionada incluida.
+
+Con el reparto balanceado de los grupos flexibles (asignar_flexibles, LPT más búsqueda
+exacta) la máquina de un grupo flexible cambia a propósito respecto a la regla original:
+test_reparto_flexible_balanceado fija en qué consiste ese cambio."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from bench import referencia
+from bench.comun import cargar_funciones, generar_catalogo
+
+app = cargar_funciones([
+    "PAREJAS_LADOS_PREDETERMINADAS", "leer_reglas_parejas", "REGLAS_PAREJAS",
+    "LADO_IZQUIERDO", "MotorParejas", "LIMITE_COMBINACIONES_EXACTO",
+    "asignar_flexibles", "_asignar_flexibles_exacto", "asignar_prioridades", "calcular_metricas",
+])
+
+# Motor vectorizado con la elección de máquina flexible de la implementación original
+original = cargar_funciones([
+    "PAREJAS_LADOS_PREDETERMINADAS", "leer_reglas_parejas", "REGLAS_PAREJAS",
+    "LADO_IZQUIERDO", "MotorParejas", "asignar_prioridades", "calcular_metricas",
+], {"asignar_flexibles": referencia.elegir_flexibles})
+
+COLUMNAS_BASE = ["GrupoParte", "EsFlexible", "Inventario", "Faltante", "CajasNecesarias", "TiempoNecesario"]
+
+def secuencia_prioridades(df):
+    """Tiempo del grupo en cada (Maquina, Prioridad) y grupos priorizados por máquina."""
+    prioridad = pd.to_numeric(df["Prioridad"], errors="coerce").astype(float)
+    filas = df.assign(Prioridad=prioridad)[prioridad.notna()]
+    tiempos = filas.groupby(["Maquina", "Prioridad"])["TiempoNecesario"].max().sort_index()
+    grupos = set(zip(filas["Maquina"], filas["GrupoParte"]))
+    return tiempos, grupos
+
+def comparar_con_referencia(obtenido, esperado, empates):
+    for columna in COLUMNAS_BASE:
+        pd.testing.assert_series_equal(obtenido[columna], esperado[columna], check_dtype=False)
+
+    tiempos_esperados, grupos_esperados = secuencia_prioridades(esperado)
+    tiempos_obtenidos, grupos_obtenidos = secuencia_prioridades(obtenido)
+    pd.testing.assert_series_equal(tiempos_obtenidos, tiempos_esperados)
+    assert grupos_obtenidos == grupos_esperados
+
+    # Sin empates de tiempo en una máquina el orden es único y la prioridad debe ser idéntica
+    if not empates:
+        prioridad_esperada = pd.to_numeric(esperado["Prioridad"], errors="coerce").astype(float)
+        tiempo_grupo = esperado[prioridad_esperada.notna()].groupby(["Maquina", "GrupoParte"])["TiempoNecesario"].max()
+        empatados = tiempo_grupo[tiempo_grupo.reset_index().duplicated(["Maquina", "TiempoNecesario"], keep=False).to_numpy()]
+        con_empate = pd.MultiIndex.from_frame(esperado[["Maquina", "GrupoParte"]]).isin(empatados.index)
+        np.testing.assert_array_equal(obtenido["Prioridad"].to_numpy()[~con_empate],
+                                      prioridad_esperada.to_numpy()[~con_empate])
+
+    # La original no expone MaquinaSeleccionada: es la máquina donde el grupo flexible quedó priorizado
+    flexibles = esperado["EsFlexible"] & (esperado["Faltante"] > 0)
+    priorizadas = esperado[flexibles & pd.to_numeric(esperado["Prioridad"], errors="coerce").notna()]
+    maquina_esperada = esperado.loc[flexibles, "GrupoParte"].map(priorizadas.groupby("GrupoParte")["Maquina"].first())
+    pd.testing.assert_series_equal(obtenido.loc[flexibles, "MaquinaSeleccionada"], maquina_esperada,
+                                   check_names=False, check_dtype=False)
+    assert obtenido.loc[~flexibles, "MaquinaSeleccionada"].isna().all()
+
+@pytest.mark.parametrize("semilla", range(3))
+@pytest.mark.parametrize("n_partes, empates", [(30, False), (30, True), (2000, False), (12000, False), (12000, True)])
+def test_equivalente_sin_flexibles(n_partes, empates, semilla):
+    catalogo, inventario = generar_catalogo(n_partes, n_maquinas=8 if n_partes < 100 else 50, semilla=semilla,
+                                            empates=empates, fraccion_flexible=0)
+    comparar_con_referencia(app["calcular_metricas"](catalogo, inventario),
+                            referencia.calcular_metricas(catalogo, inventario), empates)
+
+@pytest.mark.parametrize("semilla", range(3))
+@pytest.mark.parametrize("n_partes, n_maquinas, fraccion_flexible", [(30, 4, 0.5), (2000, 20, 0.3), (12000, 50, 0.1)])
+def test_equivalente_con_flexibles(n_partes, n_maquinas, fraccion_flexible, semilla):
+    catalogo, inventario = generar_catalogo(n_partes, n_maquinas=n_maquinas, semilla=semilla,
+                                            fraccion_flexible=fraccion_flexible)
+    esperado = referencia.calcular_metricas(catalogo, inventario)
+    obtenido = original["calcular_metricas"](catalogo, inventario)
+    assert esperado["EsFlexible"].any()
+    comparar_con_referencia(obtenido, esperado, empates=False)
+
+def carga_maquinas(df):
+    """Suma de TiempoNecesario de las filas con faltante que cuentan en cada máquina."""
+    activas = (df["Faltante"] > 0) & (~df["EsFlexible"] | (df["Maquina"] == df["MaquinaSeleccionada"]))
+    carga = df[activas].groupby("Maquina")["TiempoNecesario"].sum()
+    return carga.max(), (carga * carga).sum()
+
+@pytest.mark.parametrize("semilla", range(3))
+@pytest.mark.parametrize("n_partes, n_maquinas, fraccion_flexible", [(30, 4, 0.5), (2000, 20, 0.3), (12000, 50, 0.1)])
+def test_reparto_flexible_balanceado(n_partes, n_maquinas, fraccion_flexible, semilla):
+    catalogo, inventario = generar_catalogo(n_partes, n_maquinas=n_maquinas, semilla=semilla,
+                                            fraccion_flexible=fraccion_flexible)
+    esperado = referencia.calcular_metricas(catalogo, inventario)
+    obtenido = app["calcular_metricas"](catalogo, inventario)
+    regla_original = original["calcular_metricas"](catalogo, inventario)
+
+    # Las columnas que no dependen de la máquina elegida no cambian
+    for columna in COLUMNAS_BASE:
+        pd.testing.assert_series_equal(obtenido[columna], esperado[columna], check_dtype=False)
+
+    # Cada grupo flexible con faltante queda priorizado en exactamente una de sus máquinas
+    con_prioridad = obtenido[obtenido["EsFlexible"] & obtenido["Prioridad"].notna()]
+    assert (con_prioridad.groupby("GrupoParte")["Maquina"].nunique() == 1).all()
+    assert (con_prioridad["Maquina"] == con_prioridad["MaquinaSeleccionada"]).all()
+    flexibles = obtenido["EsFlexible"] & (obtenido["Faltante"] > 0)
+    assert set(con_prioridad["GrupoParte"]) == set(obtenido.loc[flexibles, "GrupoParte"])
+
+    # Cambio intencional: la elección considera la carga que agrega cada grupo, así que la
+    # carga máxima (y la suma de cuadrados en empate) no es peor que con la regla original,
+    # que compara la carga total estática de las máquinas
+    assert carga_maquinas(obtenido) <= carga_maquinas(regla_original)
+    if n_partes >= 2000:
+        assert (obtenido.loc[flexibles, "MaquinaSeleccionada"] != regla_original.loc[flexibles, "MaquinaSeleccionada"]).any()